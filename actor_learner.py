@@ -0,0 +1,404 @@
+"""
+Asynchronous actor-learner training on one machine.
+
+Actor processes each play `envs_per_actor` games on a VectorTetris with a NumpyDQN
+copy of the policy network, so they never import torch. Every env has its own
+exploration rate (epsilon ** (1 + alpha * i / (N - 1)) over all N envs, as in
+Ape-X) and actions are drawn from the legal ones only. Actors compute an initial
+priority for every transition from their network's one-step TD error and send
+transitions in batches through a bounded queue; a full queue blocks them, so
+actors cannot run ahead of the learner by more than `queue_size` batches.
+
+The learner is the process that owns the DQNAgent and its replay buffer. It drains
+the queue into the buffer between optimize_model() calls, syncs the target network
+every agent.target_update updates and publishes the policy weights to shared memory
+every `broadcast_interval` updates; actors pick them up every `sync_interval` steps.
+Game stepping and gradient updates thus run at the same time instead of taking turns.
+
+Usage:
+    with ActorLearner(agent, num_actors=4, stage=5) as trainer:
+        trainer.run(num_updates=100000)
+        print(trainer.stats())
+"""
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from tetris_rules import STAGE_BOARD_SIZES, stage_params
+from tetris_tables import NUM_ACTIONS
+from numpy_inference import NumpyDQN, LAYERS, state_dict_arrays
+from replay_storage import CompactState
+from subproc_env import attach_arrays, layout_size
+
+# Per-actor counters in shared memory, one row per actor
+ACTOR_COUNTERS = ('steps', 'episodes', 'lines', 'batches', 'blocked_seconds', 'weight_updates')
+
+
+def weight_names():
+    return [f'{prefix}.{name}' for prefix, _ in LAYERS for name in ('weight', 'bias')]
+
+
+def shared_layout(weight_shapes, num_actors):
+    """(name, shape, dtype) of every shared array."""
+    weight_count = sum(int(np.prod(shape)) for shape in weight_shapes.values())
+    return (
+        ('weights', (weight_count,), np.float32),
+        ('version', (1,), np.int64),
+        ('counters', (num_actors, len(ACTOR_COUNTERS)), np.float64),
+    )
+
+
+def unflatten_weights(flat, weight_shapes):
+    weights, offset = {}, 0
+    for name in weight_names():
+        shape = weight_shapes[name]
+        size = int(np.prod(shape))
+        weights[name] = flat[offset:offset + size].reshape(shape).copy()
+        offset += size
+    return weights
+
+
+def actor_epsilons(num_envs, epsilon=0.4, alpha=7.0):
+    """Ape-X exploration rates of `num_envs` envs, from `epsilon` down to epsilon ** (1 + alpha)."""
+    if num_envs == 1:
+        return np.array([epsilon])
+    return epsilon ** (1 + alpha * np.arange(num_envs) / (num_envs - 1))
+
+
+def select_actions(q_values, masks, epsilons, rng):
+    """Greedy legal action per row, replaced with probability `epsilons` by a uniform legal one."""
+    greedy = np.where(masks, q_values, -np.inf).argmax(axis=1)
+    explore = rng.random(len(q_values)) < epsilons
+    if not explore.any():
+        return greedy
+    scores = rng.random(q_values.shape)
+    scores[~masks] = -1.0
+    return np.where(explore, scores.argmax(axis=1), greedy)
+
+
+def concatenate_batches(batches):
+    merged = {}
+    for key in batches[0]:
+        if isinstance(batches[0][key], CompactState):
+            fields = zip(*(batch[key] for batch in batches))
+            merged[key] = CompactState(*(np.concatenate(field) for field in fields))
+        else:
+            merged[key] = np.concatenate([batch[key] for batch in batches])
+    return merged
+
+
+def actor(index, transitions, memory_name, layout, weight_shapes, lock, stop, settings):
+    """
+    Plays games and sends transition batches to the learner until `stop` is set.
+
+    Batches are dicts of 'states', 'actions', 'rewards', 'next_states', 'dones' and
+    'priorities' arrays; with settings['compact'], states are CompactStates of arrays.
+    """
+    from vector_tetris import VectorTetris
+
+    memory = shared_memory.SharedMemory(name=memory_name)
+    arrays = attach_arrays(memory, layout)
+    counters = arrays['counters'][index]
+    seed = settings['seed']
+    env = VectorTetris(settings['num_envs'], *settings['board_size'], settings['allowed_shapes'], seed=seed)
+    rng = np.random.default_rng(None if seed is None else seed + 1)
+    epsilons, gamma, compact = settings['epsilons'], settings['gamma'], settings['compact']
+    rows = np.arange(env.num_envs)
+
+    model, version = None, 0
+    observations = env.observations()
+    q_values = None
+    pending, pending_rows = [], 0
+    steps = 0
+    try:
+        while not stop.is_set():
+            if steps % settings['sync_interval'] == 0 and arrays['version'][0] != version:
+                with lock:
+                    version = int(arrays['version'][0])
+                    weights = unflatten_weights(arrays['weights'], weight_shapes)
+                model = NumpyDQN(weights)
+                q_values = None
+                counters[ACTOR_COUNTERS.index('weight_updates')] += 1
+            if model is None:
+                time.sleep(0.01)
+                continue
+
+            if q_values is None:
+                q_values = model.forward(observations)
+            actions = select_actions(q_values, env.action_masks(), epsilons, rng)
+            states = env.compact_states() if compact else observations
+            chosen_q = q_values[rows, actions]
+
+            observations, rewards, dones, info = env.step(actions)
+            if compact:
+                next_states = env.compact_states()
+                for field, final in zip(next_states, info['final_state']):
+                    field[dones] = final
+            else:
+                next_states = observations.copy()
+                next_states[dones] = info['final_observation']
+
+            # The next states' Q-values double as the next step's; finished games are masked by done
+            q_values = model.forward(observations)
+            targets = rewards + gamma * q_values.max(axis=1) * ~dones
+            priorities = np.abs(targets - chosen_q) + 1e-5
+
+            pending.append({'states': states, 'actions': actions, 'rewards': rewards.astype(np.float32),
+                            'next_states': next_states, 'dones': dones, 'priorities': priorities})
+            pending_rows += env.num_envs
+            steps += 1
+            counters[ACTOR_COUNTERS.index('steps')] += env.num_envs
+            counters[ACTOR_COUNTERS.index('episodes')] += int(dones.sum())
+            counters[ACTOR_COUNTERS.index('lines')] += int(info['lines_cleared'].sum())
+
+            if pending_rows >= settings['send_size']:
+                batch = concatenate_batches(pending)
+                pending, pending_rows = [], 0
+                start = time.perf_counter()
+                while not stop.is_set():
+                    try:
+                        transitions.put(batch, timeout=0.1)
+                        counters[ACTOR_COUNTERS.index('batches')] += 1
+                        break
+                    except queue.Full:
+                        pass
+                counters[ACTOR_COUNTERS.index('blocked_seconds')] += time.perf_counter() - start
+    finally:
+        # Batches still in the queue are dropped rather than waited for at exit
+        transitions.cancel_join_thread()
+        del arrays, counters
+        memory.close()
+
+
+class ActorLearner:
+    """
+    Trains a DQNAgent from actor processes running in parallel with its updates.
+
+    Args:
+        agent (DQNAgent): Learner; its replay buffer receives every transition. A
+            compact (memory-mapped) buffer gets CompactStates from the actors.
+        num_actors (int): Actor processes.
+        envs_per_actor (int): Games each actor plays in lockstep.
+        stage (int): Curriculum stage; sets the board size and the allowed shapes.
+        queue_size (int): Batches that can wait for the learner before actors block.
+        send_size (int): Transitions per batch sent by an actor.
+        broadcast_interval (int): Learner updates between weight publications.
+        sync_interval (int): Actor steps between checks for new weights.
+        epsilon, epsilon_alpha (float): Ape-X exploration rates over all envs.
+        learning_starts (int): Transitions to collect before the first update
+            (default: the agent's batch size).
+        seed (int): Actor i is seeded with seed + 2 * i.
+        start_method (str): multiprocessing start method; 'spawn' keeps the learner's
+            torch threads out of the actors.
+    """
+
+    def __init__(self, agent, num_actors=4, envs_per_actor=64, stage=5, queue_size=32, send_size=512,
+                 broadcast_interval=100, sync_interval=20, epsilon=0.4, epsilon_alpha=7.0,
+                 learning_starts=None, seed=None, start_method='spawn'):
+        self.agent = agent
+        self.num_actors = num_actors
+        self.envs_per_actor = envs_per_actor
+        self.stage = stage
+        self.broadcast_interval = broadcast_interval
+        self.learning_starts = max(agent.batch_size, learning_starts or 0)
+        self.board_size = STAGE_BOARD_SIZES.get(stage, (10, 20))
+        self.compact = getattr(agent, 'compact_replay', False)
+        if self.compact:
+            storage = agent.memory.storage
+            if (storage.width, storage.height) != self.board_size:
+                raise ValueError(f'Replay storage holds {storage.width}x{storage.height} boards, '
+                                 f'stage {stage} plays on {self.board_size[0]}x{self.board_size[1]}')
+        if agent.n_actions != NUM_ACTIONS:
+            raise ValueError(f'Actors play {NUM_ACTIONS} actions, the agent has {agent.n_actions}')
+
+        weights = self.policy_weights()
+        self.weight_shapes = {name: weights[name].shape for name in weight_names()}
+        self.layout = shared_layout(self.weight_shapes, num_actors)
+        self.memory = shared_memory.SharedMemory(create=True, size=layout_size(self.layout))
+        self.arrays = attach_arrays(self.memory, self.layout)
+        self.arrays['version'][0] = 0
+        self.arrays['counters'][:] = 0
+
+        context = mp.get_context(start_method)
+        self.transitions = context.Queue(maxsize=queue_size)
+        self.lock = context.Lock()
+        self.stop_event = context.Event()
+        self.publish(weights)
+
+        _, _, allowed_shapes = stage_params(stage)
+        epsilons = actor_epsilons(num_actors * envs_per_actor, epsilon, epsilon_alpha)
+        self.processes = []
+        for index in range(num_actors):
+            settings = {
+                'num_envs': envs_per_actor,
+                'board_size': self.board_size,
+                'allowed_shapes': list(allowed_shapes),
+                'epsilons': epsilons[index * envs_per_actor:(index + 1) * envs_per_actor],
+                'gamma': agent.gamma,
+                'send_size': send_size,
+                'sync_interval': sync_interval,
+                'compact': self.compact,
+                'seed': None if seed is None else seed + 2 * index,
+            }
+            self.processes.append(context.Process(
+                target=actor, daemon=True,
+                args=(index, self.transitions, self.memory.name, self.layout, self.weight_shapes,
+                      self.lock, self.stop_event, settings),
+            ))
+
+        self.updates = 0
+        self.transitions_received = 0
+        self.wait_seconds = 0.0
+        self.started_at = None
+        self.closed = False
+
+    def policy_weights(self):
+        return state_dict_arrays(self.agent.policy_net.state_dict())
+
+    def publish(self, weights=None):
+        """Copies the policy weights to shared memory for the actors' next sync."""
+        weights = self.policy_weights() if weights is None else weights
+        flat = np.concatenate([weights[name].ravel() for name in weight_names()])
+        with self.lock:
+            self.arrays['weights'][:] = flat
+            self.arrays['version'][0] += 1
+
+    def start(self):
+        if self.started_at is None:
+            for process in self.processes:
+                process.start()
+            self.started_at = time.perf_counter()
+
+    def receive(self, block=False, max_batches=None):
+        """
+        Moves waiting batches from the queue into the replay buffer.
+
+        Args:
+            block (bool): Wait (in 0.1 s slices) for at least one batch.
+            max_batches (int): Upper bound on batches taken, default all waiting ones.
+
+        Returns:
+            int: Transitions added.
+        """
+        memory, added, batches = self.agent.memory, 0, 0
+        start = time.perf_counter()
+        while max_batches is None or batches < max_batches:
+            try:
+                batch = self.transitions.get(timeout=0.1) if block and not batches else self.transitions.get_nowait()
+            except queue.Empty:
+                if block and not batches and not self.stop_event.is_set():
+                    if not any(process.is_alive() for process in self.processes):
+                        raise RuntimeError('Every actor process has exited')
+                    continue
+                break
+            memory.push_batch(batch['states'], batch['actions'], batch['rewards'], batch['next_states'],
+                              batch['dones'], priorities=batch['priorities'])
+            added += len(batch['actions'])
+            batches += 1
+        if block:
+            self.wait_seconds += time.perf_counter() - start
+        self.transitions_received += added
+        self.agent.steps_done += added
+        return added
+
+    def run(self, num_updates=None, seconds=None, log_interval=1000, verbose=True):
+        """
+        Trains until `num_updates` more updates or `seconds` have passed (at least one
+        of them must be given), starting the actors on the first call.
+
+        Returns:
+            list: Losses of the updates made.
+        """
+        if num_updates is None and seconds is None:
+            raise ValueError('Give num_updates or seconds')
+        agent = self.agent
+        self.start()
+        target = None if num_updates is None else self.updates + num_updates
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        losses = []
+        while (target is None or self.updates < target) and (deadline is None or time.perf_counter() < deadline):
+            # Wait for data only while the buffer is too small to learn from
+            self.receive(block=len(agent.memory) < self.learning_starts, max_batches=self.num_actors)
+            if len(agent.memory) < self.learning_starts:
+                continue
+
+            loss = agent.optimize_model()
+            agent.memory.update_beta()
+            self.updates += 1
+            if loss is not None:
+                losses.append(loss)
+            if self.updates % agent.target_update == 0:
+                agent.target_net.load_state_dict(agent.policy_net.state_dict())
+            if self.updates % self.broadcast_interval == 0:
+                self.publish()
+
+            if log_interval and self.updates % log_interval == 0:
+                stats = self.stats()
+                for key in ('updates_per_second', 'transitions_per_second', 'actor_steps_per_second',
+                            'actor_blocked_share', 'learner_wait_share'):
+                    agent.writer.add_scalar(f'ActorLearner/{key}', stats[key], self.updates)
+                if losses:
+                    agent.writer.add_scalar('ActorLearner/loss', np.mean(losses[-log_interval:]), self.updates)
+                if verbose:
+                    print(f"Update {self.updates}: {stats['updates_per_second']:.0f} updates/s, "
+                          f"{stats['transitions_per_second']:.0f} transitions/s, "
+                          f"actors blocked {stats['actor_blocked_share']:.0%}, "
+                          f"learner waiting {stats['learner_wait_share']:.0%}, buffer {len(agent.memory)}")
+        return losses
+
+    def stats(self):
+        """
+        Throughput of both roles since start().
+
+        Returns:
+            dict: Learner totals and rates, actor totals and rates summed over actors,
+            the share of time actors spent blocked on a full queue and the learner spent
+            waiting on an empty one, and 'actors' with every actor's counters. Counts
+            are ints and everything else Python floats.
+        """
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9) if self.started_at else 1e-9
+        counters = self.arrays['counters'].copy()
+        totals = dict(zip(ACTOR_COUNTERS, counters.sum(axis=0)))
+        return {
+            'elapsed': elapsed,
+            'updates': self.updates,
+            'updates_per_second': self.updates / elapsed,
+            'transitions_received': self.transitions_received,
+            'transitions_per_second': self.transitions_received / elapsed,
+            'learner_wait_share': self.wait_seconds / elapsed,
+            'actor_steps': int(totals['steps']),
+            'actor_steps_per_second': float(totals['steps']) / elapsed,
+            'actor_episodes': int(totals['episodes']),
+            'actor_lines': int(totals['lines']),
+            'actor_blocked_share': float(totals['blocked_seconds']) / (elapsed * self.num_actors),
+            'weight_version': int(self.arrays['version'][0]),
+            'actors': [{key: float(value) if key == 'blocked_seconds' else int(value)
+                        for key, value in zip(ACTOR_COUNTERS, row)} for row in counters],
+        }
+
+    def close(self):
+        """Stops the actors, dropping batches still queued, and frees the shared memory."""
+        if self.closed:
+            return
+        self.stop_event.set()
+        for process in self.processes:
+            while process.is_alive():
+                # Keep the queue moving so no actor stays blocked on a put
+                try:
+                    self.transitions.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+                process.join(timeout=0.1)
+        self.transitions.close()
+        self.arrays = None
+        self.memory.close()
+        self.memory.unlink()
+        self.closed = True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
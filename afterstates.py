@@ -0,0 +1,174 @@
+"""
+Every placement of the falling piece and the board it leaves behind.
+
+Placement-based agents score afterstates: for each distinct (column, rotation)
+drop of the current piece, the board after it locks and clears lines. The
+helpers here work on stacks of boards as (K, height, width) bool arrays, so one
+call returns every afterstate with its line count and observation features,
+ready for a single batched network forward. VectorTetris uses the same board
+functions for its observations.
+"""
+from collections import namedtuple
+import numpy as np
+from tetris_tables import ACTION_ROTATIONS
+from tetris_core import GAME_OVER_ROWS
+
+# One row per distinct placement, grouped by game
+Placements = namedtuple('Placements', [
+    'env',          # Index of the game (or board) the placement belongs to
+    'columns',      # Leftmost column of the drop
+    'rotations',    # Canonical rotation of the drop (duplicates of symmetric shapes are left out)
+    'actions',      # TetrisWrapper action index, column * ACTION_ROTATIONS + rotation
+    'boards',       # (K, height, width) bool board after locking and clearing lines
+    'lines',        # Lines cleared by the drop
+    'game_over',    # The drop leaves a block in the top GAME_OVER_ROWS rows
+    'features',     # (K, feature_size) board part of the TetrisWrapper observation
+])
+
+
+def feature_size(width):
+    """Length of the board part of the observation."""
+    return width + 3 + width + (width - 1) + 4
+
+
+def rows_to_board(rows, width):
+    """Bitmask rows (bit x is column x) as a (height, width) bool array."""
+    rows = np.asarray(rows, dtype=np.int64)
+    return (rows[..., None] >> np.arange(width)) & 1 == 1
+
+
+def column_heights(boards):
+    height = boards.shape[-2]
+    return np.where(boards.any(axis=-2), height - boards.argmax(axis=-2), 0)
+
+
+def clear_full_rows(boards):
+    """Removes full rows of every board in place. Returns the lines cleared per board."""
+    height = boards.shape[1]
+    full = boards.all(axis=2)
+    lines = full.sum(axis=1)
+    cleared = np.flatnonzero(lines)
+    if len(cleared):
+        # Stable sort puts full rows on top and keeps the others in order, then blank them
+        order = np.argsort(~full[cleared], axis=1, kind='stable')
+        moved = np.take_along_axis(boards[cleared], order[:, :, None], axis=1)
+        moved[np.arange(height)[None, :] < lines[cleared, None]] = False
+        boards[cleared] = moved
+    return lines
+
+
+def board_features(boards):
+    """
+    Board features of a (K, height, width) stack, as arrays with a leading board axis.
+
+    Same definitions as BoardFeatureView, plus the neighbouring height differences.
+    """
+    count, height, width = boards.shape
+    heights = column_heights(boards)
+    column_holes = heights - boards.sum(axis=1)
+
+    walls = np.full((count, 1), height)
+    padded = np.concatenate([walls, heights, walls], axis=1)
+    wells = np.maximum(0, np.minimum(padded[:, :-2], padded[:, 2:]) - heights)
+    diffs = heights[:, :-1] - heights[:, 1:]
+
+    side = np.ones((count, height, 1), dtype=bool)
+    rows = np.concatenate([side, boards, side], axis=2)
+    row_transitions = (rows[:, :, 1:] != rows[:, :, :-1]).sum(axis=(1, 2))
+    cap = np.ones((count, 1, width), dtype=bool)
+    cols = np.concatenate([cap, boards, cap], axis=1)
+    column_transitions = (cols[:, 1:] != cols[:, :-1]).sum(axis=(1, 2))
+
+    return {
+        'heights': heights,
+        'max_height': heights.max(axis=1),
+        'column_holes': column_holes,
+        'holes': column_holes.sum(axis=1),
+        'bumpiness': np.abs(diffs).sum(axis=1),
+        'wells': wells,
+        'cumulative_wells': wells.sum(axis=1),
+        'diffs': diffs,
+        'row_transitions': row_transitions,
+        'column_transitions': column_transitions,
+        'near_full_rows': (boards.sum(axis=2) == width - 1).sum(axis=1),
+    }
+
+
+def feature_matrix(features, lines, out=None):
+    """
+    Stacks board_features() into the board part of the TetrisWrapper observation.
+
+    Returns:
+        np.ndarray: (K, feature_size) float32, written into `out` when given.
+    """
+    count, width = features['heights'].shape
+    if out is None:
+        out = np.empty((count, feature_size(width)), dtype=np.float32)
+    offset = 0
+    for key, size in (('heights', width), ('max_height', 1), ('holes', 1), ('bumpiness', 1),
+                      ('wells', width), ('diffs', width - 1), ('row_transitions', 1),
+                      ('column_transitions', 1), ('cumulative_wells', 1)):
+        out[:, offset:offset + size] = features[key].reshape(count, size)
+        offset += size
+    out[:, offset] = np.asarray(lines) * 10  # "eroded cells" as in TetrisWrapper
+    return out
+
+
+def lock_placements(boards, cell_xs, cell_ys, features=True):
+    """
+    Writes one piece into each board, clears lines and computes the afterstate arrays.
+
+    Cells above the field are dropped like Board.place. Returns (lines, game_over, features),
+    with features None when `features` is False.
+    """
+    count = len(boards)
+    inside = cell_ys >= 0
+    index = np.broadcast_to(np.arange(count)[:, None], cell_ys.shape)
+    boards[index[inside], cell_ys[inside], cell_xs[inside]] = True
+    lines = clear_full_rows(boards)
+    game_over = boards[:, :GAME_OVER_ROWS].any(axis=(1, 2))
+    if not features:
+        return lines, game_over, None
+    return lines, game_over, feature_matrix(board_features(boards), lines)
+
+
+def enumerate_placements(core):
+    """Every distinct placement of `core`'s falling piece; see enumerate_placements_batch."""
+    return enumerate_placements_batch([core])
+
+
+def enumerate_placements_batch(cores):
+    """
+    Every distinct placement of the falling piece of each TetrisCore in `cores`.
+
+    Placements come from TetrisCore.distinct_placements: the distinct rotation states
+    and legal columns of the placement table, resolved like TetrisWrapper's
+    place-then-hard-drop, without drops that a blocked path sends onto the same
+    cells as an earlier one. The live games are not touched.
+
+    Returns:
+        Placements: arrays with one row per placement, `env` indexing into `cores`.
+    """
+    if not cores:
+        raise ValueError('enumerate_placements_batch needs at least one game')
+    width, height = cores[0].board.width, cores[0].board.height
+    env, columns, rotations, cell_xs, cell_ys = [], [], [], [], []
+    for index, core in enumerate(cores):
+        if (core.board.width, core.board.height) != (width, height):
+            raise ValueError('All games in a batch need the same board size')
+        for column, rotation, cells in core.distinct_placements():
+            env.append(index)
+            columns.append(column)
+            rotations.append(rotation)
+            cell_xs.append([x for x, _ in cells])
+            cell_ys.append([y for _, y in cells])
+
+    env = np.array(env, dtype=np.int64)
+    grids = np.array([rows_to_board(core.board.rows, width) for core in cores])
+    boards = grids[env]
+    lines, game_over, features = lock_placements(
+        boards, np.array(cell_xs, dtype=np.int64).reshape(-1, 4), np.array(cell_ys, dtype=np.int64).reshape(-1, 4))
+    columns = np.array(columns, dtype=np.int64)
+    rotations = np.array(rotations, dtype=np.int64)
+    actions = columns * ACTION_ROTATIONS + rotations
+    return Placements(env, columns, rotations, actions, boards, lines, game_over, features)
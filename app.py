@@ -1,6 +1,7 @@
 from tetris_settings import *
 import sys
 from tetris import Tetris
+from recording import Recorder
 import pygame as pg
 from tetris_text import Text
 from menu import Menu
@@ -8,10 +9,12 @@ from tetromino import Tetromino
 from block import Block
 
 class App:
-    def __init__(self):
+    def __init__(self, recorder=None):
         pg.init()
         pg.display.set_caption('Tetris')
-        self.screen = pg.display.set_mode(WIN_RES)
+        self.board_config = BoardConfig()
+        self.field_width, self.field_height = self.board_config.size
+        self.screen = pg.display.set_mode(self.board_config.win_res)
         self.clock = pg.time.Clock()
         self.set_timer()
         self.tetris = Tetris(self)
@@ -19,12 +22,15 @@ class App:
         self.menu = Menu(self)
         self.allowed_shapes = list(TETROMINOES.keys())  
         self.game_state = GAME_STATES['MENU']
+        self.recorder = recorder  # recording.Recorder that logs every game started from the menu
 
     def check_event(self):
         self.anim_trigger = False
         self.fast_anim_trigger = False
         for event in pg.event.get():
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
+                if self.recorder is not None:
+                    self.recorder.close()
                 pg.quit()
                 sys.exit()
             elif event.type == pg.KEYDOWN:
@@ -56,7 +62,7 @@ class App:
     def draw(self):
         self.screen.fill(BG_COLOR)
         if self.game_state == GAME_STATES['PLAYING']:
-            self.screen.fill(FIELD_COLOR, rect=(0, 0, *FIELD_RES))
+            self.screen.fill(FIELD_COLOR, rect=(0, 0, *self.tetris.config.res))
             self.tetris.draw()
             self.text.draw()
         else:
@@ -72,17 +78,16 @@ class App:
     def set_field_dimensions(self, width, height):
         self.field_width = width
         self.field_height = height
-        
-        # Update global constants
-        new_win_res = update_field_dimensions(width, height)
-        
+        self.board_config = BoardConfig(width, height)
+
         # Resize screen
-        self.screen = pg.display.set_mode(new_win_res)
-        
+        self.screen = pg.display.set_mode(self.board_config.win_res)
+
         # If game is already initialized, reset it with new dimensions
         if hasattr(self, 'tetris'):
-            self.tetris.reset_game()
+            self.tetris.reset_game(self.board_config)
 
 if __name__ == '__main__':
-    app = App()
+    # python app.py [recording file] records the games played
+    app = App(Recorder(sys.argv[1]) if len(sys.argv) > 1 else None)
     app.run()
@@ -0,0 +1,272 @@
+"""
+Heuristic player for generating imitation data in bulk.
+
+AutoPlayer runs many games at once on a VectorTetris. Every step it scores every
+placement of every board's piece with the Dellacherie weights, using array math on
+the column heights and row fills rather than building each afterstate board, and
+plays the best placement of each board. The
+transitions (state, action, reward, next_state, done) use TetrisWrapper's
+observations, actions and rewards. ChunkWriter streams them to .npz chunk files
+that load_chunks() reads back, either as arrays or straight into a replay buffer.
+"""
+import os
+import time
+import numpy as np
+from tetris_rules import STAGE_BOARD_SIZES, stage_params
+from tetris_features import DELLACHERIE_W
+from tetris_core import GAME_OVER_ROWS
+from tetris_tables import ACTION_ROTATIONS
+from vector_tetris import VectorTetris
+from afterstates import column_heights, lock_placements
+
+TRANSITION_KEYS = ('states', 'actions', 'rewards', 'next_states', 'dones')
+
+
+def dellacherie_terms(boards, lines):
+    """(K, 4) aggregate height, lines, holes and bumpiness of a stack of boards."""
+    heights = column_heights(boards)
+    holes = heights.sum(axis=1) - boards.sum(axis=(1, 2))
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    return np.column_stack([heights.sum(axis=1), lines, holes, bumpiness])
+
+
+def heuristic_scores(placements, weights=DELLACHERIE_W):
+    """
+    Dellacherie score of every afterstate in a Placements; placements that end the
+    game score -inf so they are only picked when nothing else is left.
+    """
+    scores = dellacherie_terms(placements.boards, placements.lines) @ np.asarray(weights)
+    return np.where(placements.game_over, -np.inf, scores)
+
+
+def placement_terms(env):
+    """
+    dellacherie_terms() of every distinct placement on a VectorTetris, without building
+    the afterstate boards.
+
+    Heights, cell counts and row fills of the current boards are updated with the four
+    cells of each piece; only placements that clear lines are locked on board copies
+    and measured there.
+
+    Returns:
+        tuple: (index, actions, terms, game_over) with one row per placement, `index`
+        giving its board.
+    """
+    index, columns, rotations, _, cell_xs, cell_ys, first = env.resolve_placements()
+    keep = np.flatnonzero(first == np.arange(len(index)))
+    index, cell_xs, cell_ys = index[keep], cell_xs[keep], cell_ys[keep]
+    actions = columns[keep] * ACTION_ROTATIONS + rotations[keep]
+
+    boards, width, height = env.boards, env.width, env.height
+    rows = np.arange(len(index))
+    inside = cell_ys >= 0
+    fill = boards.sum(axis=2)[index]
+    heights = column_heights(boards)[index]
+    for cell in range(4):
+        xs, ys = cell_xs[:, cell], cell_ys[:, cell]
+        fill[rows, np.maximum(ys, 0)] += inside[:, cell]
+        heights[rows, xs] = np.maximum(heights[rows, xs], np.where(inside[:, cell], height - ys, 0))
+    lines = (fill == width).sum(axis=1)
+    cells = boards.sum(axis=(1, 2))[index] + inside.sum(axis=1) - lines * width
+
+    cleared = np.flatnonzero(lines)
+    if len(cleared):
+        cleared_boards = boards[index[cleared]]
+        lock_placements(cleared_boards, cell_xs[cleared], cell_ys[cleared], features=False)
+        heights[cleared] = column_heights(cleared_boards)
+
+    terms = np.column_stack([heights.sum(axis=1), lines, heights.sum(axis=1) - cells,
+                             np.abs(np.diff(heights, axis=1)).sum(axis=1)])
+    game_over = heights.max(axis=1) > height - GAME_OVER_ROWS
+    return index, actions, terms, game_over
+
+
+def best_actions(index, actions, scores, num_envs):
+    """Action of the best scoring placement of each board (ties go to the first one)."""
+    order = np.lexsort((-scores, index))
+    index = index[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = index[1:] != index[:-1]
+    best = np.zeros(num_envs, dtype=np.int64)
+    best[index[first]] = actions[order[first]]
+    return best
+
+
+class AutoPlayer:
+    """
+    Heuristic play of `num_envs` games of one curriculum stage.
+
+    Args:
+        num_envs (int): Games played in lockstep.
+        stage (int): Curriculum stage; sets the board size and the allowed shapes.
+        weights (tuple): Aggregate height, lines, holes and bumpiness weights.
+        epsilon (float): Share of moves replaced by a random legal placement, to
+            widen the states the data covers.
+        seed (int): Seed of the piece and exploration draws.
+    """
+
+    def __init__(self, num_envs=256, stage=5, weights=DELLACHERIE_W, epsilon=0.0, seed=None):
+        width, height = STAGE_BOARD_SIZES.get(stage, (10, 20))
+        _, _, allowed_shapes = stage_params(stage)
+        self.stage = stage
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.epsilon = epsilon
+        self.env = VectorTetris(num_envs, width, height, allowed_shapes, seed=seed)
+        self.rng = np.random.default_rng(None if seed is None else seed + 1)
+        self.observations = self.env.reset()
+        self.games_finished = 0
+        self.lines_cleared = 0
+
+    def select_actions(self):
+        """Best (or, with probability epsilon, a random legal) action for every board."""
+        env = self.env
+        index, actions, terms, game_over = placement_terms(env)
+        scores = np.where(game_over, -np.inf, terms @ self.weights)
+        best = best_actions(index, actions, scores, env.num_envs)
+        if self.epsilon > 0:
+            explore = self.rng.random(env.num_envs) < self.epsilon
+            if explore.any():
+                # A random placement per board: rank by random scores instead
+                random_best = best_actions(index, actions, self.rng.random(len(index)), env.num_envs)
+                best = np.where(explore, random_best, best)
+        return best
+
+    def step(self):
+        """
+        Plays one move on every board.
+
+        Returns:
+            dict: 'states', 'actions', 'rewards', 'next_states' and 'dones' arrays with
+            one row per board; next_states of finished games are their last observation,
+            not the first one of the next game.
+        """
+        states = self.observations
+        actions = self.select_actions()
+        observations, rewards, dones, info = self.env.step(actions)
+        next_states = observations.copy()
+        next_states[dones] = info['final_observation']
+        self.observations = observations
+        self.games_finished += int(dones.sum())
+        self.lines_cleared += int(info['lines_cleared'].sum())
+        return {
+            'states': states,
+            'actions': actions,
+            'rewards': rewards.astype(np.float32),
+            'next_states': next_states,
+            'dones': dones,
+        }
+
+
+class ChunkWriter:
+    """
+    Collects transition batches and writes them as .npz files of `chunk_size` rows.
+
+    Files are named `<prefix>_<index>.npz` in `directory` and hold the TRANSITION_KEYS
+    arrays plus the stage they came from.
+    """
+
+    def __init__(self, directory, prefix='transitions', chunk_size=100000, stage=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.stage = stage
+        self.pending = []
+        self.pending_rows = 0
+        self.chunks_written = 0
+        self.rows_written = 0
+        self.paths = []
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, batch):
+        self.pending.append(batch)
+        self.pending_rows += len(batch['actions'])
+        while self.pending_rows >= self.chunk_size:
+            self.write(self.chunk_size)
+
+    def write(self, rows):
+        merged = {key: np.concatenate([batch[key] for batch in self.pending]) for key in TRANSITION_KEYS}
+        path = os.path.join(self.directory, f'{self.prefix}_{self.chunks_written:05d}.npz')
+        np.savez(path, stage=-1 if self.stage is None else self.stage,
+                 **{key: array[:rows] for key, array in merged.items()})
+        self.paths.append(path)
+        self.chunks_written += 1
+        self.rows_written += rows
+        rest = {key: array[rows:] for key, array in merged.items()}
+        self.pending_rows = len(rest['actions'])
+        self.pending = [rest] if self.pending_rows else []
+
+    def close(self):
+        """Writes whatever is left as a last, shorter chunk."""
+        if self.pending_rows:
+            self.write(self.pending_rows)
+        return self.paths
+
+
+def generate(directory, transitions_per_stage, stages=(1, 2, 3, 4, 5), num_envs=256,
+             chunk_size=100000, epsilon=0.0, seed=None, verbose=True):
+    """
+    Plays every stage with AutoPlayer and writes its transitions to `directory`.
+
+    Args:
+        directory (str): Output directory; stage s goes to files 'stage<s>_<index>.npz'.
+        transitions_per_stage (int): Transitions to record per stage, rounded up to
+            whole steps of `num_envs` games.
+
+    Returns:
+        list: Paths of the chunk files written.
+    """
+    paths = []
+    for stage in stages:
+        player = AutoPlayer(num_envs, stage, epsilon=epsilon, seed=None if seed is None else seed + stage)
+        writer = ChunkWriter(directory, prefix=f'stage{stage}', chunk_size=chunk_size, stage=stage)
+        start = time.perf_counter()
+        while writer.rows_written + writer.pending_rows < transitions_per_stage:
+            writer.add(player.step())
+        paths += writer.close()
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"Stage {stage}: {writer.rows_written} transitions in {elapsed:.1f}s "
+                  f"({writer.rows_written / elapsed:.0f}/s), {player.games_finished} games finished, "
+                  f"{player.lines_cleared} lines cleared")
+    return paths
+
+
+def load_chunks(paths, buffer=None, stage=None):
+    """
+    Reads chunk files written by ChunkWriter.
+
+    Args:
+        paths (list | str): Chunk files, or a directory to read every .npz file of
+            (such as the one generate() wrote all stages to).
+        buffer: Replay buffer to push the transitions into. push_batch() is used
+            when the buffer has it, otherwise one push() per transition.
+        stage (int): Only read the chunks of this stage. Observation sizes depend on
+            the board width, so chunks of several stages cannot be read together.
+
+    Returns:
+        dict: The TRANSITION_KEYS arrays of all chunks concatenated, or the buffer
+        when one was given.
+    """
+    if isinstance(paths, str):
+        paths = sorted(os.path.join(paths, name) for name in os.listdir(paths) if name.endswith('.npz'))
+    chunks = []
+    stages = set()
+    for path in paths:
+        with np.load(path) as data:
+            chunk_stage = int(data['stage'])
+            if stage is not None and chunk_stage != stage:
+                continue
+            chunk = {key: data[key] for key in TRANSITION_KEYS}
+        stages.add(chunk_stage)
+        if len(stages) > 1:
+            raise ValueError(f'The chunks hold stages {sorted(stages)}; pass stage= to read one of them')
+        if buffer is None:
+            chunks.append(chunk)
+        elif hasattr(buffer, 'push_batch'):
+            buffer.push_batch(*(chunk[key] for key in TRANSITION_KEYS))
+        else:
+            for transition in zip(*(chunk[key] for key in TRANSITION_KEYS)):
+                buffer.push(*transition)
+    if buffer is not None:
+        return buffer
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in TRANSITION_KEYS}
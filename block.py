@@ -7,9 +7,10 @@ class Block(pg.sprite.Sprite):
         # Initialize sprite AFTER setting tetromino to ensure proper group assignment
         super().__init__(self.tetromino.tetris.sprite_group)
         
-        self.pos = vec(pos) + INIT_POS_OFFSET
-        self.next_pos = vec(pos) + NEXT_POS_OFFSET
-        self.hold_pos = vec(pos) + HOLD_POS_OFFSET
+        config = tetromino.config
+        self.pos = vec(pos) + config.init_pos_offset
+        self.next_pos = vec(pos) + config.next_pos_offset
+        self.hold_pos = vec(pos) + config.hold_pos_offset
         self.color = color
         
         self.image = pg.Surface([TILE_SIZE, TILE_SIZE])
@@ -46,7 +47,7 @@ class Block(pg.sprite.Sprite):
             if self.in_field:
                 tetris = self.tetromino.tetris
                 x, y = int(self.pos.x), int(self.pos.y)
-                if 0 <= x < FIELD_W and 0 <= y < FIELD_H:
+                if 0 <= x < tetris.config.width and 0 <= y < tetris.config.height:
                     if tetris.field_array[y][x] == self:
                         tetris.field_array[y][x] = 0
 
@@ -60,26 +61,6 @@ class Block(pg.sprite.Sprite):
 
         self.rect.topleft = pos * TILE_SIZE
 
-    def is_collide(self, pos):
-        x, y = int(pos.x), int(pos.y)
-        
-        # Get field dimensions from the tetromino's tetris instance
-        field_array = self.tetromino.tetris.field_array
-        field_height = len(field_array)
-        field_width = len(field_array[0]) if field_height > 0 else 0
-        
-        # Check bounds using actual field dimensions
-        if not (0 <= x < field_width and y < field_height):
-            return True
-        if y >= 0 and self.tetromino.tetris.field_array[y][x]:
-            return True
-        return False
-
     def update(self):
         self.is_alive()
         self.set_rect_pos()
-
-    def rotate(self, pivot_pos):
-        translated = self.pos - pivot_pos
-        rotated = translated.rotate(90)
-        return rotated + pivot_pos
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Board pictures and recordings drawn with NumPy.
+
+A picture starts as an array of cell codes (see tetris_core: EMPTY_CODE, the
+SHAPE_CODES of each piece and LOCKED_CODE), decoded from Board.shape_rows in a
+few array operations. It is upscaled by repeating every cell `scale` times in
+each direction and turned into RGB with one palette lookup, for one board or a
+whole batch at once. FrameWriter streams frames to a GIF or video
+file one at a time, so recording a game takes the same memory however long it is.
+"""
+import io
+import os
+import struct
+import numpy as np
+from tetris_core import SHAPES, SHAPE_CODES, LOCKED_CODE, CODE_BITS
+from tetris_tables import PIECE_ROTATIONS
+
+# RGB of every cell code: empty, the SHAPES in order, locked cells of unknown shape
+SHAPE_RGB = {
+    'I': (0, 255, 255), 'O': (255, 255, 0), 'T': (128, 0, 128),
+    'S': (0, 255, 0), 'Z': (255, 0, 0), 'J': (0, 0, 255),
+    'L': (255, 165, 0),
+}
+EMPTY_RGB = (0, 0, 0)
+LOCKED_RGB = (200, 200, 200)
+PALETTE = np.array([EMPTY_RGB] + [SHAPE_RGB[shape] for shape in SHAPES] + [LOCKED_RGB], dtype=np.uint8)
+
+PANEL_WIDTH = 6     # Columns of the side panel of game_codes() showing the next and held pieces
+
+
+def cell_codes(shape_rows, width):
+    """
+    (..., height) Board.shape_rows values as (..., height, width) uint8 cell codes.
+
+    Rows of up to 16 columns fit a uint64 and decode with one shift; wider boards
+    go through Python ints.
+    """
+    if width * CODE_BITS <= 64:
+        rows = np.asarray(shape_rows, dtype=np.uint64)
+        shifts = (np.arange(width) * CODE_BITS).astype(np.uint64)
+        return ((rows[..., None] >> shifts) & np.uint64((1 << CODE_BITS) - 1)).astype(np.uint8)
+    mask = (1 << CODE_BITS) - 1
+    return np.array([[(row >> CODE_BITS * x) & mask for x in range(width)] for row in shape_rows],
+                    dtype=np.uint8)
+
+
+def board_codes(core, piece=True):
+    """
+    Cell codes of a TetrisCore's board.
+
+    Args:
+        core (TetrisCore): Game to draw.
+        piece (bool): Also draw the falling piece where it is.
+
+    Returns:
+        np.ndarray: (height, width) uint8 codes.
+    """
+    board = core.board
+    codes = cell_codes(board.shape_rows, board.width)
+    if piece and not core.game_over:
+        for x, y in core.cells():
+            if 0 <= y < board.height:
+                codes[y, x] = SHAPE_CODES[core.shape]
+    return codes
+
+
+def piece_codes(shape):
+    """(2, 4) codes of `shape` in its flattest rotation, top left aligned; empty for None."""
+    codes = np.zeros((2, 4), dtype=np.uint8)
+    if shape is not None:
+        cells = min(PIECE_ROTATIONS[shape], key=lambda cells: max(dy for _, dy in cells) - min(dy for _, dy in cells))
+        left = min(dx for dx, _ in cells)
+        top = min(dy for _, dy in cells)
+        for dx, dy in cells:
+            codes[dy - top, dx - left] = SHAPE_CODES[shape]
+    return codes
+
+
+def game_codes(core, piece=True):
+    """
+    Cell codes of the board with a PANEL_WIDTH-column side panel showing the next
+    piece at the top and the held piece below it.
+
+    Returns:
+        np.ndarray: (height, width + PANEL_WIDTH) uint8 codes.
+    """
+    board = core.board
+    codes = np.zeros((board.height, board.width + PANEL_WIDTH), dtype=np.uint8)
+    codes[:, :board.width] = board_codes(core, piece)
+    left = board.width + 1
+    codes[1:3, left:left + 4] = piece_codes(core.next_shape)
+    codes[4:6, left:left + 4] = piece_codes(core.held_piece)
+    return codes
+
+
+def upscale(codes, scale):
+    """Repeats every cell of (..., height, width) codes into a scale x scale square."""
+    if scale == 1:
+        return codes
+    *batch, height, width = codes.shape
+    expanded = np.broadcast_to(codes[..., :, None, :, None], (*batch, height, scale, width, scale))
+    return expanded.reshape(*batch, height * scale, width * scale)
+
+
+def render_codes(codes, scale=1, palette=PALETTE):
+    """
+    RGB frames of cell codes.
+
+    Args:
+        codes (np.ndarray): (..., height, width) codes, one board or a batch.
+        scale (int): Pixels per cell side.
+        palette (np.ndarray): (codes, 3) uint8 colors.
+
+    Returns:
+        np.ndarray: (..., height * scale, width * scale, 3) uint8.
+    """
+    # Colors are looked up on rows widened to the full width; repeating those rows
+    # is a plain block copy, much cheaper than gathering every pixel
+    rows = palette[np.repeat(codes, scale, axis=-1)]
+    return np.repeat(rows, scale, axis=-3)
+
+
+def render_boards(boards, scale=1, palette=PALETTE):
+    """
+    RGB frames of boards given as (..., height, width) bool arrays (VectorTetris
+    boards, afterstates), with filled cells in the LOCKED_CODE color.
+    """
+    return render_codes(np.asarray(boards, dtype=np.uint8) * np.uint8(LOCKED_CODE), scale, palette)
+
+
+def gif_image_block(data):
+    """
+    The picture of a single-frame GIF file as one self-contained block: its image
+    descriptor, with the file's global color table moved in as a local one, and
+    the compressed pixels. Extensions before the picture are dropped.
+    """
+    flags = data[10]
+    position = 13
+    color_table = b''
+    if flags & 0x80:
+        color_table = data[position:position + (3 << (flags & 7) + 1)]
+        position += len(color_table)
+    while data[position] == 0x21:       # Extension: introducer, label, then sub-blocks
+        position += 2
+        while data[position]:
+            position += data[position] + 1
+        position += 1
+    if data[position] != 0x2C:
+        raise ValueError('No image descriptor in the GIF data')
+    descriptor = bytearray(data[position:position + 10])
+    if not descriptor[9] & 0x80:
+        descriptor[9] |= 0x80 | (flags & 7)
+        descriptor += color_table
+    return bytes(descriptor) + data[position + 10:-1]    # Without the ';' trailer
+
+
+class FrameWriter:
+    """
+    Writes frames to an animation file as they come.
+
+    GIF frames are each encoded by Pillow as a one-frame GIF, whose picture is
+    appended to the file with its own color table (code frames go in as they are,
+    RGB frames are mapped to the nearest palette color). Other formats (.mp4 and
+    the rest of ffmpeg's) go through imageio's streaming writer. Either way no
+    frame is kept after append() returns. A GIF that got no frames is not written.
+
+    Args:
+        path (str): Output file; the extension picks the format.
+        fps (float): Frames per second.
+        palette (np.ndarray): Colors of code frames.
+    """
+
+    def __init__(self, path, fps=10, palette=PALETTE):
+        self.path = path
+        self.fps = fps
+        self.palette = palette
+        self.frames = 0
+        self.gif = os.path.splitext(path)[1].lower() == '.gif'
+        self.file = None
+        self.writer = None
+        if self.gif:
+            from PIL import Image
+
+            self.palette_image = Image.new('P', (1, 1))
+            self.palette_image.putpalette(palette.ravel().tolist())
+        else:
+            import imageio
+            self.writer = imageio.get_writer(path, fps=fps)
+
+    def append(self, frame):
+        """
+        Writes one frame.
+
+        Args:
+            frame (np.ndarray): (H, W) cell codes (see render_codes; upscale them
+                first) or an (H, W, 3) uint8 RGB image.
+        """
+        if self.gif:
+            self.append_gif(frame)
+        else:
+            self.writer.append_data(self.palette[frame] if frame.ndim == 2 else frame)
+        self.frames += 1
+
+    def append_gif(self, frame):
+        from PIL import Image
+
+        if frame.ndim == 2:
+            image = Image.fromarray(np.ascontiguousarray(frame, dtype=np.uint8))
+            image.putpalette(self.palette.ravel().tolist())     # 'L' becomes 'P'
+        else:
+            image = Image.fromarray(np.ascontiguousarray(frame)).quantize(palette=self.palette_image, dither=0)
+        encoded = io.BytesIO()
+        image.save(encoded, format='GIF')
+
+        if self.file is None:
+            # Header and logical screen without a global color table, then the loop-forever extension
+            self.file = open(self.path, 'wb')
+            self.file.write(b'GIF89a' + struct.pack('<2H3B', image.width, image.height, 0, 0, 0))
+            self.file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', 0) + b'\x00')
+        # Graphic control extension holding the frame delay in hundredths of a second
+        self.file.write(b'\x21\xf9\x04\x00' + struct.pack('<H', round(100 / self.fps)) + b'\x00\x00')
+        self.file.write(gif_image_block(encoded.getvalue()))
+
+    def close(self):
+        if self.file is not None:
+            if not self.file.closed:
+                self.file.write(b';')   # GIF trailer
+                self.file.close()
+        elif self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,146 @@
+"""
+Board observations as (channels, height, width) tensors for convolutional agents.
+
+The planes, in BOARD_CHANNELS order, are the locked cells, the falling piece,
+the cells it would land on if hard-dropped (the ghost piece) and the next and
+held pieces drawn where they would spawn. Everything is decoded from the packed
+board rows: a row bitmask indexes a (2**width, width) table of cell patterns, so
+a whole stack of boards is one fancy index, and the piece planes are a handful
+of indexed writes. A batch of games costs a few NumPy calls and one small loop
+over the games for their piece positions, about what the feature vector costs.
+"""
+import numpy as np
+from tetris_core import SHAPES, SHAPE_INDEX
+from tetris_tables import PIECE_ROTATIONS, PIECE_MASKS
+from afterstates import rows_to_board
+
+BOARD_CHANNELS = ('occupancy', 'current', 'ghost', 'next', 'held')
+BOARD_DTYPES = (np.uint8, np.float32)
+NO_SHAPE = len(SHAPES)      # Index of the empty plane, for a missing next or held piece
+MAX_TABLE_WIDTH = 16        # Wider boards are decoded by shifting instead of a table lookup
+
+ROW_TABLES = {}
+SPAWN_PLANES = {}
+
+
+def board_tensor_shape(width, height):
+    """Shape of the board observation of a `width` x `height` board."""
+    return (len(BOARD_CHANNELS), height, width)
+
+
+def get_row_table(width):
+    """(2**width, width) uint8 table: row bitmask -> its cells."""
+    if width not in ROW_TABLES:
+        masks = np.arange(1 << width)
+        ROW_TABLES[width] = ((masks[:, None] >> np.arange(width)) & 1).astype(np.uint8)
+    return ROW_TABLES[width]
+
+
+def decode_rows(rows, width):
+    """(..., height) row bitmasks as (..., height, width) 0/1 cells."""
+    if width <= MAX_TABLE_WIDTH:
+        return get_row_table(width).take(rows, axis=0)
+    return rows_to_board(rows, width)
+
+
+def spawn_cells(shape, width):
+    """(x, y) of the cells of `shape` at its spawn position, as TetrisCore.spawn puts it."""
+    left, right, top, _ = PIECE_MASKS[shape][0]
+    x = max(-left, min(width - 1 - right, width // 2 - 1))
+    return [(x + dx, dy - top) for dx, dy in PIECE_ROTATIONS[shape][0]]
+
+
+def get_spawn_planes(width, height):
+    """(len(SHAPES) + 1, height, width) uint8 planes of every shape at its spawn position; the last is empty."""
+    if (width, height) not in SPAWN_PLANES:
+        planes = np.zeros((NO_SHAPE + 1, height, width), dtype=np.uint8)
+        for shape, index in SHAPE_INDEX.items():
+            for x, y in spawn_cells(shape, width):
+                planes[index, y, x] = 1
+        SPAWN_PLANES[width, height] = planes
+    return SPAWN_PLANES[width, height]
+
+
+def shape_indices(shapes):
+    """SHAPES indices of a list of shape names, NO_SHAPE for None."""
+    return [NO_SHAPE if shape is None else SHAPE_INDEX[shape] for shape in shapes]
+
+
+def new_board_tensors(count, width, height, dtype=np.uint8):
+    if np.dtype(dtype) not in BOARD_DTYPES:
+        raise ValueError(f'Board observations are uint8 or float32, not {np.dtype(dtype)}')
+    return np.zeros((count, *board_tensor_shape(width, height)), dtype=dtype)
+
+
+def piece_cells(core):
+    """(xs, ys, ghost_ys) of the falling piece's cells inside the field and where a hard drop puts them."""
+    x, y, rotation = core.x, core.y, core.rotation
+    drop = core.drop_row(rotation, x, y) - y
+    xs, ys, ghost_ys = [], [], []
+    for dx, dy in PIECE_ROTATIONS[core.shape][rotation]:
+        if y + dy >= 0:
+            xs.append(x + dx)
+            ys.append(y + dy)
+            ghost_ys.append(y + dy + drop)
+    return xs, ys, ghost_ys
+
+
+def board_tensors(cores, out=None, dtype=np.uint8):
+    """
+    Board observations of several TetrisCores of the same size.
+
+    Args:
+        cores (list): TetrisCores to encode.
+        out (np.ndarray): (len(cores), C, H, W) uint8 or float32 array to write
+            into; a new one is allocated if None.
+        dtype: dtype of the new array.
+
+    Returns:
+        np.ndarray: The (len(cores), C, H, W) observations.
+    """
+    board = cores[0].board
+    if out is None:
+        out = new_board_tensors(len(cores), board.width, board.height, dtype)
+    width, height = board.width, board.height
+    out[:, 0] = decode_rows([core.board.rows for core in cores], width)
+
+    # Cells of the falling piece where it is and where it would land
+    envs, xs, ys, ghost_ys = [], [], [], []
+    for n, core in enumerate(cores):
+        cells = piece_cells(core)
+        envs += [n] * len(cells[0])
+        xs += cells[0]
+        ys += cells[1]
+        ghost_ys += cells[2]
+    out[:, 1:3] = 0
+    if envs:
+        out[envs, 1, ys, xs] = 1
+        out[envs, 2, ghost_ys, xs] = 1
+
+    planes = get_spawn_planes(width, height)
+    out[:, 3] = planes[shape_indices([core.next_shape for core in cores])]
+    out[:, 4] = planes[shape_indices([core.held_piece for core in cores])]
+    return out
+
+
+def board_tensor(core, out=None, dtype=np.uint8):
+    """
+    Board observation of one TetrisCore as a (C, H, W) array; see board_tensors.
+
+    Written plane by plane, with both piece planes set by one put() of flat
+    indices, since at batch size one the fixed cost of each NumPy call is what counts.
+    """
+    board = core.board
+    width, height = board.width, board.height
+    if out is None:
+        out = new_board_tensors(1, width, height, dtype)[0]
+    out[0] = decode_rows(board.rows, width)
+    out[1:3] = 0
+    xs, ys, ghost_ys = piece_cells(core)
+    plane = width * height
+    out.put([plane + y * width + x for x, y in zip(xs, ys)]
+            + [2 * plane + y * width + x for x, y in zip(xs, ghost_ys)], 1)
+    planes = get_spawn_planes(width, height)
+    out[3] = planes[NO_SHAPE if core.next_shape is None else SHAPE_INDEX[core.next_shape]]
+    out[4] = planes[NO_SHAPE if core.held_piece is None else SHAPE_INDEX[core.held_piece]]
+    return out
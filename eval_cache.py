@@ -0,0 +1,78 @@
+"""
+Bounded cache of board evaluations keyed on the Zobrist hash.
+
+Placement search and heuristic play score the same boards over and over, most of
+all on the small stage boards with few allowed shapes. EvalCache keeps the most
+recently used evaluations under keys built on the board's Zobrist hash (the
+planner's is (board hash, known pieces, depth)) and drops the least recently used
+one once it is full, so memory stays capped on long runs. Hashes depend on the
+board size, so use one cache per board size.
+"""
+from collections import OrderedDict, namedtuple
+
+CacheStats = namedtuple('CacheStats', ['size', 'max_size', 'hits', 'misses', 'evictions'])
+
+
+class EvalCache:
+    """
+    LRU mapping from state keys to evaluations (feature vectors, value estimates or
+    anything else), counting hits, misses and evictions.
+    """
+
+    def __init__(self, max_size=100000):
+        if max_size <= 0:
+            raise ValueError('max_size must be positive')
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """The cached value for `key` (marking it as recently used), or `default`."""
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        The cached value for `key`, calling `compute()` and caching its result on a miss.
+        """
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        """Drops every entry; the counters keep running."""
+        self.entries.clear()
+
+    def stats(self):
+        return CacheStats(len(self.entries), self.max_size, self.hits, self.misses, self.evictions)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
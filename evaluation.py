@@ -0,0 +1,207 @@
+"""
+Seeded evaluation of DQN policies over a pool of worker processes.
+
+Evaluator spreads the episodes of an evaluation over `num_workers` processes, each
+playing games greedily with a NumpyDQN copy of the policy on a VectorTetris, so the
+workers load neither torch, gym nor pygame. Episode i of an evaluation deals the
+pieces of a TetrisWrapper reset with seed `seed + i`, so two checkpoints evaluated
+with the same seed face the same piece sequences and compare() can pair their episodes.
+evaluate() waits for the results; submit() returns right away with a
+PendingEvaluation, so training can go on while the pool plays.
+"""
+import math
+import multiprocessing as mp
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+from numpy_inference import NumpyDQN, state_dict_arrays
+from piece_source import PieceSource
+from tetris_rules import TETROMINOES, STAGE_BOARD_SIZES
+from vector_tetris import VectorTetris
+
+# One evaluation episode
+EpisodeResult = namedtuple('EpisodeResult', [
+    'seed',         # Seed the episode was reset with
+    'reward',       # Sum of rewards
+    'lines',        # Lines cleared
+    'steps',        # Pieces placed
+    'score',        # Game score
+    'truncated',    # Stopped by max_steps rather than game over
+])
+
+EvaluationResult = namedtuple('EvaluationResult', [
+    'episodes', 'mean_reward', 'std_reward', 'min_reward', 'max_reward',
+    'mean_lines', 'max_lines', 'mean_steps', 'mean_score', 'truncated',
+    'results',      # EpisodeResults in seed order
+])
+
+PairedComparison = namedtuple('PairedComparison', [
+    'episodes',         # Seeds both evaluations played
+    'mean_difference',  # Mean reward of the first minus the second, per seed
+    'standard_error',   # Standard error of that mean
+    'wins', 'losses', 'ties',
+])
+
+def policy_weights(policy):
+    """
+    NumPy weights of a policy given as a DQNAgent, a TetrisDQN, a state dict or the
+    path of a file written by numpy_inference.export_checkpoint.
+    """
+    if isinstance(policy, str):
+        with np.load(policy) as data:
+            return {key: data[key] for key in data.files}
+    policy = getattr(policy, 'policy_net', policy)
+    if hasattr(policy, 'state_dict'):
+        policy = policy.state_dict()
+    return state_dict_arrays(policy)
+
+
+def play_episodes(weights, stage, seeds, max_steps, use_mask):
+    """
+    Plays one greedy episode per seed in this process, all seeds in lockstep on one
+    VectorTetris. Each game deals its pieces from a PieceSource seeded like
+    TetrisWrapper.reset(seed), so the episodes are the ones a TetrisWrapper of
+    `stage` would play, without loading torch, gym or pygame in the worker.
+    """
+    width, height = STAGE_BOARD_SIZES.get(stage, (10, 20))
+    count = len(seeds)
+    vector = VectorTetris(count, width, height,
+                          pieces=[PieceSource(TETROMINOES.keys(), seed=seed) for seed in seeds])
+    observations = vector.observations()
+    model = NumpyDQN(weights)
+
+    rewards = np.zeros(count)
+    lines = np.zeros(count, dtype=np.int64)
+    steps = np.zeros(count, dtype=np.int64)
+    scores = np.zeros(count, dtype=np.int64)
+    playing = np.ones(count, dtype=bool)
+    while playing.any() and steps.max() < max_steps:
+        actions = model.select_actions(observations, vector.action_masks() if use_mask else None)
+        observations, step_rewards, dones, info = vector.step(actions)
+        rewards += step_rewards * playing
+        lines += info['lines_cleared'] * playing
+        steps += playing
+        scores = np.where(playing, info['score'], scores)
+        playing &= ~dones
+    return [EpisodeResult(seed, float(rewards[n]), int(lines[n]), int(steps[n]), int(scores[n]), bool(playing[n]))
+            for n, seed in enumerate(seeds)]
+
+
+def summarize(results):
+    """EvaluationResult of a list of EpisodeResults."""
+    results = sorted(results, key=lambda result: result.seed)
+    rewards = np.array([result.reward for result in results], dtype=np.float64)
+    lines = np.array([result.lines for result in results], dtype=np.float64)
+    return EvaluationResult(
+        episodes=len(results),
+        mean_reward=float(rewards.mean()),
+        std_reward=float(rewards.std()),
+        min_reward=float(rewards.min()),
+        max_reward=float(rewards.max()),
+        mean_lines=float(lines.mean()),
+        max_lines=int(lines.max()),
+        mean_steps=float(np.mean([result.steps for result in results])),
+        mean_score=float(np.mean([result.score for result in results])),
+        truncated=sum(result.truncated for result in results),
+        results=results,
+    )
+
+
+def compare(first, second):
+    """
+    Paired comparison of two EvaluationResults over the seeds both played.
+
+    Returns:
+        PairedComparison: Reward differences first - second, episode by episode.
+    """
+    second_rewards = {result.seed: result.reward for result in second.results}
+    differences = np.array([result.reward - second_rewards[result.seed]
+                            for result in first.results if result.seed in second_rewards])
+    if not len(differences):
+        raise ValueError('The evaluations share no seeds')
+    standard_error = differences.std(ddof=1) / math.sqrt(len(differences)) if len(differences) > 1 else 0.0
+    return PairedComparison(len(differences), float(differences.mean()), float(standard_error),
+                            int((differences > 0).sum()), int((differences < 0).sum()),
+                            int((differences == 0).sum()))
+
+
+class PendingEvaluation:
+    """An evaluation running in the pool; result() waits for it and returns the EvaluationResult."""
+
+    def __init__(self, futures):
+        self.futures = futures
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def result(self, timeout=None):
+        results = []
+        for future in self.futures:
+            results += future.result(timeout)
+        return summarize(results)
+
+
+class Evaluator:
+    """
+    Pool of evaluation workers for one curriculum stage.
+
+    Args:
+        num_workers (int): Worker processes (default: CPU count); 0 plays in this process.
+        stage (int): Curriculum stage of the evaluation games.
+        num_episodes (int): Default episodes per evaluation.
+        seed (int): Default seed of the first episode.
+        max_steps (int): Pieces after which an episode is cut off.
+        use_mask (bool): Restrict the greedy action to legal placements.
+        start_method (str): multiprocessing start method of the pool.
+    """
+
+    def __init__(self, num_workers=None, stage=5, num_episodes=100, seed=0, max_steps=10000,
+                 use_mask=False, start_method='spawn'):
+        self.num_workers = mp.cpu_count() if num_workers is None else num_workers
+        self.stage = stage
+        self.num_episodes = num_episodes
+        self.seed = seed
+        self.max_steps = max_steps
+        self.use_mask = use_mask
+        self.executor = None
+        if self.num_workers:
+            self.executor = ProcessPoolExecutor(self.num_workers, mp_context=mp.get_context(start_method))
+
+    def submit(self, policy, num_episodes=None, seed=None):
+        """
+        Starts evaluating `policy` (see policy_weights) in the background. The weights
+        are copied now, so the policy can keep training.
+
+        Returns:
+            PendingEvaluation
+        """
+        weights = policy_weights(policy)
+        num_episodes = self.num_episodes if num_episodes is None else num_episodes
+        first = self.seed if seed is None else seed
+        seeds = list(range(first, first + num_episodes))
+        if self.executor is None:
+            future = Future()
+            future.set_result(play_episodes(weights, self.stage, seeds, self.max_steps, self.use_mask))
+            return PendingEvaluation([future])
+
+        # A few chunks per worker keep the pool busy when episode lengths differ
+        chunk_size = max(1, math.ceil(num_episodes / (4 * self.num_workers)))
+        futures = [self.executor.submit(play_episodes, weights, self.stage, seeds[start:start + chunk_size],
+                                        self.max_steps, self.use_mask)
+                   for start in range(0, num_episodes, chunk_size)]
+        return PendingEvaluation(futures)
+
+    def evaluate(self, policy, num_episodes=None, seed=None):
+        """Evaluates `policy` and waits for the EvaluationResult."""
+        return self.submit(policy, num_episodes, seed).result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
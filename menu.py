@@ -52,8 +52,12 @@ class Menu:
     def start_game(self):
         self.app.game_state = GAME_STATES['PLAYING']
         self.app.tetris = Tetris(self.app)
+        if self.app.recorder is not None:
+            self.app.recorder.begin(self.app.tetris)
 
     def quit_game(self):
+        if self.app.recorder is not None:
+            self.app.recorder.close()
         pg.quit()
         sys.exit()
 
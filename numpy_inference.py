@@ -0,0 +1,143 @@
+"""
+Torch-free inference for trained TetrisDQN agents.
+
+export_checkpoint() turns a DQNAgent.save_model checkpoint into a flat .npz file of
+the policy network's weights, and NumpyDQN runs the dueling network's forward pass
+on them with NumPy alone. At batch size 1 on CPU this skips the framework dispatch
+that dominates a torch forward pass, and players that only act (the App, evaluation
+workers) neither import torch nor hold the optimizer and target network.
+"""
+import numpy as np
+
+# Layers of TetrisDQN in forward order: (state dict prefix, kind)
+LAYERS = (
+    ('feature.0', 'linear'),
+    ('feature.1', 'layer_norm'),
+    ('feature.3', 'linear'),
+    ('feature.4', 'layer_norm'),
+    ('value_stream.0', 'linear'),
+    ('value_stream.2', 'linear'),
+    ('adv_stream.0', 'linear'),
+    ('adv_stream.2', 'linear'),
+)
+LAYER_NORM_EPS = 1e-5   # nn.LayerNorm default
+
+
+def state_dict_arrays(state_dict):
+    """The TetrisDQN parameters of a state dict as float32 arrays keyed like the state dict."""
+    arrays = {}
+    for prefix, _ in LAYERS:
+        for name in ('weight', 'bias'):
+            value = state_dict[f'{prefix}.{name}']
+            if hasattr(value, 'detach'):
+                value = value.detach().cpu().numpy()
+            arrays[f'{prefix}.{name}'] = np.asarray(value, dtype=np.float32)
+    return arrays
+
+
+def export_checkpoint(checkpoint_path, output_path, net=None, atol=1e-4):
+    """
+    Writes the policy network of a DQNAgent checkpoint as a NumPy .npz file.
+
+    Only this function needs torch, and it imports it when called.
+
+    Args:
+        checkpoint_path (str): File written by DQNAgent.save_model (a bare state dict
+            works too).
+        output_path (str): Where the .npz file goes.
+        net (nn.Module): Optional TetrisDQN holding the same weights; when given, the
+            NumPy forward pass is checked against it on random states.
+        atol (float): Largest Q-value difference the check accepts.
+
+    Returns:
+        NumpyDQN: The exported network.
+    """
+    import torch
+
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    state_dict = checkpoint.get('policy_net_state_dict', checkpoint)
+    arrays = state_dict_arrays(state_dict)
+    np.savez(output_path, **arrays)
+    model = NumpyDQN(arrays)
+
+    if net is not None:
+        states = np.random.default_rng(0).random((256, model.input_size), dtype=np.float32)
+        with torch.no_grad():
+            expected = net.cpu()(torch.as_tensor(states)).numpy()
+        difference = float(np.abs(model.forward(states) - expected).max())
+        if difference > atol:
+            raise ValueError(f'NumPy Q-values differ from torch by {difference:.2e} (> {atol:.0e})')
+    return model
+
+
+class NumpyDQN:
+    """
+    Forward pass of the dueling TetrisDQN on exported weights.
+
+    Args:
+        weights (str | dict): Path of a file written by export_checkpoint, or the
+            arrays of state_dict_arrays().
+    """
+
+    def __init__(self, weights):
+        if isinstance(weights, str):
+            with np.load(weights) as data:
+                weights = {key: data[key] for key in data.files}
+        # Linear weights transposed once so the forward pass is x @ W
+        self.layers = []
+        for prefix, kind in LAYERS:
+            weight = np.asarray(weights[f'{prefix}.weight'], dtype=np.float32)
+            bias = np.asarray(weights[f'{prefix}.bias'], dtype=np.float32)
+            if kind == 'linear':
+                weight = np.ascontiguousarray(weight.T)
+            self.layers.append((kind, weight, bias))
+        self.input_size = self.layers[0][1].shape[0]
+        self.n_actions = self.layers[-1][1].shape[1]
+
+    @staticmethod
+    def apply(layer, x):
+        kind, weight, bias = layer
+        if kind == 'linear':
+            return x @ weight + bias
+        mean = x.mean(axis=-1, keepdims=True)
+        variance = x.var(axis=-1, keepdims=True)
+        return (x - mean) / np.sqrt(variance + LAYER_NORM_EPS) * weight + bias
+
+    def forward(self, states):
+        """
+        Q-values of a batch of states.
+
+        Args:
+            states (np.ndarray): (N, input_size) observations, or one (input_size,) observation.
+
+        Returns:
+            np.ndarray: (N, n_actions) float32 Q-values, or (n_actions,) for one observation.
+        """
+        x = np.asarray(states, dtype=np.float32)
+        single = x.ndim == 1
+        if single:
+            x = x[None]
+        apply, layers = self.apply, self.layers
+        for layer in layers[:4]:
+            x = apply(layer, x)
+            if layer[0] == 'layer_norm':
+                np.maximum(x, 0.0, out=x)
+        value = apply(layers[5], np.maximum(apply(layers[4], x), 0.0))
+        advantage = apply(layers[7], np.maximum(apply(layers[6], x), 0.0))
+        q_values = value + (advantage - advantage.mean(axis=1, keepdims=True))
+        return q_values[0] if single else q_values
+
+    __call__ = forward
+
+    def select_actions(self, states, masks=None):
+        """Greedy actions of a batch, restricted to the legal ones when `masks` is given."""
+        q_values = self.forward(np.atleast_2d(states))
+        if masks is not None:
+            q_values = np.where(np.atleast_2d(masks), q_values, -np.inf)
+        return q_values.argmax(axis=1)
+
+    def select_action(self, state, mask=None):
+        """Greedy action for one observation (the array or TetrisWrapper's (observation, {}, {}) tuple)."""
+        if isinstance(state, (tuple, list)) and len(state) > 0 and isinstance(state[0], np.ndarray):
+            state = state[0]
+        return int(self.select_actions(state, None if mask is None else mask)[0])
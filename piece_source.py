@@ -0,0 +1,129 @@
+"""
+Seeded piece sequences, one generator per game.
+
+Every TetrisCore draws its pieces from its own PieceSource instead of the global
+`random` module, so games in one process (parallel environments, the planner's
+scratch game, paired benchmark runs) neither disturb each other's sequences nor
+depend on what else consumed random numbers. Pieces are generated `block_size` at a
+time as a NumPy array and handed out one by one. Blocks are never written after
+they are made, so get_state() only keeps references and saving or restoring the
+source costs the same whatever the block size. PieceSequence deals a fixed,
+recorded sequence instead (see recording).
+"""
+import random
+import numpy as np
+
+PIECE_MODES = ('uniform', 'bag')
+
+
+class PieceSource:
+    """
+    Piece generator of one game.
+
+    Args:
+        shapes (list): Shapes to draw from.
+        mode (str): 'uniform' draws every piece independently; 'bag' deals shuffled
+            bags holding each shape once (the "7-bag" with all seven shapes).
+        seed (int): Seed of the generator. None draws one from the global `random`
+            module, so a process seeded with random.seed() stays reproducible.
+        block_size (int): Pieces generated at a time (rounded up to whole bags).
+    """
+
+    def __init__(self, shapes, mode='uniform', seed=None, block_size=1024):
+        if mode not in PIECE_MODES:
+            raise ValueError(f'Unknown piece mode {mode!r}, expected one of {PIECE_MODES}')
+        self.mode = mode
+        self.block_size = block_size
+        self.shapes = list(shapes)
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """Restarts the sequence from `seed`."""
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+        self.rng_state = self.rng.bit_generator.state
+        self.block = None
+        self.position = 0
+
+    def set_shapes(self, shapes):
+        """Draws from `shapes` from now on, dropping pieces pre-generated for the old ones."""
+        shapes = list(shapes)
+        if shapes != self.shapes:
+            self.shapes = shapes
+            self.block = None
+            self.position = 0
+
+    def generate(self):
+        """A new block of shape indices, continuing the generator from the saved state."""
+        rng = self.rng
+        rng.bit_generator.state = self.rng_state
+        count = len(self.shapes)
+        if self.mode == 'bag':
+            bags = -(-self.block_size // count)
+            block = rng.permuted(np.tile(np.arange(count, dtype=np.int8), (bags, 1)), axis=1).ravel()
+        else:
+            block = rng.integers(count, size=self.block_size, dtype=np.int8)
+        self.rng_state = rng.bit_generator.state
+        self.block = block.tolist()
+        self.position = 0
+
+    def next(self):
+        """The next shape of the sequence."""
+        if self.block is None or self.position == len(self.block):
+            self.generate()
+        shape = self.shapes[self.block[self.position]]
+        self.position += 1
+        return shape
+
+    def peek(self, count):
+        """The next `count` shapes without drawing them."""
+        state = self.get_state()
+        shapes = [self.next() for _ in range(count)]
+        self.set_state(state)
+        return shapes
+
+    def get_state(self):
+        """Everything set_state() needs to replay the sequence from here; nothing is copied."""
+        return (self.shapes, self.block, self.position, self.rng_state)
+
+    def set_state(self, state):
+        shapes, self.block, self.position, self.rng_state = state
+        self.shapes = list(shapes)
+
+
+class PieceSequence:
+    """
+    Piece source that deals a given sequence, for replaying a recorded game.
+
+    Args:
+        sequence (list): Shapes in the order they were drawn.
+        shapes (list): Shapes the game allowed (reported through `shapes` only).
+    """
+
+    def __init__(self, sequence, shapes):
+        self.sequence = list(sequence)
+        self.shapes = list(shapes)
+        self.position = 0
+
+    def seed(self, seed=None):
+        """Deals the sequence from the start again; the seed is ignored."""
+        self.position = 0
+
+    def set_shapes(self, shapes):
+        self.shapes = list(shapes)
+
+    def next(self):
+        if self.position == len(self.sequence):
+            raise IndexError(f'The recorded sequence has only {len(self.sequence)} pieces')
+        shape = self.sequence[self.position]
+        self.position += 1
+        return shape
+
+    def peek(self, count):
+        return self.sequence[self.position:self.position + count]
+
+    def get_state(self):
+        return (self.shapes, self.position)
+
+    def set_state(self, state):
+        shapes, self.position = state
+        self.shapes = list(shapes)
@@ -0,0 +1,226 @@
+"""
+Lookahead player: beam search over placements with expectimax over unseen pieces.
+
+Planner.plan() looks at the falling piece, the visible next piece and optionally the
+hold slot. Pieces that are known are placed by a max over placements, keeping only
+the `beam_width` best children of every node by their immediate score; once the
+known pieces run out, each further ply averages over every shape in
+`allowed_shapes`. Leaves are scored with the Dellacherie weights TetrisWrapper uses
+for reward shaping: aggregate height, lines cleared, holes and bumpiness.
+
+The search deepens one ply at a time up to `depth` and, with a `time_limit`, answers
+with the deepest search that finished before the deadline. Positions are expanded
+on a scratch TetrisCore through snapshot()/restore(), so the game being planned for
+is never touched, and subtree values are kept in an EvalCache across moves.
+"""
+import time
+from collections import namedtuple
+from tetris_core import TetrisCore
+from piece_source import PieceSource
+from tetris_features import DELLACHERIE_W
+from tetris_tables import ACTION_ROTATIONS
+from eval_cache import EvalCache
+
+GAME_OVER_SCORE = -1e5
+
+# Decision returned by Planner.plan
+PlannerMove = namedtuple('PlannerMove', [
+    'hold',         # Swap with the hold slot before placing
+    'column',       # Leftmost column of the placement
+    'rotation',     # Rotation of the placement
+    'action',       # TetrisWrapper action index, column * ACTION_ROTATIONS + rotation
+    'value',        # Search value of the move
+    'depth',        # Pieces looked ahead by the deepest finished search
+])
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Planner:
+    """
+    Beam search / expectimax placement planner for Tetris and TetrisCore games.
+
+    Args:
+        beam_width (int): Children kept per placement node, best immediate score first.
+        depth (int): Pieces to look ahead, the falling piece included.
+        time_limit (float): Seconds per decision, or None to always search to `depth`.
+        use_hold (bool): Also consider swapping with the hold slot first.
+        weights (tuple): Aggregate height, lines, holes and bumpiness weights.
+        cache_size (int): Subtree values kept between decisions.
+    """
+
+    def __init__(self, beam_width=8, depth=3, time_limit=None, use_hold=True,
+                 weights=DELLACHERIE_W, cache_size=200000):
+        self.beam_width = beam_width
+        self.depth = depth
+        self.time_limit = time_limit
+        self.use_hold = use_hold
+        self.weights = tuple(weights)
+        self.cache = EvalCache(cache_size)
+        self.scratch = None
+        self.deadline = None
+        self.nodes = 0
+
+    def board_score(self, core):
+        """Dellacherie score of the core's board without the lines term."""
+        height_weight, _, holes_weight, bumpiness_weight = self.weights
+        view = core.features.view
+        return height_weight * sum(view.heights) + holes_weight * view.holes + bumpiness_weight * view.bumpiness
+
+    def scratch_core(self, core):
+        """
+        The scratch game for `core`'s board size and shapes. Cached values hold only for
+        one size (hashes do not encode it) and one set of shapes (unseen pieces are
+        averaged over them), so the cache is cleared whenever either changes.
+        """
+        board = core.board
+        shapes = list(core.allowed_shapes)
+        scratch = self.scratch
+        if scratch is None or (scratch.board.width, scratch.board.height) != (board.width, board.height):
+            # Seeded, so making it does not draw from the global `random` module
+            scratch = self.scratch = TetrisCore(board.width, board.height, pieces=PieceSource(shapes, seed=0))
+            self.cache.clear()
+        elif scratch.allowed_shapes != shapes:
+            scratch.allowed_shapes = shapes
+            self.cache.clear()
+        return scratch
+
+    def children(self, snapshot, shape):
+        """
+        Every distinct placement of `shape` spawned on the snapshot's board.
+
+        Returns:
+            list: (score, column, rotation, lines, child snapshot, board hash) sorted best
+            first, where score is the lines term plus board_score; game-over children
+            score GAME_OVER_SCORE.
+        """
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        core = self.scratch
+        core.restore(snapshot)
+        if not core.spawn(shape):
+            return []
+        start = core.snapshot(rng=False)
+        lines_weight = self.weights[1]
+        children = []
+        for column, rotation, _ in core.distinct_placements():
+            core.restore(start)
+            core.place(column, rotation)
+            core.hard_drop()
+            core.lock()
+            lines = core.lines_last_step
+            # Whether the real next piece fits is checked when it spawns, not by the draw lock() made
+            core.game_over = core.board.is_game_over()
+            if core.game_over:
+                score = GAME_OVER_SCORE
+            else:
+                score = lines_weight * lines + self.board_score(core)
+            children.append((score, column, rotation, lines, core.snapshot(rng=False), core.board.hash))
+        children.sort(key=lambda child: -child[0])
+        return children
+
+    def value(self, snapshot, board_hash, queue, depth):
+        """
+        Search value of a position with `queue` pieces known and `depth` more to place.
+
+        The value excludes lines cleared on the way to the position, so it only depends
+        on the board, the queue and the depth and is cached on the board's Zobrist hash
+        with them.
+        """
+        return self.cache.get_or_compute((board_hash, queue, depth),
+                                         lambda: self.search_value(snapshot, board_hash, queue, depth))
+
+    def search_value(self, snapshot, board_hash, queue, depth):
+        """value() of a position that is not cached yet."""
+        if not queue:
+            shapes = self.scratch.allowed_shapes
+            return sum(self.value(snapshot, board_hash, (shape,), depth) for shape in shapes) / len(shapes)
+        children = self.children(snapshot, queue[0])[:self.beam_width]
+        if not children:
+            return GAME_OVER_SCORE
+        if depth == 1:
+            return children[0][0]
+        return max(self.child_value(child, queue[1:], depth - 1) for child in children)
+
+    def child_value(self, child, queue, depth):
+        score, _, _, lines, snapshot, board_hash = child
+        if snapshot.game_over:
+            return score
+        return self.weights[1] * lines + self.value(snapshot, board_hash, queue, depth)
+
+    def root_options(self, core):
+        """(hold, snapshot, queue) for placing the falling piece and, if allowed, for holding first."""
+        options = [(False, core.snapshot(rng=False), (core.shape, core.next_shape))]
+        if self.use_hold and core.can_hold and core.held_piece != core.shape:
+            scratch = self.scratch
+            scratch.restore(core.snapshot(rng=False))
+            first_hold = scratch.held_piece is None
+            scratch.hold_piece()
+            # A first hold brings the next piece in and draws an unseen one
+            queue = (core.next_shape,) if first_hold else (core.held_piece, core.next_shape)
+            options.append((True, scratch.snapshot(rng=False), queue))
+        return options
+
+    def search(self, options, depth):
+        best = None
+        for hold, snapshot, queue in options:
+            for child in self.children(snapshot, queue[0])[:self.beam_width]:
+                value = child[0] if depth == 1 else self.child_value(child, queue[1:], depth - 1)
+                if best is None or value > best.value:
+                    column, rotation = child[1], child[2]
+                    best = PlannerMove(hold, column, rotation, column * ACTION_ROTATIONS + rotation, value, depth)
+        return best
+
+    def plan(self, game):
+        """
+        Chooses the next move for a Tetris or TetrisCore game without changing it.
+
+        The one-piece search always runs to the end, so a timed planner answers even
+        when the deadline passes before anything deeper finishes.
+
+        Returns:
+            PlannerMove: The best move of the deepest finished search, or None when the
+            falling piece has no placement.
+        """
+        core = getattr(game, 'core', game)
+        start = time.perf_counter()
+        self.scratch_core(core)
+        options = self.root_options(core)
+        best = self.search(options, 1)
+        if best is None:
+            return None
+        self.deadline = None if self.time_limit is None else start + self.time_limit
+        try:
+            for depth in range(2, self.depth + 1):
+                move = self.search(options, depth)
+                if move is None:
+                    break
+                best = move
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+        return best
+
+    def play(self, game):
+        """
+        Plans and makes one move on a Tetris (through its tetromino, so sprites follow)
+        or a TetrisCore. Returns the PlannerMove, or None if there was nothing to play.
+        """
+        move = self.plan(game)
+        if move is None:
+            return None
+        if isinstance(game, TetrisCore):
+            if move.hold:
+                game.hold_piece()
+            game.place(move.column, move.rotation)
+            game.hard_drop()
+            game.lock()
+        else:
+            if move.hold:
+                game.hold_piece()
+            game.drop_piece(move.column, move.rotation)
+        return move
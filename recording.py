@@ -0,0 +1,330 @@
+"""
+Compact game recordings and deterministic replays.
+
+A Recorder attached to a Tetris (Tetris.recorder) logs what changed the game:
+keyboard moves, gravity steps and holds of human play in the App, and the
+(column, rotation) placements of TetrisWrapper steps and the planner. Each one
+is stored with its tick (frames of Tetris.update, or placements for headless
+games), next to the board size, stage, piece mode, seed and the sequence of
+pieces the game drew. The pieces are kept because games in the App are not
+seeded; with them, replay() re-simulates any recording on a bare TetrisCore at
+full speed, and render() draws it on demand.
+
+File format: RECORDING_MAGIC, then one length-prefixed episode after another,
+so episodes can be appended to a file for as long as it is open. An episode is
+    width, height, stage, piece mode, flags (1 byte each), seed + 1 (varint, 0
+    when unknown), allowed shapes (count byte + letters), piece count (varint) and
+    the SHAPES indices of the pieces, two per byte, event bytes (varint length
+    first), then final score, lines and ticks (varints) and the board's Zobrist
+    hash (8 bytes) for verify().
+An event is the varint (tick delta << EVENT_BITS | event code), followed by the
+action byte for PLACE. A headless placement costs 2 bytes plus half a byte for
+its piece.
+"""
+import struct
+from collections import namedtuple
+from tetris_core import SHAPES, SHAPE_INDEX, LINES_PER_LEVEL, TetrisCore
+from tetris_tables import ACTION_ROTATIONS
+from piece_source import PIECE_MODES, PieceSequence
+from board_render import FrameWriter, game_codes, upscale
+
+RECORDING_MAGIC = b'TETRISREC1'
+
+# === Event Codes ===
+MOVE_LEFT = 0
+MOVE_RIGHT = 1
+ROTATE = 2
+HARD_DROP = 3
+HOLD = 4
+GRAVITY = 5     # One step of Tetris.update's timer: fall one row, lock if landed
+PLACE = 6       # TetrisWrapper action: column * ACTION_ROTATIONS + rotation, then a hard drop
+EVENT_BITS = 3
+EVENT_NAMES = ('MOVE_LEFT', 'MOVE_RIGHT', 'ROTATE', 'HARD_DROP', 'HOLD', 'GRAVITY', 'PLACE')
+
+GAME_OVER_FLAG = 1
+
+Recording = namedtuple('Recording', [
+    'width', 'height',
+    'stage',        # Curriculum stage, 0 when not played through TetrisWrapper
+    'piece_mode',   # PieceSource mode of the game
+    'seed',         # Seed the game was reset with, or None
+    'shapes',       # Allowed shapes, in the order of the game's PieceSource
+    'pieces',       # Every shape the game drew, in order
+    'events',       # Encoded event bytes; see iter_events
+    'score', 'lines', 'ticks',
+    'game_over',    # The game ended rather than being cut off
+    'board_hash',   # Zobrist hash of the final board
+])
+
+
+def write_varint(buffer, value):
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, position):
+    """(value, position after it) of the varint at `position`."""
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def total_lines(core):
+    """Lines cleared over the whole game, from the level counters."""
+    return LINES_PER_LEVEL * (core.level + 1) - core.lines_to_next_level
+
+
+class Recorder:
+    """
+    Writes the games of one or more Tetris instances to a recording file.
+
+    One episode is recorded at a time: begin() starts one on a freshly reset game
+    and it ends by itself at game over, or at end(), the next begin() or close().
+    A recorded game cannot be restored to a snapshot (Tetris.restore raises), since
+    the episode would no longer replay from its start.
+
+    Args:
+        path (str): Recording file; new episodes are appended to an existing one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(RECORDING_MAGIC)
+        self.tetris = None
+        self.episodes = 0
+
+    def begin(self, tetris, seed=None, stage=0):
+        """
+        Starts recording `tetris`, which must be freshly reset (its first two pieces
+        drawn, nothing placed).
+
+        Args:
+            tetris (Tetris): Game to record; its `recorder` is set to this one.
+            seed (int): Seed the game's pieces were reset with, if any.
+            stage (int): Curriculum stage of the game, 0 if none.
+        """
+        self.end()
+        core = tetris.core
+        self.tetris = tetris
+        self.seed = seed
+        self.stage = stage
+        self.pieces = [core.shape, core.next_shape]
+        self.events = bytearray()
+        self.start_tick = self.last_tick = tetris.ticks
+        core.shape_log = self.pieces
+        tetris.recorder = self
+
+    def record(self, event, argument=0):
+        """Logs an event the game has just applied; ends the episode at game over."""
+        ticks = self.tetris.ticks
+        write_varint(self.events, (ticks - self.last_tick) << EVENT_BITS | event)
+        self.last_tick = ticks
+        if event == PLACE:
+            self.events.append(argument)
+        if self.tetris.core.is_game_over():
+            self.end()
+
+    def end(self):
+        """Writes the episode being recorded, if any, and detaches from its game."""
+        if self.tetris is None:
+            return
+        tetris, core = self.tetris, self.tetris.core
+        pieces = self.pieces
+        mode = getattr(core.pieces, 'mode', PIECE_MODES[0])
+
+        data = bytearray(struct.pack('<5B', core.board.width, core.board.height, self.stage,
+                                     PIECE_MODES.index(mode), GAME_OVER_FLAG if core.is_game_over() else 0))
+        write_varint(data, 0 if self.seed is None else self.seed + 1)
+        shapes = ''.join(core.allowed_shapes).encode()
+        data.append(len(shapes))
+        data += shapes
+        write_varint(data, len(pieces))
+        indices = [SHAPE_INDEX[shape] for shape in pieces] + [0]
+        data += bytes(indices[i] | indices[i + 1] << 4 for i in range(0, len(pieces), 2))
+        write_varint(data, len(self.events))
+        data += self.events
+        for value in (core.score, total_lines(core), tetris.ticks - self.start_tick):
+            write_varint(data, value)
+        data += struct.pack('<Q', core.board.hash)
+
+        header = bytearray()
+        write_varint(header, len(data))
+        self.file.write(header + data)
+        self.episodes += 1
+
+        core.shape_log = None
+        tetris.recorder = None
+        self.tetris = None
+
+    def close(self):
+        if not self.file.closed:
+            self.end()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_recording(data):
+    """Recording of one episode's bytes."""
+    width, height, stage, mode, flags = struct.unpack_from('<5B', data)
+    position = 5
+    seed, position = read_varint(data, position)
+    count = data[position]
+    shapes = list(data[position + 1:position + 1 + count].decode())
+    position += 1 + count
+    num_pieces, position = read_varint(data, position)
+    packed = data[position:position + (num_pieces + 1) // 2]
+    position += len(packed)
+    pieces = [SHAPES[byte >> shift & 15] for byte in packed for shift in (0, 4)][:num_pieces]
+    num_events, position = read_varint(data, position)
+    events = bytes(data[position:position + num_events])
+    position += num_events
+    score, position = read_varint(data, position)
+    lines, position = read_varint(data, position)
+    ticks, position = read_varint(data, position)
+    board_hash, = struct.unpack_from('<Q', data, position)
+    return Recording(width, height, stage, PIECE_MODES[mode], None if seed == 0 else seed - 1, shapes,
+                     pieces, events, score, lines, ticks, bool(flags & GAME_OVER_FLAG), board_hash)
+
+
+def read_recordings(path):
+    """
+    Yields the Recordings of a recording file one episode at a time. A last episode
+    cut short, as a process killed while writing it leaves it, ends the file.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+            raise ValueError(f'{path} is not a Tetris recording')
+        while True:
+            header = file.read(1)
+            if not header:
+                return
+            size, shift = header[0] & 0x7F, 7
+            while header[0] & 0x80:
+                header = file.read(1)
+                if not header:
+                    return
+                size |= (header[0] & 0x7F) << shift
+                shift += 7
+            data = file.read(size)
+            if len(data) < size:
+                return
+            yield decode_recording(data)
+
+
+def iter_events(events):
+    """Yields (tick, event, argument) of encoded event bytes; argument is the action of PLACE, else 0."""
+    position, tick = 0, 0
+    while position < len(events):
+        value, position = read_varint(events, position)
+        tick += value >> EVENT_BITS
+        event = value & ((1 << EVENT_BITS) - 1)
+        argument = 0
+        if event == PLACE:
+            argument = events[position]
+            position += 1
+        yield tick, event, argument
+
+
+def apply_event(core, event, argument=0):
+    """Applies one recorded event to a TetrisCore the way Tetris applied it."""
+    if event == GRAVITY:
+        if not core.check_landing():
+            core.move('down')
+        if core.check_landing():
+            core.lock()
+    elif event == PLACE:
+        core.place(*divmod(argument, ACTION_ROTATIONS))
+        core.hard_drop()
+        core.lock()
+    elif event == HARD_DROP:
+        core.hard_drop()
+        core.lock()
+    elif event == MOVE_LEFT:
+        core.move('left')
+    elif event == MOVE_RIGHT:
+        core.move('right')
+    elif event == ROTATE:
+        core.rotate()
+    elif event == HOLD:
+        core.hold_piece()
+
+
+def replay(recording, callback=None):
+    """
+    Re-simulates a recording headlessly.
+
+    Args:
+        recording (Recording): Episode to play back.
+        callback (callable): Called as callback(core, tick, event, argument) on the
+            starting position (event None) and after every event, e.g. to collect
+            states or frames.
+
+    Returns:
+        TetrisCore: The game after the last event.
+    """
+    pieces = PieceSequence(recording.pieces, recording.shapes)
+    core = TetrisCore(recording.width, recording.height, pieces=pieces)
+    if callback is not None:
+        callback(core, 0, None, 0)
+    for tick, event, argument in iter_events(recording.events):
+        apply_event(core, event, argument)
+        if callback is not None:
+            callback(core, tick, event, argument)
+    return core
+
+
+def verify(recording):
+    """
+    Replays a recording and checks the result against the one recorded.
+
+    Returns:
+        TetrisCore: The replayed game.
+    """
+    core = replay(recording)
+    replayed = (core.score, total_lines(core), core.is_game_over(), core.board.hash)
+    recorded = (recording.score, recording.lines, recording.game_over, recording.board_hash)
+    if replayed != recorded:
+        raise ValueError(f'Replay ended with (score, lines, game over, hash) {replayed}, recorded {recorded}')
+    return core
+
+
+def render(recording, path, scale=16, fps=10, every_event=False):
+    """
+    Draws a recording into an animation file with board_render.FrameWriter.
+
+    Args:
+        recording (Recording): Episode to draw.
+        path (str): Output file (.gif, .mp4, ...).
+        scale (int): Pixels per cell side.
+        fps (float): Frames per second.
+        every_event (bool): One frame per event (moves and gravity included)
+            instead of one per placed piece.
+
+    Returns:
+        int: Frames written.
+    """
+    drawn = [0]     # Pieces dealt when the last frame was drawn
+
+    def draw(core, tick, event, argument):
+        dealt = core.pieces.position
+        if every_event or dealt != drawn[0] or core.is_game_over():
+            writer.append(upscale(game_codes(core), scale))
+            drawn[0] = dealt
+
+    with FrameWriter(path, fps=fps) as writer:
+        replay(recording, draw)
+    return writer.frames
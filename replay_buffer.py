@@ -0,0 +1,312 @@
+"""
+Prioritized Experience Replay on sum and min trees.
+
+The buffer keeps every field of the transitions in one preallocated NumPy array
+(ArrayStorage, or the disk-backed replay_storage.MemmapStorage), so a batch is
+gathered with fancy indexing. Priorities raised to alpha sit in the leaves
+of a sum tree, for sampling proportional to priority, and of a min tree, for
+normalizing the importance-sampling weights. Sampling a batch and updating its
+priorities walk the trees once per level for the whole batch: O(log capacity)
+instead of touching every stored priority.
+"""
+import operator
+from collections import namedtuple
+import numpy as np
+
+Experience = namedtuple('Experience', ('state', 'action', 'reward', 'next_state', 'done'))
+
+# Smallest stored priority: a zero would zero the min tree and with it every sampling weight
+MIN_PRIORITY = 1e-6
+
+
+def as_observation(state):
+    """The observation array of a state, unwrapping TetrisWrapper's (observation, {}, {}) tuples."""
+    if isinstance(state, (tuple, list)) and len(state) > 0:
+        if isinstance(state[0], (list, np.ndarray, float, int)):
+            state = state[0]
+    return np.asarray(state, dtype=np.float32)
+
+
+class SegmentTree:
+    """
+    Binary tree over `capacity` leaves whose inner nodes combine their children with
+    `operation` (np.add or np.minimum, with `combine` doing the same on two floats);
+    the root combines every leaf.
+    """
+
+    def __init__(self, capacity, operation, combine, neutral):
+        self.leaves = 1
+        while self.leaves < capacity:
+            self.leaves *= 2
+        self.operation = operation
+        self.combine = combine
+        self.neutral = neutral
+        self.tree = np.full(2 * self.leaves, neutral, dtype=np.float64)
+
+    def update(self, indices, values):
+        """Sets leaves `indices` to `values` and recomputes their ancestors."""
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaves
+        self.tree[nodes] = values
+        tree = self.tree
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            tree[nodes] = self.operation(tree[2 * nodes], tree[2 * nodes + 1])
+
+    def set(self, index, value):
+        """update() for a single leaf, without array overhead."""
+        tree, combine = self.tree, self.combine
+        node = index + self.leaves
+        tree[node] = value
+        node //= 2
+        while node >= 1:
+            tree[node] = combine(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, indices):
+        return self.tree[np.asarray(indices) + self.leaves]
+
+
+class SumTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity, np.add, operator.add, 0.0)
+
+    def find(self, prefixes):
+        """Leaf index where each running sum in `prefixes` falls, walking down from the root."""
+        prefixes = np.array(prefixes, dtype=np.float64)
+        nodes = np.ones(len(prefixes), dtype=np.int64)
+        tree = self.tree
+        while nodes[0] < self.leaves:
+            left = tree[2 * nodes]
+            right = prefixes >= left
+            prefixes -= left * right
+            nodes = 2 * nodes + right
+        return nodes - self.leaves
+
+
+class MinTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity, np.minimum, min, np.inf)
+
+
+class ArrayStorage:
+    """
+    Transitions in preallocated in-memory arrays, observations stored as given.
+
+    Storage backends write transitions at the slots the buffer picks and gather
+    batches back as an Experience of arrays. Backends that persist (see
+    replay_storage.MemmapStorage) also keep the raw priorities and the buffer's
+    counters; this one does not, so `priorities` is None.
+    """
+
+    priorities = None
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.states = None
+        self.next_states = None
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+
+    def allocate(self, observation_shape):
+        self.states = np.zeros((self.capacity,) + observation_shape, dtype=np.float32)
+        self.next_states = np.zeros((self.capacity,) + observation_shape, dtype=np.float32)
+
+    def write(self, index, state, action, reward, next_state, done):
+        state = as_observation(state)
+        if self.states is None:
+            self.allocate(state.shape)
+        self.states[index] = state
+        self.next_states[index] = as_observation(next_state)
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.dones[index] = done
+
+    def write_batch(self, indices, states, actions, rewards, next_states, dones):
+        states = np.asarray(states, dtype=np.float32)
+        if self.states is None:
+            self.allocate(states.shape[1:])
+        self.states[indices] = states
+        self.next_states[indices] = next_states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.dones[indices] = dones
+
+    def read(self, indices):
+        return Experience(
+            state=self.states[indices],
+            action=self.actions[indices],
+            reward=self.rewards[indices],
+            next_state=self.next_states[indices],
+            done=self.dones[indices],
+        )
+
+    def load_meta(self):
+        return None
+
+    def save_meta(self, meta):
+        pass
+
+
+class PrioritizedReplayBuffer:
+    """
+    A memory buffer implementing Prioritized Experience Replay (PER).
+    It samples more important transitions (with higher TD-error).
+    """
+    def __init__(self, capacity, alpha=0.6, beta_start=0.4, beta_end=1.0, beta_frames=100000, storage=None):
+        """
+        Initialize the buffer.
+
+        Parameters:
+        - capacity: maximum number of stored experiences
+        - alpha: prioritization exponent (0 = uniform, 1 = full prioritization)
+        - beta_start: initial value of beta for importance-sampling correction
+        - beta_end: final value of beta
+        - beta_frames: number of frames over which beta is annealed
+        - storage: where transitions live; in-memory arrays (sized on the first push)
+          by default. A storage that already holds transitions, such as a reopened
+          replay_storage.MemmapStorage, resumes with them and their priorities.
+        """
+        self.capacity = capacity
+        self.size = 0
+        self.position = 0  # index for overwriting old entries
+        self.sum_tree = SumTree(capacity)
+        self.min_tree = MinTree(capacity)
+        self.max_priority = 1.0  # running max, given to new experiences
+        self.storage = ArrayStorage(capacity) if storage is None else storage
+        if self.storage.capacity != capacity:
+            raise ValueError(f'Storage holds {self.storage.capacity} transitions, not {capacity}')
+
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_end = beta_end
+        self.beta_frames = beta_frames
+        self.beta = beta_start
+        self.frame = 0
+
+        self.Experience = Experience
+
+        meta = self.storage.load_meta()
+        if meta:
+            self.size, self.position = meta['size'], meta['position']
+            self.max_priority, self.frame = meta['max_priority'], meta['frame']
+            self.update_beta(self.frame)
+            if self.size:
+                indices = np.arange(self.size)
+                values = np.maximum(self.storage.priorities[:self.size].astype(np.float64), MIN_PRIORITY) ** alpha
+                self.sum_tree.update(indices, values)
+                self.min_tree.update(indices, values)
+
+    def update_beta(self, frame=None):
+        """
+        Update beta based on frame count for importance-sampling weight correction.
+        Returns updated beta.
+        """
+        if frame is None:
+            self.frame += 1
+            frame = self.frame
+
+        self.beta = min(
+            self.beta_end,
+            self.beta_start + (self.beta_end - self.beta_start) * (frame / self.beta_frames)
+        )
+        return self.beta
+
+    def set_priorities(self, indices, priorities):
+        """Stores raw priorities, raised to MIN_PRIORITY where smaller."""
+        priorities = np.maximum(np.asarray(priorities, dtype=np.float64), MIN_PRIORITY)
+        values = priorities ** self.alpha
+        self.sum_tree.update(indices, values)
+        self.min_tree.update(indices, values)
+        if self.storage.priorities is not None:
+            self.storage.priorities[indices] = priorities
+
+    def push(self, state, action, reward, next_state, done):
+        """
+        Add a new experience to the buffer.
+        New samples are given the maximum priority to ensure they're sampled at least once.
+        """
+        index = self.position
+        self.storage.write(index, state, action, reward, next_state, done)
+
+        max_priority = max(self.max_priority, MIN_PRIORITY)
+        priority = max_priority ** self.alpha
+        self.sum_tree.set(index, priority)
+        self.min_tree.set(index, priority)
+        if self.storage.priorities is not None:
+            self.storage.priorities[index] = max_priority
+        self.position = (self.position + 1) % self.capacity  # cyclic buffer
+        self.size = min(self.size + 1, self.capacity)
+
+    def push_batch(self, states, actions, rewards, next_states, dones, priorities=None):
+        """
+        Adds a batch of experiences at the maximum priority, or at `priorities` when
+        the producer computed them (e.g. actors' TD errors). Fields are arrays with a
+        leading batch axis (for compact storage, states are CompactStates of arrays).
+        """
+        count = len(actions)
+        keep = slice(max(0, count - self.capacity), count)  # Only the newest `capacity` survive
+        count = min(count, self.capacity)
+        if isinstance(states, tuple):
+            states = type(states)(*(field[keep] for field in states))
+            next_states = type(next_states)(*(field[keep] for field in next_states))
+        else:
+            states, next_states = states[keep], next_states[keep]
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.storage.write_batch(indices, states, np.asarray(actions)[keep], np.asarray(rewards)[keep],
+                                 next_states, np.asarray(dones)[keep])
+
+        if priorities is None:
+            priorities = np.full(count, self.max_priority)
+        else:
+            priorities = np.asarray(priorities, dtype=np.float64)[keep]
+            self.max_priority = max(self.max_priority, float(priorities.max(initial=0.0)))
+        self.set_priorities(indices, priorities)
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Sample a batch of experiences based on priorities.
+
+        Returns:
+        - batch: named tuple with arrays of (states, actions, etc.)
+        - indices: selected sample indices (used for updating priorities)
+        - weights: importance-sampling weights to correct the bias
+        """
+        total = self.sum_tree.total()
+        prefixes = np.random.random(batch_size) * total
+        indices = np.minimum(self.sum_tree.find(prefixes), self.size - 1)
+
+        # Importance-sampling weights, normalized by the largest possible weight
+        probs = self.sum_tree[indices] / total
+        min_prob = self.min_tree.total() / total
+        weights = (probs / min_prob) ** (-self.beta)
+        weights = weights.astype(np.float32)
+
+        batch = self.storage.read(indices)
+        return batch, indices, weights
+
+    def update_priorities(self, indices, priorities):
+        """
+        Update the priorities of sampled experiences after learning step.
+        """
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        # A batch can hold an index twice; the last priority wins, as in a loop
+        indices = np.asarray(indices)
+        _, last = np.unique(indices[::-1], return_index=True)
+        last = len(indices) - 1 - last
+        self.set_priorities(indices[last], priorities[last])
+
+    def flush(self):
+        """Saves the counters with a persistent storage, so the buffer can be reopened."""
+        self.storage.save_meta({'size': self.size, 'position': self.position,
+                                'max_priority': self.max_priority, 'frame': self.frame})
+
+    def __len__(self):
+        """Return the current size of the buffer."""
+        return self.size
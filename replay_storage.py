@@ -0,0 +1,179 @@
+"""
+Disk-backed replay storage with bit-packed boards.
+
+A TetrisWrapper observation is a function of the board, the current and next piece
+and the lines the last placement cleared, so MemmapStorage keeps those instead of
+two float32 vectors per transition: one small integer per board row (bit x is
+column x, as in Board.rows), piece IDs as bytes and the line count, about 100
+bytes per transition on a 10x20 board against 400+ for the observations. Every
+field lives in a .npy file opened as a memory map, so tens of millions of
+transitions sit on local disk and only sampled batches are read and decoded into
+observations. The raw priorities and the buffer counters are saved alongside, so
+a PrioritizedReplayBuffer reopened on the same directory picks up where it stopped.
+"""
+import json
+import os
+from collections import namedtuple
+import numpy as np
+from tetris_core import SHAPES, SHAPE_INDEX
+from afterstates import rows_to_board, board_features, feature_matrix, feature_size
+from replay_buffer import Experience
+
+# What an observation is computed from; fields are scalars for one state or arrays for a batch
+CompactState = namedtuple('CompactState', [
+    'rows',         # Board rows as bitmasks, top to bottom
+    'piece',        # SHAPES index of the current piece
+    'next_piece',   # SHAPES index of the next piece
+    'lines',        # Lines cleared by the last placement (the "eroded cells" feature / 10)
+])
+
+
+def row_dtype(width):
+    return np.uint16 if width <= 16 else np.uint32
+
+
+def pack_rows(boards):
+    """(..., height, width) bool boards as (..., height) row bitmasks."""
+    width = boards.shape[-1]
+    bits = (1 << np.arange(width)).astype(row_dtype(width))
+    return (boards * bits).sum(axis=-1, dtype=row_dtype(width))
+
+
+def compact_state(core, piece=None, next_piece=None, lines=None):
+    """CompactState of a TetrisCore; the pieces and lines can be overridden."""
+    return CompactState(
+        tuple(core.board.rows),
+        SHAPE_INDEX[core.shape if piece is None else piece],
+        SHAPE_INDEX[core.next_shape if next_piece is None else next_piece],
+        core.lines_last_step if lines is None else lines,
+    )
+
+
+def decode_observations(rows, pieces, next_pieces, lines, width):
+    """
+    TetrisWrapper observations of a batch of compact states.
+
+    Returns:
+        np.ndarray: (count, feature_size(width) + 2 * len(SHAPES)) float32.
+    """
+    count = len(rows)
+    boards = rows_to_board(rows, width)
+    offset = feature_size(width)
+    observations = np.zeros((count, offset + 2 * len(SHAPES)), dtype=np.float32)
+    feature_matrix(board_features(boards), lines, out=observations[:, :offset])
+    index = np.arange(count)
+    observations[index, offset + pieces] = 1.0
+    observations[index, offset + len(SHAPES) + next_pieces] = 1.0
+    return observations
+
+
+class MemmapStorage:
+    """
+    Replay storage for PrioritizedReplayBuffer in memory-mapped files under `directory`.
+
+    push() takes CompactStates for state and next_state, push_batch() CompactStates of
+    arrays; sample() returns decoded observations like the in-memory storage. Opening
+    a directory that already holds a storage of the same size reuses its files.
+
+    Args:
+        directory (str): Where the .npy files and meta.json live.
+        capacity (int): Transitions kept.
+        width, height (int): Board size of every stored state.
+    """
+
+    def __init__(self, directory, capacity, width=10, height=20):
+        self.directory = directory
+        self.capacity = capacity
+        self.width = width
+        self.height = height
+        os.makedirs(directory, exist_ok=True)
+
+        rows = row_dtype(width)
+        layout = {
+            'rows': (rows, (capacity, height)),
+            'next_rows': (rows, (capacity, height)),
+            'pieces': (np.uint8, (capacity, 2)),          # Current and next piece of state
+            'next_pieces': (np.uint8, (capacity, 2)),     # ... and of next_state
+            'lines': (np.uint8, (capacity, 2)),           # Last lines of state and next_state
+            'actions': (np.int16, (capacity,)),
+            'rewards': (np.float32, (capacity,)),
+            'dones': (np.bool_, (capacity,)),
+            'priorities': (np.float32, (capacity,)),
+        }
+        meta = self.read_meta_file()
+        if meta and (meta['capacity'], meta['width'], meta['height']) != (capacity, width, height):
+            raise ValueError(f'{directory} holds a storage of {meta["capacity"]} transitions on a '
+                             f'{meta["width"]}x{meta["height"]} board')
+        for name, (dtype, shape) in layout.items():
+            path = os.path.join(directory, name + '.npy')
+            mode = 'r+' if meta and os.path.exists(path) else 'w+'
+            setattr(self, name, np.lib.format.open_memmap(path, mode=mode, dtype=dtype, shape=shape))
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def read_meta_file(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path) as file:
+            return json.load(file)
+
+    def load_meta(self):
+        """The counters PrioritizedReplayBuffer.flush saved, or None for a new storage."""
+        meta = self.read_meta_file()
+        return meta.get('buffer') if meta else None
+
+    def save_meta(self, buffer_meta):
+        """Flushes the arrays to disk, then records the buffer counters."""
+        for name in ('rows', 'next_rows', 'pieces', 'next_pieces', 'lines', 'actions', 'rewards', 'dones',
+                     'priorities'):
+            getattr(self, name).flush()
+        meta = {'capacity': self.capacity, 'width': self.width, 'height': self.height, 'buffer': buffer_meta}
+        temporary = self.meta_path + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temporary, self.meta_path)
+
+    def write(self, index, state, action, reward, next_state, done):
+        self.rows[index] = state.rows
+        self.next_rows[index] = next_state.rows
+        self.pieces[index] = (state.piece, state.next_piece)
+        self.next_pieces[index] = (next_state.piece, next_state.next_piece)
+        self.lines[index] = (state.lines, next_state.lines)
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.dones[index] = done
+
+    def write_batch(self, indices, states, actions, rewards, next_states, dones):
+        self.rows[indices] = states.rows
+        self.next_rows[indices] = next_states.rows
+        self.pieces[indices] = np.column_stack([states.piece, states.next_piece])
+        self.next_pieces[indices] = np.column_stack([next_states.piece, next_states.next_piece])
+        self.lines[indices] = np.column_stack([states.lines, next_states.lines])
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.dones[indices] = dones
+
+    def read(self, indices):
+        """The transitions at `indices` with states decoded into observations."""
+        # Sorted reads touch each page of the files once
+        order = np.argsort(indices)
+        restore = np.empty_like(order)
+        restore[order] = np.arange(len(order))
+        sorted_indices = np.asarray(indices)[order]
+
+        pieces = self.pieces[sorted_indices].astype(np.int64)[restore]
+        next_pieces = self.next_pieces[sorted_indices].astype(np.int64)[restore]
+        lines = self.lines[sorted_indices].astype(np.int64)[restore]
+        states = decode_observations(self.rows[sorted_indices][restore], pieces[:, 0], pieces[:, 1],
+                                     lines[:, 0], self.width)
+        next_states = decode_observations(self.next_rows[sorted_indices][restore], next_pieces[:, 0],
+                                          next_pieces[:, 1], lines[:, 1], self.width)
+        return Experience(
+            state=states,
+            action=self.actions[sorted_indices][restore].astype(np.int64),
+            reward=self.rewards[sorted_indices][restore],
+            next_state=next_states,
+            done=self.dones[sorted_indices][restore],
+        )
@@ -0,0 +1,194 @@
+"""
+TetrisWrapper environments spread over worker processes.
+
+SubprocVectorEnv starts `num_workers` processes that each own `envs_per_worker`
+TetrisWrapper games. Actions, observations, rewards, done flags and the step info
+live in shared-memory NumPy arrays: the parent writes the actions, sends each
+worker a one-word command over its pipe and reads the results in place, so no
+observation data is pickled or copied between processes. Each game writes its
+observations straight into its row of the shared array (see
+TetrisWrapper.attach_observation_buffer), in either observation mode.
+"""
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from tetris_rules import STAGE_BOARD_SIZES
+from tetris_core import SHAPES
+from afterstates import feature_size
+from board_tensor import board_tensor_shape
+
+INFO_KEYS = ('lines_cleared', 'total_lines', 'pieces_placed', 'score')
+
+
+def shared_layout(num_envs, observation_shape, observation_dtype=np.float32):
+    """(name, shape, dtype) of every shared array."""
+    return (
+        ('actions', (num_envs,), np.int64),
+        ('observations', (num_envs, *observation_shape), observation_dtype),
+        ('final_observations', (num_envs, *observation_shape), observation_dtype),
+        ('rewards', (num_envs,), np.float32),
+        ('dones', (num_envs,), np.bool_),
+        ('infos', (num_envs, len(INFO_KEYS)), np.int64),
+    )
+
+
+def attach_arrays(memory, layout):
+    """NumPy views of every shared array, laid out back to back in `memory`."""
+    arrays, offset = {}, 0
+    for name, shape, dtype in layout:
+        array = np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+        arrays[name] = array
+        offset += array.nbytes
+    return arrays
+
+
+def layout_size(layout):
+    return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, shape, dtype in layout)
+
+
+def worker(connection, memory_name, num_envs, observation_shape, observation_mode, observation_dtype,
+           start, count, stage):
+    """
+    Runs environments start..start+count-1 until told to close.
+
+    Commands are 'reset' (with an optional seed), 'step' and 'close'. Finished games
+    are reset right away; their last observation goes to final_observations.
+    """
+    from tetris_env import TetrisWrapper
+
+    memory = shared_memory.SharedMemory(name=memory_name)
+    arrays = attach_arrays(memory, shared_layout(num_envs, observation_shape, observation_dtype))
+    envs = [TetrisWrapper(stage=stage, observation_mode=observation_mode, observation_dtype=observation_dtype)
+            for _ in range(count)]
+    slots = range(start, start + count)
+    for slot, env in zip(slots, envs):
+        env.attach_observation_buffer(arrays['observations'][slot])
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == 'reset':
+                for slot, env in zip(slots, envs):
+                    # Every game has its own piece stream, and streams of different seeds never overlap
+                    env.reset(seed=None if argument is None else argument * num_envs + slot)
+                arrays['dones'][start:start + count] = False
+                arrays['rewards'][start:start + count] = 0.0
+                arrays['infos'][start:start + count] = 0
+            elif command == 'step':
+                for slot, env in zip(slots, envs):
+                    _, reward, done, _, info = env.step(int(arrays['actions'][slot]))
+                    arrays['rewards'][slot] = reward
+                    arrays['dones'][slot] = done
+                    arrays['infos'][slot] = [info[key] for key in INFO_KEYS]
+                    if done:
+                        arrays['final_observations'][slot] = arrays['observations'][slot]
+                        env.reset()
+            elif command == 'close':
+                break
+            connection.send(True)
+    finally:
+        for env in envs:
+            env.detach_observation_buffer()  # Views of the shared memory must go before it closes
+            env.close()
+        del arrays
+        memory.close()
+        connection.close()
+
+
+class SubprocVectorEnv:
+    """
+    Batched step()/reset() over TetrisWrapper games running in worker processes.
+
+    The returned observation, reward and done arrays are views of shared memory
+    that the next call overwrites; copy them if they have to outlive it.
+    observation_mode and observation_dtype are passed to every TetrisWrapper.
+    """
+
+    def __init__(self, num_workers=None, envs_per_worker=1, stage=5, seed=None, start_method=None,
+                 observation_mode='features', observation_dtype=None):
+        self.num_workers = num_workers or mp.cpu_count()
+        self.envs_per_worker = envs_per_worker
+        self.num_envs = self.num_workers * envs_per_worker
+        self.seed = seed
+
+        width, height = STAGE_BOARD_SIZES.get(stage, (10, 20))
+        if observation_mode == 'board':
+            self.observation_shape = board_tensor_shape(width, height)
+            self.observation_dtype = np.dtype(observation_dtype or np.uint8)
+        else:
+            self.observation_shape = (feature_size(width) + 2 * len(SHAPES),)
+            self.observation_dtype = np.dtype(np.float32)
+        self.observation_size = int(np.prod(self.observation_shape))
+        layout = shared_layout(self.num_envs, self.observation_shape, self.observation_dtype)
+        self.memory = shared_memory.SharedMemory(create=True, size=layout_size(layout))
+        self.arrays = attach_arrays(self.memory, layout)
+
+        context = mp.get_context(start_method)
+        self.connections, self.processes = [], []
+        for index in range(self.num_workers):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=worker, daemon=True,
+                args=(child, self.memory.name, self.num_envs, self.observation_shape, observation_mode,
+                      self.observation_dtype, index * envs_per_worker, envs_per_worker, stage),
+            )
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self.closed = False
+
+    def send_all(self, command, arguments=None):
+        arguments = arguments or [None] * self.num_workers
+        for connection, argument in zip(self.connections, arguments):
+            connection.send((command, argument))
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self, seed=None):
+        """
+        Resets every game; with a seed, the game in slot j (of num_envs) is reset
+        with seed seed * num_envs + j, so every game has its own piece stream.
+
+        Returns:
+            np.ndarray: (num_envs, *observation_shape) observations, in shared memory.
+        """
+        seed = self.seed if seed is None else seed
+        self.send_all('reset', [seed] * self.num_workers)
+        return self.arrays['observations']
+
+    def step(self, actions):
+        """
+        Applies one action index per game.
+
+        Returns:
+            tuple: (observations, rewards, dones, info) where info maps 'lines_cleared',
+            'total_lines', 'pieces_placed' and 'score' to per-game arrays and
+            'final_observations' to the last observation of every game that ended
+            (rows of games that did not end are stale).
+        """
+        self.arrays['actions'][:] = actions
+        self.send_all('step')
+        infos = self.arrays['infos']
+        info = {key: infos[:, column] for column, key in enumerate(INFO_KEYS)}
+        info['final_observations'] = self.arrays['final_observations']
+        return self.arrays['observations'], self.arrays['rewards'], self.arrays['dones'], info
+
+    def close(self):
+        if self.closed:
+            return
+        for connection in self.connections:
+            connection.send(('close', None))
+        for process in self.processes:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+        self.arrays = None
+        self.memory.close()
+        self.memory.unlink()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,82 @@
+import time
+import numpy as np
+from actor_learner import ACTOR_COUNTERS, ActorLearner
+from replay_buffer import PrioritizedReplayBuffer
+from tetris_tables import NUM_ACTIONS
+from test_evaluation import random_weights
+
+STEPS = ACTOR_COUNTERS.index('steps')
+
+
+class FakeNet:
+    """Stands in for TetrisDQN: NumPy weights behind state_dict()."""
+
+    def __init__(self, weights):
+        self.weights = weights
+
+    def state_dict(self):
+        return self.weights
+
+    def load_state_dict(self, weights):
+        self.weights = weights
+
+
+class FakeWriter:
+    def add_scalar(self, *args):
+        pass
+
+
+class FakeAgent:
+    """The parts of DQNAgent ActorLearner uses; optimize_model() only samples and reprioritizes."""
+
+    batch_size = 32
+    n_actions = NUM_ACTIONS
+    gamma = 0.99
+    target_update = 50
+
+    def __init__(self):
+        self.memory = PrioritizedReplayBuffer(20000)
+        self.policy_net = FakeNet(random_weights(5))
+        self.target_net = FakeNet(random_weights(5))
+        self.writer = FakeWriter()
+        self.steps_done = 0
+        self.actor_steps = []   # Actor steps seen at every update
+        self.trainer = None
+
+    def optimize_model(self):
+        _, indices, _ = self.memory.sample(self.batch_size)
+        self.memory.update_priorities(indices, np.random.random(len(indices)))
+        self.actor_steps.append(self.trainer.arrays['counters'][:, STEPS].sum())
+        time.sleep(0.002)
+        return 0.0
+
+
+def test_actor_learner_smoke():
+    agent = FakeAgent()
+    with ActorLearner(agent, num_actors=2, envs_per_actor=8, queue_size=2, send_size=64,
+                      broadcast_interval=20, sync_interval=2, seed=0) as trainer:
+        agent.trainer = trainer
+        losses = trainer.run(num_updates=200, log_interval=0, verbose=False)
+        stats = trainer.stats()
+
+        # Actors kept playing while the learner updated
+        assert len(losses) == 200
+        assert agent.actor_steps[-1] > agent.actor_steps[0]
+        assert stats['transitions_received'] == len(agent.memory) == agent.steps_done
+
+        # One publication at start and one every broadcast_interval updates
+        assert stats['weight_version'] == 1 + 200 // 20
+        for counters in stats['actors']:
+            assert 1 < counters['weight_updates'] <= stats['weight_version']
+
+        # Nobody drains the queue now: it fills up and the actors block
+        time.sleep(1.0)
+        steps = trainer.stats()['actor_steps']
+        time.sleep(0.5)
+        stats = trainer.stats()
+        assert stats['actor_steps'] == steps
+        assert stats['actor_blocked_share'] > 0
+
+    assert all(type(value) in (int, float) for key, value in stats.items() if key != 'actors')
+    assert all(type(value) is (float if key == 'blocked_seconds' else int)
+               for counters in stats['actors'] for key, value in counters.items())
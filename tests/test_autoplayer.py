@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from autoplayer import (TRANSITION_KEYS, AutoPlayer, ChunkWriter, dellacherie_terms, generate,
+                        heuristic_scores, load_chunks, placement_terms)
+from replay_buffer import PrioritizedReplayBuffer
+
+NUM_ENVS = 16
+
+
+@pytest.mark.parametrize('stage', [1, 3, 5])
+def test_placement_terms_match_locked_afterstates(stage):
+    player = AutoPlayer(NUM_ENVS, stage, epsilon=0.2, seed=stage)
+    for _ in range(150):
+        index, actions, terms, game_over = placement_terms(player.env)
+        placements = player.env.enumerate_placements(features=False)
+        np.testing.assert_array_equal(index, placements.env)
+        np.testing.assert_array_equal(actions, placements.actions)
+        np.testing.assert_array_equal(terms, dellacherie_terms(placements.boards, placements.lines))
+        np.testing.assert_array_equal(game_over, placements.game_over)
+        np.testing.assert_array_equal(np.where(game_over, -np.inf, terms @ player.weights),
+                                      heuristic_scores(placements, player.weights))
+        player.step()
+    assert player.games_finished > 0
+
+
+def test_chunk_writer_round_trip(tmp_path):
+    player = AutoPlayer(NUM_ENVS, stage=2, seed=0)
+    writer = ChunkWriter(tmp_path, chunk_size=100, stage=2)
+    batches = [player.step() for _ in range(20)]
+    for batch in batches:
+        writer.add(batch)
+    paths = writer.close()
+    assert len(paths) == 4 and writer.rows_written == 20 * NUM_ENVS
+
+    expected = {key: np.concatenate([batch[key] for batch in batches]) for key in TRANSITION_KEYS}
+    loaded = load_chunks(paths)
+    for key in TRANSITION_KEYS:
+        np.testing.assert_array_equal(loaded[key], expected[key])
+
+    buffer = load_chunks(str(tmp_path), PrioritizedReplayBuffer(1000))
+    assert len(buffer) == writer.rows_written
+    stored = buffer.storage.read(np.arange(len(buffer)))
+    for key, field in zip(TRANSITION_KEYS, stored):
+        np.testing.assert_array_equal(field, expected[key])
+
+
+def test_load_chunks_reads_one_stage_of_generate(tmp_path):
+    paths = generate(str(tmp_path), 3 * NUM_ENVS, stages=(3, 5), num_envs=NUM_ENVS, chunk_size=NUM_ENVS,
+                     seed=0, verbose=False)
+    assert len(paths) == 6
+    with pytest.raises(ValueError):
+        load_chunks(str(tmp_path))
+    for stage in (3, 5):
+        chunks = load_chunks(str(tmp_path), stage=stage)
+        assert len(chunks['actions']) == 3 * NUM_ENVS
+        assert chunks['states'].shape[1] == AutoPlayer(1, stage).env.observation_size
@@ -0,0 +1,90 @@
+import random
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import tetris_settings
+from tetris import Tetris
+from tetris_rules import TETROMINOES, STAGE_BOARD_SIZES
+from tetris_settings import GAME_STATES, BoardConfig, stage_board_config
+from tetris_tables import ACTION_ROTATIONS, NUM_ACTIONS
+from piece_source import PieceSource
+
+STAGES = (1, 5)
+NUM_STEPS = 120
+
+
+def new_game(app, stage):
+    return Tetris(app, render=True, config=stage_board_config(stage), pieces=PieceSource(TETROMINOES.keys(), seed=stage))
+
+
+def game_state(tetris):
+    """The core's state and where every sprite of the game sits."""
+    core = tetris.core
+    field = [(x, y, block.color, tuple(block.pos))
+             for y, row in enumerate(tetris.field_array) for x, block in enumerate(row) if block]
+    return (tuple(core.board.rows), core.score, core.shape, core.next_shape, core.held_piece, field,
+            [tuple(block.pos) for block in tetris.tetromino.blocks],
+            [tuple(block.next_pos) for block in tetris.next_tetromino.blocks],
+            sorted(block.rect.topleft for block in tetris.hold_sprite_group),
+            tetris.grid_surface.get_size())
+
+
+def play(tetris, seed):
+    """Random legal placements with a hold now and then; yields game_state() after every move."""
+    rng = random.Random(seed)
+    for step in range(NUM_STEPS):
+        if step % 5 == 2:
+            tetris.hold_piece()
+        else:
+            legal = [action for action, ok in enumerate(tetris.core.action_mask()) if ok]
+            tetris.drop_piece(*divmod(rng.choice(legal), ACTION_ROTATIONS))
+        if tetris.core.is_game_over():
+            tetris.reset_game()
+        yield game_state(tetris)
+
+
+def test_games_of_different_stages_share_a_process():
+    # One app for both games, sized for neither of them
+    app = SimpleNamespace(game_state=GAME_STATES['PLAYING'], allowed_shapes=list(TETROMINOES.keys()),
+                          field_width=6, field_height=12, anim_trigger=True)
+    alone = {stage: list(play(new_game(app, stage), stage)) for stage in STAGES}
+
+    games = {stage: new_game(app, stage) for stage in STAGES}
+    for stage, tetris in games.items():
+        assert tetris.config == BoardConfig(*STAGE_BOARD_SIZES[stage])
+        assert len(tetris.field_array) == tetris.config.height
+    interleaved = zip(*(play(tetris, stage) for stage, tetris in games.items()))
+    for step, states in enumerate(interleaved):
+        for stage, state in zip(STAGES, states):
+            assert state == alone[stage][step]
+    assert tetris_settings.FIELD_SIZE == (10, 20)
+
+
+def run_env(env, seed, actions):
+    """Plays `actions` from a reset with `seed`; yields (observation, reward, board image) after each."""
+    env.reset(seed=seed)
+    for action in actions:
+        (observation, _, _), reward, done, _, _ = env.step(action)
+        yield observation, reward, env.render_board_as_image()
+        if done:
+            env.reset()
+
+
+def test_wrappers_of_different_stages_share_a_process():
+    pytest.importorskip('gym')
+    from tetris_env import TetrisWrapper
+
+    actions = np.random.default_rng(0).integers(NUM_ACTIONS, size=NUM_STEPS).tolist()
+    alone = {stage: list(run_env(TetrisWrapper(stage=stage), stage, actions)) for stage in STAGES}
+
+    envs = {stage: TetrisWrapper(stage=stage) for stage in STAGES}
+    for stage, env in envs.items():
+        assert env.tetris.config == stage_board_config(stage)
+        assert env.render_board_as_image().shape[:2] == STAGE_BOARD_SIZES[stage][::-1]
+    interleaved = zip(*(run_env(env, stage, actions) for stage, env in envs.items()))
+    for step, results in enumerate(interleaved):
+        for stage, (observation, reward, image) in zip(STAGES, results):
+            expected = alone[stage][step]
+            np.testing.assert_array_equal(observation, expected[0])
+            assert reward == expected[1]
+            np.testing.assert_array_equal(image, expected[2])
@@ -0,0 +1,107 @@
+import os
+import random
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from board_render import PALETTE, FrameWriter, game_codes, render_codes, upscale
+from tetris import Tetris
+from tetris_rules import TETROMINOES
+from tetris_settings import GAME_STATES
+from tetris_tables import ACTION_ROTATIONS
+from piece_source import PieceSource
+
+# Per-cell colors of the board image the game was first recorded with
+SHAPE_COLORS = {
+    'I': (0, 255, 255), 'O': (255, 255, 0), 'T': (128, 0, 128),
+    'S': (0, 255, 0), 'Z': (255, 0, 0), 'J': (0, 0, 255),
+    'L': (255, 165, 0), 'default': (200, 200, 200)
+}
+
+
+def code_frames(count, seed=0):
+    """Distinct (H, W) code frames: Pillow merges repeated frames into one."""
+    rng = np.random.default_rng(seed)
+    frames = [upscale(rng.integers(len(PALETTE), size=(6, 4), dtype=np.uint8), 3) for _ in range(count)]
+    for n, frame in enumerate(frames):
+        frame[0, 0] = n % len(PALETTE)
+        frame[0, 1] = n // len(PALETTE)
+    return frames
+
+
+def baseline_image(tetris):
+    """The board drawn cell by cell from the game's block sprites, falling piece included."""
+    config = tetris.config
+    image = np.zeros((config.height, config.width, 3), dtype=np.uint8)
+    for y, row in enumerate(tetris.field_array):
+        for x, block in enumerate(row):
+            if block:
+                image[y, x] = SHAPE_COLORS.get(block.tetromino.shape, SHAPE_COLORS['default'])
+    for block in tetris.tetromino.blocks:
+        x, y = int(block.pos.x), int(block.pos.y)
+        if y >= 0:
+            image[y, x] = SHAPE_COLORS[tetris.tetromino.shape]
+    return image
+
+
+def panel_colors(image, rows):
+    """Colors of the side panel cells in `rows` that are not empty."""
+    return {tuple(color) for color in image[rows].reshape(-1, 3).tolist()} - {tuple(PALETTE[0])}
+
+
+@pytest.mark.parametrize('width, height', [(4, 8), (6, 12), (10, 20)])
+def test_game_codes_match_baseline_colors(width, height):
+    app = SimpleNamespace(game_state=GAME_STATES['PLAYING'], allowed_shapes=list(TETROMINOES.keys()),
+                          field_width=width, field_height=height, anim_trigger=True)
+    tetris = Tetris(app, render=True, pieces=PieceSource(TETROMINOES.keys(), seed=width))
+    rng = random.Random(width)
+    for step in range(200):
+        image = render_codes(game_codes(tetris.core))
+        np.testing.assert_array_equal(image[:, :width], baseline_image(tetris))
+        panel = image[:, width:]
+        assert panel_colors(panel, slice(1, 3)) == {SHAPE_COLORS[tetris.core.next_shape]}
+        held = tetris.core.held_piece
+        assert panel_colors(panel, slice(4, 6)) == (set() if held is None else {SHAPE_COLORS[held]})
+
+        if step % 7 == 3:
+            tetris.hold_piece()
+        else:
+            legal = [action for action, ok in enumerate(tetris.core.action_mask()) if ok]
+            tetris.drop_piece(*divmod(rng.choice(legal), ACTION_ROTATIONS))
+        if tetris.core.is_game_over():
+            tetris.reset_game()
+
+
+def read_gif(path):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        frames = []
+        for index in range(image.n_frames):
+            image.seek(index)
+            frames.append(np.asarray(image.convert('RGB')))
+        return frames, image.info.get('loop'), image.info.get('duration')
+
+
+def test_gif_frames_round_trip(tmp_path):
+    pytest.importorskip('PIL')
+    path = os.path.join(tmp_path, 'game.gif')
+    frames = code_frames(12)
+    with FrameWriter(path, fps=20) as writer:
+        for n, frame in enumerate(frames):
+            writer.append(frame if n % 2 else PALETTE[frame])   # Code and RGB frames
+    assert writer.frames == len(frames)
+
+    decoded, loop, duration = read_gif(path)
+    assert (loop, duration) == (0, 50)
+    assert len(decoded) == len(frames)
+    for frame, rgb in zip(frames, decoded):
+        np.testing.assert_array_equal(rgb, PALETTE[frame])
+
+
+def test_gif_without_frames_is_not_written(tmp_path):
+    pytest.importorskip('PIL')
+    path = os.path.join(tmp_path, 'empty.gif')
+    with FrameWriter(path) as writer:
+        pass
+    assert writer.frames == 0
+    assert not os.path.exists(path)
@@ -0,0 +1,101 @@
+import random
+import numpy as np
+import pytest
+from board_tensor import BOARD_CHANNELS, board_tensor, board_tensors, spawn_cells
+from vector_tetris import VectorTetris
+from tetris_core import TetrisCore
+from piece_source import PieceSource
+from afterstates import rows_to_board
+from tetris_rules import TETROMINOES
+from tetris_tables import ACTION_ROTATIONS
+from test_vector_tetris import deal, choose_actions
+
+# 17 is past MAX_TABLE_WIDTH, where rows are decoded by shifting
+SIZES = [(4, 8), (6, 12), (10, 20), (17, 20)]
+NUM_GAMES = 6
+NUM_STEPS = 150
+
+
+def plane(cells, width, height):
+    """(height, width) plane with `cells` set, those above the field left out."""
+    image = np.zeros((height, width), dtype=np.uint8)
+    for x, y in cells:
+        if y >= 0:
+            image[y, x] = 1
+    return image
+
+
+def reference_tensor(core):
+    """The board observation of `core` built straight from the game."""
+    width, height = core.board.width, core.board.height
+    state = core.x, core.y
+    core.hard_drop()
+    ghost = core.cells()
+    core.x, core.y = state
+    return np.stack([
+        rows_to_board(core.board.rows, width),
+        plane(core.cells(), width, height),
+        plane(ghost, width, height),
+        plane(spawn_cells(core.next_shape, width) if core.next_shape else [], width, height),
+        plane(spawn_cells(core.held_piece, width) if core.held_piece else [], width, height),
+    ]).astype(np.uint8)
+
+
+def play(core, rng):
+    """Holds now and then, moves the piece a little and locks it somewhere."""
+    if rng.random() < 0.15:
+        core.hold_piece()
+    for _ in range(rng.randrange(4)):
+        if rng.random() < 0.3:
+            core.rotate()
+        else:
+            core.move(rng.choice(['left', 'right', 'down']))
+
+
+@pytest.mark.parametrize('width, height', SIZES)
+def test_board_tensor_matches_game(width, height):
+    rng = random.Random(width)
+    cores = [TetrisCore(width, height, pieces=PieceSource(TETROMINOES.keys(), seed=seed)) for seed in range(NUM_GAMES)]
+    out = np.zeros((NUM_GAMES, len(BOARD_CHANNELS), height, width), dtype=np.float32)
+    finished = 0
+    for _ in range(NUM_STEPS):
+        for core in cores:
+            play(core, rng)
+        expected = np.array([reference_tensor(core) for core in cores])
+        for core, tensor in zip(cores, expected):
+            np.testing.assert_array_equal(board_tensor(core), tensor)
+        np.testing.assert_array_equal(board_tensors(cores), expected)
+        assert board_tensors(cores, out=out) is out
+        np.testing.assert_array_equal(out, expected)
+
+        for core, action in zip(cores, choose_actions(cores, rng)):
+            core.place(*divmod(action, ACTION_ROTATIONS))
+            core.hard_drop()
+            core.lock()
+            if core.is_game_over():
+                finished += 1
+                core.reset()
+    assert finished > 0
+    assert any(core.held_piece for core in cores)
+
+
+@pytest.mark.parametrize('width, height', SIZES)
+def test_vector_board_observations_match_board_tensors(width, height):
+    rng = random.Random(width)
+    vector = VectorTetris(NUM_GAMES, width, height, seed=0)
+    cores = [TetrisCore(width, height, pieces=PieceSource(TETROMINOES.keys(), seed=seed)) for seed in range(NUM_GAMES)]
+    envs = np.arange(1, NUM_GAMES, 2)
+    for _ in range(NUM_STEPS):
+        deal(vector, cores)
+        expected = board_tensors(cores)
+        np.testing.assert_array_equal(vector.board_observations(), expected)
+        np.testing.assert_array_equal(vector.board_observations(envs, dtype=np.float32), expected[envs])
+
+        actions = choose_actions(cores, rng)
+        _, _, dones, _ = vector.step(actions)
+        for n, (core, action) in enumerate(zip(cores, actions)):
+            core.place(*divmod(action, ACTION_ROTATIONS))
+            core.hard_drop()
+            core.lock()
+            if dones[n]:
+                core.reset()
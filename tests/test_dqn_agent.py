@@ -0,0 +1,80 @@
+import random
+import numpy as np
+from tetris_tables import NUM_ACTIONS
+from test_numpy_inference import load_notebook_class, load_tetris_dqn, torch
+
+NUM_ENVS = 64
+INPUT_SIZE = 20
+
+
+def new_agent():
+    """A DQNAgent with only what select_actions() uses; __init__ would open a TensorBoard writer."""
+    torch.manual_seed(0)
+    agent_class = load_notebook_class('DQNAgent', np=np, random=random)
+    agent = agent_class.__new__(agent_class)
+    agent.n_actions = NUM_ACTIONS
+    agent.device = 'cpu'
+    agent.policy_net = load_tetris_dqn()(INPUT_SIZE, NUM_ACTIONS)
+    agent.eps_start, agent.eps_end, agent.eps_decay_steps = 1.0, 0.05, 1000
+    agent.steps_done = 0
+    return agent
+
+
+def batch(seed=0):
+    """States and legal-action masks with a few legal actions per row, one of them a lone legal action."""
+    rng = np.random.default_rng(seed)
+    states = rng.random((NUM_ENVS, INPUT_SIZE), dtype=np.float32)
+    masks = rng.random((NUM_ENVS, NUM_ACTIONS)) < 0.2
+    masks[0] = False
+    masks[np.arange(NUM_ENVS), rng.integers(NUM_ACTIONS, size=NUM_ENVS)] = True
+    return states, masks
+
+
+def greedy(agent, states, masks=None):
+    with torch.no_grad():
+        q_values = agent.policy_net(torch.as_tensor(states)).numpy()
+    if masks is not None:
+        q_values = np.where(masks, q_values, -np.inf)
+    return q_values.argmax(axis=1)
+
+
+def test_eval_mode_is_the_masked_argmax():
+    agent = new_agent()
+    states, masks = batch()
+    for _ in range(5):
+        np.testing.assert_array_equal(agent.select_actions(states, masks, eval_mode=True), greedy(agent, states, masks))
+        np.testing.assert_array_equal(agent.select_actions(states, eval_mode=True), greedy(agent, states))
+    # Exploration would be certain at steps_done == 0, and the schedule does not move
+    assert agent.steps_done == 0
+    assert (greedy(agent, states, masks) != greedy(agent, states)).any()
+
+
+def test_exploration_stays_legal():
+    agent = new_agent()
+    agent.eps_decay_steps = 10 ** 9     # Exploring all along
+    states, masks = batch(1)
+    seen = np.zeros_like(masks)
+    np.random.seed(0)
+    for _ in range(200):
+        actions = agent.select_actions(states, masks)
+        assert actions.dtype == np.int64 and masks[np.arange(NUM_ENVS), actions].all()
+        seen[np.arange(NUM_ENVS), actions] = True
+    # Uniform over the legal actions: every one of them comes up
+    np.testing.assert_array_equal(seen, masks)
+    assert agent.steps_done == 200 * NUM_ENVS
+
+
+def test_per_environment_epsilon():
+    agent = new_agent()
+    states, masks = batch(2)
+    epsilon = np.where(np.arange(NUM_ENVS) % 2, 1.0, 0.0)
+    expected = greedy(agent, states, masks)
+    np.random.seed(0)
+    explored = np.zeros(NUM_ENVS, dtype=bool)
+    for _ in range(50):
+        actions = agent.select_actions(states, masks, epsilon=epsilon)
+        assert masks[np.arange(NUM_ENVS), actions].all()
+        np.testing.assert_array_equal(actions[::2], expected[::2])
+        explored |= actions != expected
+    assert explored[1::2].any() and not explored[::2].any()
+    assert agent.steps_done == 0
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from evaluation import play_episodes
+from numpy_inference import LAYERS, NumpyDQN
+from afterstates import feature_size
+from tetris_core import SHAPES
+from tetris_rules import STAGE_BOARD_SIZES
+from tetris_tables import NUM_ACTIONS
+
+SEEDS = list(range(6))
+MAX_STEPS = 60
+
+# Parameter shapes of an untrained TetrisDQN, None standing for the observation size
+LAYER_SHAPES = {'feature.0': (128, None), 'feature.1': (128,), 'feature.3': (64, 128), 'feature.4': (64,),
+                'value_stream.0': (32, 64), 'value_stream.2': (1, 32),
+                'adv_stream.0': (32, 64), 'adv_stream.2': (NUM_ACTIONS, 32)}
+
+
+def random_weights(stage, seed=0):
+    """NumpyDQN weights of an untrained network for the board size of `stage`."""
+    rng = np.random.default_rng(seed)
+    input_size = feature_size(STAGE_BOARD_SIZES.get(stage, (10, 20))[0]) + 2 * len(SHAPES)
+    weights = {}
+    for prefix, kind in LAYERS:
+        shape = tuple(input_size if size is None else size for size in LAYER_SHAPES[prefix])
+        if kind == 'layer_norm':
+            weights[f'{prefix}.weight'] = 1.0 + 0.1 * rng.standard_normal(shape)
+        else:
+            weights[f'{prefix}.weight'] = rng.standard_normal(shape) / np.sqrt(shape[1])
+        weights[f'{prefix}.bias'] = 0.1 * rng.standard_normal(shape[0])
+    return weights
+
+
+def test_play_episodes_loads_no_torch_gym_or_pygame():
+    code = ('import sys; from evaluation import play_episodes; from test_evaluation import random_weights; '
+            'play_episodes(random_weights(5), 5, [0, 1], 20, True); '
+            "print(sorted(name for name in ('torch', 'gym', 'pygame') if name in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}).stdout
+    assert output.strip() == '[]'
+
+
+@pytest.mark.parametrize('stage', [1, 2, 5])
+@pytest.mark.parametrize('use_mask', [False, True])
+def test_play_episodes_matches_tetris_wrapper(stage, use_mask):
+    pytest.importorskip('gym')
+    from tetris_env import TetrisWrapper
+
+    weights = random_weights(stage)
+    model = NumpyDQN(weights)
+    env = TetrisWrapper(stage=stage)
+    results = play_episodes(weights, stage, SEEDS, MAX_STEPS, use_mask)
+    for seed, result in zip(SEEDS, results):
+        state, _ = env.reset(seed=seed)
+        reward, lines, steps, done = 0.0, 0, 0, False
+        while not done and steps < MAX_STEPS:
+            action = model.select_action(state, env.action_mask() if use_mask else None)
+            state, step_reward, done, _, info = env.step(action)
+            reward += step_reward
+            lines += info['lines_cleared']
+            steps += 1
+        assert result.seed == seed
+        assert (result.lines, result.steps, result.score, result.truncated) == (lines, steps, env.score, not done)
+        assert result.reward == pytest.approx(reward)
@@ -0,0 +1,57 @@
+import ast
+import glob
+import json
+import os
+import numpy as np
+import pytest
+from numpy_inference import NumpyDQN, export_checkpoint
+from afterstates import feature_size
+from tetris_core import SHAPES
+from tetris_tables import NUM_ACTIONS
+
+torch = pytest.importorskip('torch')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_notebook_class(name, **namespace):
+    """
+    Class `name`, compiled from the training notebook where it is defined.
+
+    Only the class statement runs, with torch and nn plus `namespace` as its globals.
+    """
+    for path in glob.glob(os.path.join(ROOT, '*.ipynb')):
+        with open(path, encoding='utf-8') as file:
+            cells = json.load(file)['cells']
+        for cell in cells:
+            source = ''.join(cell['source'])
+            if cell['cell_type'] == 'code' and f'class {name}' in source:
+                tree = ast.parse(source)
+                classes = [node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == name]
+                namespace.update(torch=torch, nn=torch.nn)
+                exec(compile(ast.Module(classes, type_ignores=[]), path, 'exec'), namespace)
+                return namespace[name]
+    pytest.skip(f'{name} not found in the notebook')
+
+
+def load_tetris_dqn():
+    return load_notebook_class('TetrisDQN')
+
+
+def test_numpy_q_values_match_torch(tmp_path):
+    torch.manual_seed(0)
+    net = load_tetris_dqn()(feature_size(10) + 2 * len(SHAPES), NUM_ACTIONS).eval()
+    checkpoint = os.path.join(tmp_path, 'agent.pt')
+    torch.save({'policy_net_state_dict': net.state_dict()}, checkpoint)
+    model = export_checkpoint(checkpoint, os.path.join(tmp_path, 'agent.npz'), net=net)
+
+    # Feature-sized inputs: heights and counts run up to the board height and beyond
+    states = np.random.default_rng(0).random((64, model.input_size), dtype=np.float32) * 20
+    with torch.no_grad():
+        expected = net(torch.as_tensor(states)).numpy()
+    np.testing.assert_allclose(model.forward(states), expected, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(model.forward(states[0]), expected[0], rtol=1e-4, atol=1e-4)
+
+    reloaded = NumpyDQN(os.path.join(tmp_path, 'agent.npz'))
+    np.testing.assert_allclose(reloaded.forward(states), expected, rtol=1e-4, atol=1e-4)
+    assert (reloaded.select_actions(states) == expected.argmax(axis=1)).all()
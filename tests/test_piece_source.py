@@ -0,0 +1,88 @@
+import random
+import pytest
+from piece_source import PieceSequence, PieceSource
+from tetris_rules import TETROMINOES
+
+SHAPES = list(TETROMINOES.keys())
+BLOCK_SIZES = [1, 5, 7, 10, 1024]
+
+
+@pytest.mark.parametrize('shapes', [SHAPES, ['I', 'O', 'T']])
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+def test_bags_hold_every_shape_once(shapes, block_size):
+    source = PieceSource(shapes, 'bag', seed=0, block_size=block_size)
+    pieces = [source.next() for _ in range(50 * len(shapes))]
+    bags = -(-block_size // len(shapes))
+    assert len(source.block) == bags * len(shapes)
+    for start in range(0, len(pieces), len(shapes)):
+        assert sorted(pieces[start:start + len(shapes)]) == sorted(shapes)
+
+
+@pytest.mark.parametrize('mode', ['uniform', 'bag'])
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+def test_state_round_trip(mode, block_size):
+    for drawn in (0, 3, block_size, 2 * block_size + 1):
+        source = PieceSource(SHAPES, mode, seed=1, block_size=block_size)
+        for _ in range(drawn):
+            source.next()
+        state = source.get_state()
+        expected = [source.next() for _ in range(3 * block_size + 5)]
+
+        source.set_state(state)
+        assert source.peek(len(expected)) == expected
+        assert [source.next() for _ in expected] == expected
+
+        # Another game's source picks the sequence up from the state
+        other = PieceSource(SHAPES, mode, seed=2, block_size=block_size)
+        other.next()
+        other.set_state(state)
+        assert [other.next() for _ in expected] == expected
+
+
+def test_peek_does_not_draw():
+    source = PieceSource(SHAPES, seed=3, block_size=4)
+    source.next()
+    peeked = source.peek(10)
+    assert source.peek(10) == peeked
+    assert [source.next() for _ in range(10)] == peeked
+
+
+def test_seed_restarts_the_sequence():
+    source = PieceSource(SHAPES, 'bag', seed=4, block_size=7)
+    first = [source.next() for _ in range(30)]
+    source.seed(4)
+    assert [source.next() for _ in range(30)] == first
+    other = PieceSource(SHAPES, 'bag', seed=4, block_size=7)
+    assert [other.next() for _ in range(30)] == first
+
+    # Without a seed the global random module decides, so random.seed() reproduces it
+    random.seed(5)
+    unseeded = [PieceSource(SHAPES).next() for _ in range(20)]
+    random.seed(5)
+    assert [PieceSource(SHAPES).next() for _ in range(20)] == unseeded
+
+
+def test_set_shapes_drops_pregenerated_pieces():
+    source = PieceSource(SHAPES, 'bag', seed=6)
+    source.next()
+    source.set_shapes(['I', 'O'])
+    pieces = [source.next() for _ in range(20)]
+    assert set(pieces) == {'I', 'O'}
+    assert all(sorted(pieces[start:start + 2]) == ['I', 'O'] for start in range(0, 20, 2))
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        PieceSource(SHAPES, 'shuffle')
+
+
+def test_piece_sequence_state_round_trip():
+    sequence = PieceSequence(['I', 'O', 'T', 'S'], SHAPES)
+    sequence.next()
+    state = sequence.get_state()
+    assert sequence.peek(2) == ['O', 'T']
+    assert [sequence.next() for _ in range(3)] == ['O', 'T', 'S']
+    with pytest.raises(IndexError):
+        sequence.next()
+    sequence.set_state(state)
+    assert sequence.next() == 'O'
@@ -0,0 +1,59 @@
+import random
+import pytest
+from planner import Planner
+from tetris_core import TetrisCore
+from piece_source import PieceSource
+from tetris_rules import TETROMINOES
+
+
+def new_core(width, height, shapes=TETROMINOES.keys(), seed=0):
+    return TetrisCore(width, height, pieces=PieceSource(shapes, seed=seed))
+
+
+def empty_board_value(planner, core, queue, depth=1):
+    planner.scratch_core(core)
+    return planner.value(core.snapshot(rng=False), core.board.hash, queue, depth)
+
+
+def test_cache_does_not_leak_across_board_sizes():
+    small = new_core(4, 20)
+    expected = empty_board_value(Planner(), small, ('I',))
+
+    planner = Planner()
+    # Empty boards hash to 0 at every size
+    empty_board_value(planner, new_core(10, 20), ('I',))
+    assert empty_board_value(planner, small, ('I',)) == pytest.approx(expected)
+
+
+def test_cache_does_not_leak_across_allowed_shapes():
+    core = new_core(6, 12, shapes=['O'])
+    expected = empty_board_value(Planner(), core, (), depth=2)
+
+    planner = Planner()
+    empty_board_value(planner, new_core(6, 12), (), depth=2)
+    assert empty_board_value(planner, core, (), depth=2) == pytest.approx(expected)
+
+
+def test_timed_planner_always_returns_a_move():
+    core = new_core(10, 20)
+    move = Planner(depth=3, time_limit=0.0).plan(core)
+    assert move is not None
+    assert move.depth == 1
+    assert move.action in [action for action, legal in enumerate(core.action_mask()) if legal]
+
+
+def test_planner_leaves_the_global_random_state_alone():
+    core = new_core(6, 12)
+    state = random.getstate()
+    Planner(depth=2).plan(core)
+    Planner(depth=2).plan(new_core(10, 20))
+    assert random.getstate() == state
+
+
+def test_repeated_positions_come_from_the_cache():
+    core = new_core(6, 12)
+    planner = Planner(depth=2, use_hold=False)
+    first = planner.plan(core)
+    misses = planner.cache.misses
+    assert planner.plan(core) == first
+    assert planner.cache.misses == misses and planner.cache.hits > 0
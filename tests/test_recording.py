@@ -0,0 +1,73 @@
+import os
+import random
+from types import SimpleNamespace
+import pytest
+from recording import Recorder, read_recordings, verify
+from tetris import Tetris
+from tetris_rules import TETROMINOES
+from tetris_settings import GAME_STATES
+from tetris_tables import ACTION_ROTATIONS
+from piece_source import PieceSource
+
+EPISODES = 3
+
+
+def new_game(width=6, height=12):
+    app = SimpleNamespace(game_state=GAME_STATES['PLAYING'], allowed_shapes=list(TETROMINOES.keys()),
+                          field_width=width, field_height=height)
+    return Tetris(app, render=False, pieces=PieceSource(TETROMINOES.keys(), seed=0))
+
+
+def record_games(path, episodes=EPISODES):
+    """Records `episodes` games of random legal placements; returns their final scores."""
+    rng = random.Random(0)
+    tetris = new_game()
+    finals = []
+    with Recorder(path) as recorder:
+        for seed in range(episodes):
+            tetris.core.pieces.seed(seed)
+            tetris.reset_game()
+            recorder.begin(tetris, seed=seed)
+            while not tetris.core.is_game_over():
+                legal = [action for action, ok in enumerate(tetris.core.action_mask()) if ok]
+                tetris.drop_piece(*divmod(rng.choice(legal), ACTION_ROTATIONS))
+            finals.append(tetris.core.score)
+    return finals
+
+
+def test_recorded_games_replay(tmp_path):
+    path = os.path.join(tmp_path, 'games.rec')
+    scores = record_games(path)
+    recordings = list(read_recordings(path))
+    assert [recording.seed for recording in recordings] == list(range(EPISODES))
+    for recording, score in zip(recordings, scores):
+        assert recording.game_over
+        assert recording.score == score
+        assert verify(recording).score == score
+
+
+def test_truncated_last_episode_is_skipped(tmp_path):
+    path = os.path.join(tmp_path, 'games.rec')
+    record_games(path)
+    with open(path, 'rb') as file:
+        data = file.read()
+    complete = list(read_recordings(path))
+    for cut in (1, 2, 8, len(data) // 4):
+        truncated = os.path.join(tmp_path, 'truncated.rec')
+        with open(truncated, 'wb') as file:
+            file.write(data[:-cut])
+        assert list(read_recordings(truncated)) == complete[:-1]
+
+
+def test_recorded_game_cannot_be_restored(tmp_path):
+    tetris = new_game()
+    snapshot = tetris.snapshot()
+    with Recorder(os.path.join(tmp_path, 'games.rec')) as recorder:
+        tetris.reset_game()
+        recorder.begin(tetris)
+        tetris.drop_piece(0, 0)
+        with pytest.raises(RuntimeError):
+            tetris.restore(snapshot)
+        recorder.end()
+        tetris.restore(snapshot)
+    assert tetris.core.board.hash == 0
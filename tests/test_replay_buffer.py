@@ -0,0 +1,38 @@
+import numpy as np
+from replay_buffer import PrioritizedReplayBuffer
+
+OBSERVATION_SIZE = 8
+
+
+def fill(buffer, count, rng):
+    for _ in range(count):
+        buffer.push(rng.random(OBSERVATION_SIZE, dtype=np.float32), int(rng.integers(40)), float(rng.random()),
+                    rng.random(OBSERVATION_SIZE, dtype=np.float32), False)
+
+
+def test_zero_priorities_keep_weights_finite():
+    rng = np.random.default_rng(0)
+    buffer = PrioritizedReplayBuffer(64)
+    fill(buffer, 50, rng)
+    _, indices, _ = buffer.sample(16)
+    buffer.update_priorities(indices, np.zeros(len(indices)))
+    buffer.push_batch(rng.random((4, OBSERVATION_SIZE), dtype=np.float32), np.zeros(4, dtype=np.int64),
+                      np.zeros(4), rng.random((4, OBSERVATION_SIZE), dtype=np.float32), np.zeros(4, dtype=bool),
+                      priorities=np.zeros(4))
+
+    _, _, weights = buffer.sample(256)
+    assert np.isfinite(weights).all()
+    assert (weights > 0).all()
+    assert weights.max() <= 1.0
+
+
+def test_sample_returns_pushed_transitions():
+    rng = np.random.default_rng(1)
+    buffer = PrioritizedReplayBuffer(32)
+    fill(buffer, 40, rng)   # Wraps around
+    assert len(buffer) == 32
+    batch, indices, weights = buffer.sample(64)
+    assert (indices < 32).all()
+    np.testing.assert_array_equal(batch.state, buffer.storage.states[indices])
+    np.testing.assert_array_equal(batch.action, buffer.storage.actions[indices])
+    assert weights.shape == (64,)
@@ -0,0 +1,75 @@
+import random
+import numpy as np
+from replay_buffer import PrioritizedReplayBuffer
+from replay_storage import MemmapStorage, CompactState, compact_state, decode_observations
+from afterstates import rows_to_board
+from tetris_core import TetrisCore
+from piece_source import PieceSource
+from tetris_rules import TETROMINOES
+from tetris_tables import ACTION_ROTATIONS
+
+WIDTH, HEIGHT = 6, 12
+CAPACITY = 64
+
+
+def play_transitions(count, seed=0):
+    """(state, action, reward, next_state, done) tuples of seeded random games, states as CompactStates."""
+    rng = random.Random(seed)
+    core = TetrisCore(WIDTH, HEIGHT, pieces=PieceSource(TETROMINOES.keys(), seed=seed))
+    transitions = []
+    while len(transitions) < count:
+        state = compact_state(core)
+        action = rng.choice([action for action, legal in enumerate(core.action_mask()) if legal])
+        core.place(*divmod(action, ACTION_ROTATIONS))
+        core.hard_drop()
+        core.lock()
+        done = core.is_game_over()
+        transitions.append((state, action, float(core.lines_last_step), compact_state(core), done))
+        if done:
+            core.reset()
+    return transitions
+
+
+def stack(states):
+    return CompactState(np.array([state.rows for state in states]), np.array([state.piece for state in states]),
+                        np.array([state.next_piece for state in states]), np.array([state.lines for state in states]))
+
+
+def observation(state):
+    return decode_observations(np.array([state.rows]), np.array([state.piece]), np.array([state.next_piece]),
+                               np.array([state.lines]), WIDTH)[0]
+
+
+def test_memmap_storage_round_trip(tmp_path):
+    transitions = play_transitions(48)
+    buffer = PrioritizedReplayBuffer(CAPACITY, storage=MemmapStorage(tmp_path, CAPACITY, WIDTH, HEIGHT))
+    for transition in transitions[:24]:
+        buffer.push(*transition)
+    states, actions, rewards, next_states, dones = zip(*transitions[24:])
+    buffer.push_batch(stack(states), np.array(actions), np.array(rewards), stack(next_states), np.array(dones),
+                      priorities=np.linspace(0.5, 3.0, len(actions)))
+    buffer.update_priorities(np.arange(4), [0.25, 0.5, 1.0, 2.0])
+    priorities = buffer.storage.priorities[:len(transitions)].copy()
+    buffer.flush()
+    del buffer
+
+    reopened = PrioritizedReplayBuffer(CAPACITY, storage=MemmapStorage(tmp_path, CAPACITY, WIDTH, HEIGHT))
+    assert len(reopened) == len(transitions)
+    assert reopened.position == len(transitions)
+    np.testing.assert_array_equal(reopened.storage.priorities[:len(transitions)], priorities)
+
+    storage = reopened.storage
+    for index, (state, action, reward, next_state, done) in enumerate(transitions):
+        np.testing.assert_array_equal(rows_to_board(storage.rows[index], WIDTH), rows_to_board(state.rows, WIDTH))
+        np.testing.assert_array_equal(rows_to_board(storage.next_rows[index], WIDTH),
+                                      rows_to_board(next_state.rows, WIDTH))
+
+    batch, indices, weights = reopened.sample(128)
+    assert np.isfinite(weights).all()
+    for k, index in enumerate(indices):
+        state, action, reward, next_state, done = transitions[index]
+        np.testing.assert_array_equal(batch.state[k], observation(state))
+        np.testing.assert_array_equal(batch.next_state[k], observation(next_state))
+        assert batch.action[k] == action
+        assert batch.reward[k] == reward
+        assert batch.done[k] == done
@@ -0,0 +1,116 @@
+import random
+from types import SimpleNamespace
+import pytest
+from tetris import Tetris
+from tetris_core import TetrisCore
+from tetris_rules import TETROMINOES
+from tetris_settings import GAME_STATES
+from tetris_tables import ACTION_ROTATIONS
+from piece_source import PieceSource
+
+NUM_MOVES = 40
+HOLD = -1
+
+
+def choose_moves(core, rng, count=NUM_MOVES):
+    """`count` moves of random actions, a hold (HOLD) now and then."""
+    return [HOLD if rng.random() < 0.15 else rng.randrange(len(core.action_mask())) for _ in range(count)]
+
+
+def core_state(core):
+    """Everything a game is: board, hash, counters, pieces, features and the pieces still to come."""
+    return (tuple(core.board.rows), tuple(core.board.shape_rows), core.board.hash, tuple(core.board.heights),
+            core.shape, core.rotation, core.x, core.y, core.next_shape, core.held_piece, core.can_hold,
+            core.score, core.level, core.lines_to_next_level, core.full_lines, core.combo_count,
+            core.game_over, core.features.view, core.pieces.peek(20))
+
+
+def play_core(core, moves):
+    states = []
+    for move in moves:
+        if core.game_over:
+            core.reset()
+        elif move == HOLD:
+            core.hold_piece()
+        else:
+            core.place(*divmod(move, ACTION_ROTATIONS))
+            core.hard_drop()
+            core.lock()
+        states.append(core_state(core))
+    return states
+
+
+@pytest.mark.parametrize('mode', ['uniform', 'bag'])
+@pytest.mark.parametrize('width, height', [(4, 8), (10, 20)])
+def test_core_snapshot_round_trip(mode, width, height):
+    rng = random.Random(width)
+    core = TetrisCore(width, height, pieces=PieceSource(TETROMINOES.keys(), mode, seed=width, block_size=16))
+    for _ in range(6):
+        play_core(core, choose_moves(core, rng))
+        snapshot = core.snapshot()
+        saved = core_state(core)
+        moves = choose_moves(core, rng)
+        expected = play_core(core, moves)
+
+        core.restore(snapshot)
+        assert core_state(core) == saved
+        assert play_core(core, moves) == expected
+
+        # A fresh game restored from the snapshot plays the same
+        other = TetrisCore(width, height, pieces=PieceSource(TETROMINOES.keys(), mode, seed=0, block_size=16))
+        other.restore(snapshot)
+        assert play_core(other, moves) == expected
+
+
+def test_snapshot_without_rng_keeps_the_piece_stream():
+    core = TetrisCore(6, 12, pieces=PieceSource(TETROMINOES.keys(), seed=0))
+    snapshot = core.snapshot(rng=False)
+    core.place(0, 0)
+    core.hard_drop()
+    core.lock()
+    upcoming = core.pieces.peek(10)
+    core.restore(snapshot)
+    assert core.board.hash == 0 and core.pieces.peek(10) == upcoming
+
+
+def sprite_state(tetris):
+    """core_state() plus the color of every locked sprite and where the piece sprites are."""
+    field = [(x, y, block.color) for y, row in enumerate(tetris.field_array) for x, block in enumerate(row) if block]
+    return (core_state(tetris.core), field,
+            [tuple(block.pos) for block in tetris.tetromino.blocks], tetris.tetromino.shape,
+            tetris.next_tetromino.shape, sorted(block.rect.topleft for block in tetris.hold_sprite_group),
+            tetris.app.game_state)
+
+
+def play_tetris(tetris, moves):
+    states = []
+    for move in moves:
+        if tetris.core.is_game_over():
+            tetris.app.game_state = GAME_STATES['PLAYING']
+            tetris.reset_game()
+        elif move == HOLD:
+            tetris.hold_piece()
+        else:
+            legal = [action for action, ok in enumerate(tetris.core.action_mask()) if ok]
+            tetris.drop_piece(*divmod(legal[move % len(legal)], ACTION_ROTATIONS))
+        states.append(sprite_state(tetris))
+    return states
+
+
+@pytest.mark.parametrize('width, height', [(4, 8), (10, 20)])
+def test_rendered_snapshot_rebuilds_sprites(width, height):
+    rng = random.Random(width)
+    app = SimpleNamespace(game_state=GAME_STATES['PLAYING'], allowed_shapes=list(TETROMINOES.keys()),
+                          field_width=width, field_height=height, anim_trigger=True)
+    tetris = Tetris(app, render=True, pieces=PieceSource(TETROMINOES.keys(), seed=width))
+    for _ in range(6):
+        play_tetris(tetris, choose_moves(tetris.core, rng))
+        snapshot = tetris.snapshot()
+        saved = sprite_state(tetris)
+        moves = choose_moves(tetris.core, rng)
+        expected = play_tetris(tetris, moves)
+
+        tetris.restore(snapshot)
+        assert sprite_state(tetris) == saved
+        assert len(tetris.sprite_group) == len(saved[1]) + 2 * len(TETROMINOES['I'])
+        assert play_tetris(tetris, moves) == expected
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from tetris_tables import NUM_ACTIONS
+
+NUM_WORKERS = 2
+ENVS_PER_WORKER = 3
+NUM_ENVS = NUM_WORKERS * ENVS_PER_WORKER
+NUM_STEPS = 60
+
+
+def reference_envs(stage, seed):
+    """In-process TetrisWrappers seeded like the games of a SubprocVectorEnv reset with `seed`."""
+    from tetris_env import TetrisWrapper
+
+    envs = [TetrisWrapper(stage=stage) for _ in range(NUM_ENVS)]
+    observations = np.array([env.reset(seed=seed * NUM_ENVS + slot)[0][0] for slot, env in enumerate(envs)])
+    return envs, observations
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_subproc_env_matches_tetris_wrapper(seed):
+    pytest.importorskip('gym')
+    from subproc_env import SubprocVectorEnv
+
+    rng = np.random.default_rng(seed)
+    envs, expected = reference_envs(1, seed)
+    finished = 0
+    with SubprocVectorEnv(NUM_WORKERS, ENVS_PER_WORKER, stage=1) as vector:
+        np.testing.assert_array_equal(vector.reset(seed=seed), expected)
+        for _ in range(NUM_STEPS):
+            actions = rng.integers(NUM_ACTIONS, size=NUM_ENVS)
+            observations, rewards, dones, info = vector.step(actions)
+            for slot, (env, action) in enumerate(zip(envs, actions)):
+                (observation, _, _), reward, done, _, env_info = env.step(int(action))
+                assert rewards[slot] == pytest.approx(reward)
+                assert dones[slot] == done
+                for key in ('lines_cleared', 'total_lines', 'pieces_placed', 'score'):
+                    assert info[key][slot] == env_info[key]
+                if done:
+                    finished += 1
+                    np.testing.assert_array_equal(info['final_observations'][slot], observation)
+                    observation = env.reset()[0][0]     # The worker goes on with the same piece stream
+                np.testing.assert_array_equal(observations[slot], observation)
+    assert finished > 0
+
+
+def test_reset_seeds_do_not_overlap():
+    pytest.importorskip('gym')
+    from subproc_env import SubprocVectorEnv
+
+    with SubprocVectorEnv(NUM_WORKERS, ENVS_PER_WORKER, stage=5) as vector:
+        first = vector.reset(seed=0).copy()
+        second = vector.reset(seed=1).copy()
+    # Worker 1 of seed 0 used to deal the games of worker 0 of seed 1
+    assert not any((first[slot] == second[other]).all()
+                   for slot in range(ENVS_PER_WORKER, NUM_ENVS) for other in range(ENVS_PER_WORKER))
+    np.testing.assert_array_equal(first, reference_envs(5, 0)[1])
@@ -0,0 +1,84 @@
+import random
+import numpy as np
+import pytest
+from tetris_core import TetrisCore
+from afterstates import enumerate_placements
+from tetris_features import BoardFeatures
+from piece_source import PieceSource
+from tetris_rules import TETROMINOES
+from tetris_tables import ACTION_ROTATIONS
+
+SIZES = [(4, 12), (6, 12), (10, 20)]
+
+
+def play_random(width, height, seed, check, max_pieces=150):
+    """
+    Plays a game of mostly greedy, partly random placements, calling check(core)
+    after every lock. Returns the lines cleared.
+    """
+    rng = random.Random(seed)
+    core = TetrisCore(width, height, pieces=PieceSource(TETROMINOES.keys(), seed=seed))
+    check(core)
+    lines = 0
+    for _ in range(max_pieces):
+        if core.game_over:
+            break
+        placements = enumerate_placements(core)
+        if rng.random() < 0.3:
+            action = rng.choice(placements.actions.tolist())
+        else:
+            # Clear lines, keep the stack low and avoid holes
+            features = placements.features
+            score = 10 * placements.lines - features[:, :width].sum(axis=1) - 4 * features[:, width + 1]
+            action = placements.actions[np.argmax(score)]
+        core.place(*divmod(int(action), ACTION_ROTATIONS))
+        core.hard_drop()
+        core.lock()
+        lines += core.lines_last_step
+        check(core)
+    return lines
+
+
+def check_board(core):
+    board = core.board
+    assert board.row_fill == [bin(row).count('1') for row in board.rows]
+    assert board.heights == [
+        next((board.height - y for y, row in enumerate(board.rows) if row >> x & 1), 0) for x in range(board.width)
+    ]
+    expected_hash = 0
+    for y, row in enumerate(board.rows):
+        expected_hash ^= board.row_hash(y, row)
+    assert board.hash == expected_hash
+
+
+def check_features(core):
+    features = core.features
+    fresh = BoardFeatures(core.board)
+    assert features.column_fill == fresh.column_fill
+    assert features.row_transition_counts == fresh.row_transition_counts
+    assert features.pair_transition_counts == fresh.pair_transition_counts
+    assert features.near_full == fresh.near_full
+    # lines_cleared and eroded_cells describe the last lock, which a recompute cannot know
+    view = features.view._replace(lines_cleared=0, eroded_cells=0)
+    assert view == fresh.view
+
+
+@pytest.mark.parametrize('width, height', SIZES)
+def test_incremental_board_matches_recompute(width, height):
+    lines = sum(play_random(width, height, seed, check_board) for seed in range(10))
+    assert lines > 0
+
+
+@pytest.mark.parametrize('width, height', SIZES)
+def test_incremental_features_match_recompute(width, height):
+    lines = sum(play_random(width, height, seed, check_features) for seed in range(10))
+    assert lines > 0
+
+
+def test_lines_cleared_and_eroded_cells():
+    core = TetrisCore(4, 8, pieces=PieceSource(['I'], seed=0))
+    core.place(0, 1)
+    core.hard_drop()
+    core.lock()
+    assert core.features.view.lines_cleared == 1
+    assert core.features.view.eroded_cells == 4
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from tetris_tables import NUM_ACTIONS
+
+NUM_ENVS = 3
+NUM_STEPS = 80
+MODES = [('features', None), ('board', None), ('board', np.float32)]
+
+
+def new_envs(stage, mode, dtype):
+    from tetris_env import TetrisWrapper
+
+    return [TetrisWrapper(stage=stage, observation_mode=mode, observation_dtype=dtype) for _ in range(NUM_ENVS)]
+
+
+@pytest.mark.parametrize('mode, dtype', MODES)
+def test_observation_batch_matches_tuple_mode(mode, dtype):
+    pytest.importorskip('gym')
+    from tetris_env import observation_batch
+
+    rng = np.random.default_rng(0)
+    envs, batch_envs = new_envs(1, mode, dtype), new_envs(1, mode, dtype)
+    expected = [env.reset(seed=seed)[0][0] for seed, env in enumerate(envs)]
+    for seed, env in enumerate(batch_envs):
+        env.reset(seed=seed)
+    out = observation_batch(batch_envs)
+    assert out.shape == (NUM_ENVS, *envs[0].observation_shape) and out.dtype == envs[0].observation_dtype
+    np.testing.assert_array_equal(out, expected)
+
+    finished = 0
+    for _ in range(NUM_STEPS):
+        for n, (env, batch_env) in enumerate(zip(envs, batch_envs)):
+            action = int(rng.integers(NUM_ACTIONS))
+            (observation, _, _), reward, done, _, info = env.step(action)
+            row, batch_reward, batch_done, _, batch_info = batch_env.step(action)
+            assert row.base is out and np.shares_memory(row, out[n])
+            assert (batch_reward, batch_done, batch_info) == (reward, done, info)
+            np.testing.assert_array_equal(out[n], observation)
+            if done:
+                finished += 1
+                observation = env.reset()[0][0]
+                row, _ = batch_env.reset()
+                assert row.base is out
+                np.testing.assert_array_equal(out[n], observation)
+    assert finished > 0
+
+    batch_envs[0].detach_observation_buffer()
+    observation, _, _ = batch_envs[0].step(0)[0]
+    assert not np.shares_memory(observation, out)
+
+
+def test_observation_batch_writes_into_out():
+    pytest.importorskip('gym')
+    from tetris_env import observation_batch
+
+    envs = new_envs(2, 'features', None)
+    for env in envs:
+        env.reset(seed=0)
+    out = np.full((NUM_ENVS, *envs[0].observation_shape), np.nan, dtype=np.float32)
+    assert observation_batch(envs, out) is out
+    np.testing.assert_array_equal(out, [env.write_observation(np.empty_like(out[0])) for env in envs])
+
+
+def test_mismatched_observation_buffer_is_rejected():
+    pytest.importorskip('gym')
+    from tetris_env import observation_batch
+
+    features, board = new_envs(1, 'features', None)[0], new_envs(1, 'board', None)[0]
+    for env, buffer in [(features, np.zeros(features.observation_shape, dtype=np.float64)),
+                        (features, np.zeros(features.observation_size + 1, dtype=np.float32)),
+                        (board, np.zeros(board.observation_shape, dtype=np.float32)),
+                        (board, np.zeros(features.observation_shape, dtype=np.uint8))]:
+        with pytest.raises(ValueError):
+            env.attach_observation_buffer(buffer)
+        assert env.observation_buffer is None
+    with pytest.raises(ValueError):
+        observation_batch([features], np.zeros((1, *board.observation_shape), dtype=np.uint8))
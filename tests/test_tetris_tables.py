@@ -0,0 +1,87 @@
+import random
+import pytest
+from pygame.math import Vector2
+from tetris_core import TetrisCore
+from tetris_rules import TETROMINOES, STAGE_BOARD_SIZES
+from tetris_tables import ACTION_COLUMNS, ACTION_ROTATIONS, NUM_ACTIONS, get_placement_table
+from piece_source import PieceSource
+
+WIDTHS = sorted({width for width, _ in STAGE_BOARD_SIZES.values()})
+DISTINCT_STATES = {'O': 1, 'I': 2, 'S': 2, 'Z': 2, 'T': 4, 'J': 4, 'L': 4}
+
+
+def turned(shape, rotation):
+    """Cell offsets of `shape` after `rotation` quarter turns, the way the sprites turned them."""
+    cells = [Vector2(cell) for cell in TETROMINOES[shape]]
+    for _ in range(rotation):
+        cells = [cell.rotate(90) for cell in cells]
+    return [(round(cell.x), round(cell.y)) for cell in cells]
+
+
+def normalized(cells):
+    left, top = min(x for x, _ in cells), min(y for _, y in cells)
+    return sorted((x - left, y - top) for x, y in cells)
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+@pytest.mark.parametrize('shape', list(TETROMINOES))
+def test_placement_table_matches_rotations(shape, width):
+    table = get_placement_table(shape, width)
+    assert len(table.states) == DISTINCT_STATES[shape]
+    for rotation in range(4):
+        state = table.by_rotation[rotation]
+        assert state in table.states
+        assert state.rotation <= rotation
+        assert list(state.offsets) == turned(shape, state.rotation)
+        assert normalized(state.offsets) == normalized(turned(shape, rotation))
+        xs = [dx for dx, _ in state.offsets]
+        assert (state.left, state.right) == (min(xs), max(xs))
+        assert (state.min_column, state.max_column) == (0, width - 1 - (max(xs) - min(xs)))
+        for column in range(-2, width + 2):
+            leftmost = table.pivot_x(column, rotation) + state.left
+            assert leftmost == max(state.min_column, min(state.max_column, column))
+
+    for action in range(NUM_ACTIONS):
+        column, rotation = divmod(action, ACTION_ROTATIONS)
+        canonical = table.canonical_actions[action]
+        assert table.canonical_actions[canonical] == canonical
+        assert table.action_mask[action] == (canonical == action)
+        state = table.by_rotation[rotation]
+        assert divmod(canonical, ACTION_ROTATIONS) == (
+            max(state.min_column, min(state.max_column, column)), state.rotation)
+    assert sum(table.action_mask) == sum(min(state.max_column + 1, ACTION_COLUMNS) for state in table.states)
+
+
+def landing_cells(core, action):
+    """Cells the falling piece locks into for `action`, found by playing it and putting the piece back."""
+    piece = core.rotation, core.x, core.y
+    core.place(*divmod(action, ACTION_ROTATIONS))
+    core.hard_drop()
+    cells = sorted(core.cells())
+    core.rotation, core.x, core.y = piece
+    return cells
+
+
+@pytest.mark.parametrize('width, height', sorted(set(STAGE_BOARD_SIZES.values())))
+def test_canonical_actions_land_like_their_actions(width, height):
+    rng = random.Random(width)
+    core = TetrisCore(width, height, pieces=PieceSource(TETROMINOES.keys(), seed=width))
+    finished = 0
+    for _ in range(300):
+        canonical = core.canonical_actions()
+        mask = core.action_mask()
+        cells = [landing_cells(core, action) for action in range(NUM_ACTIONS)]
+        for action in range(NUM_ACTIONS):
+            assert mask[canonical[action]]
+            assert cells[canonical[action]] == cells[action]
+        # Legal actions are the distinct landings
+        legal = [action for action in range(NUM_ACTIONS) if mask[action]]
+        assert len({tuple(cells[action]) for action in legal}) == len(legal)
+
+        core.place(*divmod(rng.choice(legal), ACTION_ROTATIONS))
+        core.hard_drop()
+        core.lock()
+        if core.game_over:
+            finished += 1
+            core.reset()
+    assert finished > 0
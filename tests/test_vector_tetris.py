@@ -0,0 +1,106 @@
+import random
+import numpy as np
+import pytest
+from vector_tetris import VectorTetris
+from tetris_core import TetrisCore, SHAPE_INDEX
+from piece_source import PieceSource
+from afterstates import rows_to_board
+from tetris_rules import TETROMINOES
+from tetris_tables import ACTION_ROTATIONS
+
+NUM_GAMES = 8
+NUM_STEPS = 400
+
+
+def deal(vector, cores):
+    """Gives every board of `vector` the current and next piece of its TetrisCore."""
+    vector.pieces[:] = [SHAPE_INDEX[core.shape] for core in cores]
+    vector.next_pieces[:] = [SHAPE_INDEX[core.next_shape] for core in cores]
+
+
+def choose_actions(cores, rng):
+    """A random legal action per game, any action now and then to exercise clamping and blocked paths."""
+    actions = []
+    for core in cores:
+        if rng.random() < 0.2:
+            actions.append(rng.randrange(len(core.action_mask())))
+        else:
+            actions.append(rng.choice([action for action, legal in enumerate(core.action_mask()) if legal]))
+    return actions
+
+
+@pytest.mark.parametrize('width, height', [(4, 8), (6, 12), (10, 20)])
+def test_vector_tetris_matches_tetris_core(width, height):
+    rng = random.Random(width)
+    vector = VectorTetris(NUM_GAMES, width, height, seed=0)
+    cores = [TetrisCore(width, height, pieces=PieceSource(TETROMINOES.keys(), seed=seed)) for seed in range(NUM_GAMES)]
+    finished = 0
+    for _ in range(NUM_STEPS):
+        deal(vector, cores)
+        actions = choose_actions(cores, rng)
+        _, _, dones, info = vector.step(actions)
+        for n, (core, action) in enumerate(zip(cores, actions)):
+            core.place(*divmod(action, ACTION_ROTATIONS))
+            core.hard_drop()
+            core.lock()
+            assert bool(dones[n]) == core.is_game_over()
+            assert info['lines_cleared'][n] == core.lines_last_step
+            assert info['score'][n] == core.score
+            if dones[n]:
+                finished += 1
+                core.reset()
+            else:
+                assert vector.levels[n] == core.level
+                assert vector.combo_counts[n] == core.combo_count
+            np.testing.assert_array_equal(vector.boards[n], rows_to_board(core.board.rows, width))
+    assert finished > 0
+
+
+def test_piece_sources_deal_like_tetris_core():
+    rng = random.Random(1)
+    sources = [PieceSource(TETROMINOES.keys(), seed=seed) for seed in range(NUM_GAMES)]
+    vector = VectorTetris(NUM_GAMES, 6, 12, pieces=sources)
+    cores = [TetrisCore(6, 12, pieces=PieceSource(TETROMINOES.keys(), seed=seed)) for seed in range(NUM_GAMES)]
+    playing = np.ones(NUM_GAMES, dtype=bool)
+    for _ in range(NUM_STEPS):
+        for n in np.flatnonzero(playing):
+            assert (vector.pieces[n], vector.next_pieces[n]) == (SHAPE_INDEX[cores[n].shape],
+                                                                 SHAPE_INDEX[cores[n].next_shape])
+        actions = choose_actions(cores, rng)
+        _, _, dones, _ = vector.step(actions)
+        for n in np.flatnonzero(playing):
+            cores[n].place(*divmod(actions[n], ACTION_ROTATIONS))
+            cores[n].hard_drop()
+            cores[n].lock()
+        playing &= ~dones
+    assert not playing.all()
+
+    with pytest.raises(ValueError):
+        VectorTetris(NUM_GAMES, 6, 12, pieces=sources[:1])
+
+
+def test_vector_tetris_rewards_match_tetris_wrapper():
+    pytest.importorskip('gym')
+    from tetris_env import TetrisWrapper
+
+    rng = random.Random(0)
+    envs = [TetrisWrapper() for _ in range(NUM_GAMES)]
+    observations = [env.reset(seed=seed)[0][0] for seed, env in enumerate(envs)]
+    vector = VectorTetris(NUM_GAMES, envs[0].field_width, envs[0].field_height, seed=0)
+    cores = [env.tetris.core for env in envs]
+    deal(vector, cores)
+    np.testing.assert_allclose(vector.observations(), observations)
+    for _ in range(NUM_STEPS):
+        deal(vector, cores)
+        actions = choose_actions(cores, rng)
+        vector_observations, vector_rewards, dones, _ = vector.step(actions)
+        for n, (env, action) in enumerate(zip(envs, actions)):
+            (observation, _, _), reward, done, _, _ = env.step(action)
+            assert bool(dones[n]) == done
+            assert vector_rewards[n] == pytest.approx(reward)
+            if done:
+                env.reset(seed=rng.randrange(1 << 30))
+            else:
+                # The next piece on the vector board is its own draw until the next deal()
+                vector_observations[n, -len(SHAPE_INDEX):] = observation[-len(SHAPE_INDEX):]
+                np.testing.assert_allclose(vector_observations[n], observation)
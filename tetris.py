@@ -1,69 +1,122 @@
 from tetris_settings import *
-import math
 from tetromino import Tetromino
 from block import Block
+from tetris_core import TetrisCore, POINTS_PER_LINES, SHAPES, LOCKED_CODE
+from afterstates import enumerate_placements
+from board_render import cell_codes
+from tetris_tables import ACTION_ROTATIONS
+from recording import MOVE_LEFT, MOVE_RIGHT, ROTATE, HARD_DROP, HOLD, GRAVITY, PLACE
 
 class Tetris:
+    """
+    Game screen on top of a headless `TetrisCore`.
 
-    def __init__(self, app):
-        self.full_lines = 0
-        self.lines_last_step = 0
+    With render=False ("no-render" mode) no sprites, surfaces or Vector2s are created:
+    every rule runs on the core's bitmask board, which is what headless training wants.
+
+    The board size and screen layout come from `config` (a BoardConfig), or from the
+    app's field_width/field_height when none is given. `pieces` is the game's
+    PieceSource; by default the core makes a uniform one. A recording.Recorder set as
+    `recorder` is told about every input, gravity step and placement, with `ticks`
+    (frames of update(), plus one per drop_piece()) as its clock.
+    """
+
+    def __init__(self, app, render=True, config=None, pieces=None):
         self.app = app
-        self.combo_count = 0
-        self.sprite_group = pg.sprite.Group()
-        self.grid_surface = pg.Surface(FIELD_RES)
-        self.grid_surface.set_colorkey((0, 0, 0))  # Make the surface transparent
-        self.draw_grid()
+        self.render = render
+        self.config = config or BoardConfig(*self.get_field_size())
+        self.core = TetrisCore(self.config.width, self.config.height, self.get_allowed_shapes(), pieces)
+        self.points_per_lines = POINTS_PER_LINES
+        self.speed_up = False
+        self.recorder = None
+        self.ticks = 0
+
+        if self.render:
+            self.sprite_group = pg.sprite.Group()
+            self.hold_sprite_group = pg.sprite.Group()
+            self.make_grid_surface()
+            self._field_array = self.get_field_array()
 
-        self.field_array = self.get_field_array()
         self.tetromino = Tetromino(self)
         self.next_tetromino = Tetromino(self, current=False)
-        self.speed_up = False
 
-        self.level = 0
-        self.score = 0
-        self.lines_to_next_level = 10
-        self.points_per_lines = {0: 0, 1: 100, 2: 300, 3: 500, 4: 800}
+    # === Game counters live in the core ===
+    @property
+    def score(self):
+        return self.core.score
+
+    @property
+    def level(self):
+        return self.core.level
+
+    @property
+    def lines_to_next_level(self):
+        return self.core.lines_to_next_level
+
+    @property
+    def full_lines(self):
+        return self.core.full_lines
 
-        self.can_hold = True
-        self.held_piece = None
-        self.hold_sprite_group = pg.sprite.Group()
+    @property
+    def lines_last_step(self):
+        return self.core.lines_last_step
+
+    @property
+    def combo_count(self):
+        return self.core.combo_count
+
+    @property
+    def held_piece(self):
+        return self.core.held_piece
+
+    @property
+    def can_hold(self):
+        return self.core.can_hold
+
+    @property
+    def features(self):
+        """BoardFeatures of the board; read them through `features.view`."""
+        return self.core.features
+
+    @property
+    def field_array(self):
+        """Locked cells: rows of Block sprites when rendering, rows of 0/1 otherwise."""
+        if self.render:
+            return self._field_array
+        return self.core.board.to_grid()
+
+    def get_field_size(self):
+        # Get the correct field dimensions from the app or use defaults
+        if hasattr(self.app, 'field_width') and hasattr(self.app, 'field_height'):
+            return self.app.field_width, self.app.field_height
+        return 10, 20
+
+    def get_allowed_shapes(self):
+        return getattr(self.app, 'allowed_shapes', list(TETROMINOES.keys()))
 
     def hold_piece(self):
-        if not self.can_hold:
+        first_hold = self.core.held_piece is None
+        if not self.core.hold_piece():
             return
 
-        # Save current shape
-        current_shape = self.tetromino.shape
-
-        # Remove current piece
         self.remove_current_tetromino()
-
-        if self.held_piece is None:
-            # First-time hold
-            self.held_piece = current_shape
+        if first_hold:
+            # The next piece comes into play and a new one is previewed
             self.tetromino = self.next_tetromino
             self.tetromino.current = True
+            self.tetromino.sync_blocks()
             self.next_tetromino = Tetromino(self, current=False)
         else:
-            # Create a new tetromino from the held piece with CORRECT positioning
-            new_tetromino = Tetromino(self, current=True, shape=self.held_piece)
-            
-            # Important fix: RESET the position offset when returning to gameplay
-            for block in new_tetromino.blocks:
-                block.pos = vec(block.pos.x, block.pos.y)  # Reset to proper game position
-                
-            # Check if any blocks are above the field and push them down if needed
-            min_y = min(block.pos.y for block in new_tetromino.blocks)
-            if min_y < 0:
-                for block in new_tetromino.blocks:
-                    block.pos.y += abs(min_y)
-                    
-            self.tetromino = new_tetromino
-            self.held_piece = current_shape
-
-        self.can_hold = False
+            self.tetromino = Tetromino(self)
 
+        if self.core.game_over:
+            self.app.game_state = GAME_STATES['GAME_OVER']
+
+        if self.render:
+            self.draw_held_piece()
+        self.record(HOLD)
+
+    def draw_held_piece(self):
         # === FULL CLEANUP OF PREVIOUS HELD BLOCKS ===
         for block in self.hold_sprite_group:
             block.kill()
@@ -78,189 +131,163 @@ class Tetris:
 
             # Position: use HOLD_POS_OFFSET with proper centering
             block.rect = block.image.get_rect()
-            offset_pos = (vec(pos) + HOLD_POS_OFFSET) * TILE_SIZE
+            offset_pos = (vec(pos) + self.config.hold_pos_offset) * TILE_SIZE
             block.rect.topleft = offset_pos
 
             self.hold_sprite_group.add(block)
-            
-    def create_tetromino_from_shape(self, shape):
-        """
-        Helper method to create a new tetromino from the given shape.
-        """
-        tetromino = Tetromino(self)
-        tetromino.shape = shape
-        tetromino.color = TETROMINO_COLORS[shape]
-        tetromino.blocks = [
-            Block(tetromino, pos, tetromino.color) for pos in TETROMINOES[shape]
-        ]
-        return tetromino
 
     def remove_current_tetromino(self):
         for block in self.tetromino.blocks:
             block.kill()  # Remove block from the sprite group
-            x, y = int(block.pos.x), int(block.pos.y)
-            if 0 <= y < FIELD_H:
-                self.field_array[y][x] = None  # Clear the field array slot
         self.tetromino.blocks.clear()
-        self.sprite_group.update()  # Ensure the sprite group is synchronized
 
     def spawn_next_tetromino(self):
         if self.app.game_state == GAME_STATES['GAME_OVER']:
             return  # Prevent spawning if the game is over
-    
+
+        # The core already spawned the piece; bring the preview into play
         self.tetromino = self.next_tetromino
         self.tetromino.current = True
-    
-        try:
-            self.next_tetromino = Tetromino(self, current=False)
-        except ValueError:
-            # Prevent crashing if the next tetromino cannot spawn
-            self.app.game_state = GAME_STATES['GAME_OVER']
-            return
-    
+        self.tetromino.sync_blocks()
+        self.next_tetromino = Tetromino(self, current=False)
+
         self.speed_up = False
-        self.can_hold = True
-    
-        # Fix positioning if any part is above the field
-        min_y = min(block.pos.y for block in self.tetromino.blocks)
-        if min_y < 0:
-            shift_down = abs(min_y)
-            for block in self.tetromino.blocks:
-                block.pos.y += shift_down
-
-    def spawn_held_tetromino(self):
-        self.tetromino = Tetromino(self)
-        self.tetromino.shape = self.held_piece
-        self.tetromino.blocks = [Block(self.tetromino, pos, self.tetromino.color)
-                                 for pos in TETROMINOES[self.held_piece]]
-
-    def get_score(self):
-        if self.full_lines > 0:
-            self.score += self.points_per_lines[self.full_lines] * (self.level + 1)
-            self.lines_to_next_level -= self.full_lines
-            
-            self.lines_last_step = self.full_lines  # Store cleared lines
-            self.full_lines = 0
-            
-            if self.lines_to_next_level <= 0:
-                self.level_up()
-        else:
-            self.lines_last_step = 0  # Reset when no lines cleared
 
     def check_full_lines(self):
-        # Get actual field dimensions
-        field_height = len(self.field_array) if self.field_array else 0
-        field_width = len(self.field_array[0]) if field_height > 0 else 0
-        
-        row = field_height - 1
-        for y in range(field_height - 1, -1, -1):
-            if sum(bool(cell) for cell in self.field_array[y]) < field_width:
-                self.field_array[row] = self.field_array[y].copy()
-                for block in self.field_array[row]:
-                    if block:
-                        block.pos.y = row  # Update block position to match array
-                row -= 1
-            else:
-                for block in self.field_array[y]:
-                    if block:
-                        block.alive = False
-                self.field_array[y] = [0] * field_width  # Use actual field width
-                self.full_lines += 1
-        while row >= 0:
-            self.field_array[row] = [0] * field_width  # Use actual field width
-            row -= 1
+        """Mirrors the rows the core just cleared onto the block sprites."""
+        cleared_rows = self.core.cleared_rows
+        if not self.render or not cleared_rows:
+            return  # Nothing moves when no line was cleared
+
+        # Only rows at or above the lowest cleared row shift
+        field = self._field_array
+        field_width = len(field[0])
+        lowest = cleared_rows[-1]
+        for y in cleared_rows:
+            for block in field[y]:
+                if block:
+                    block.alive = False
+                    block.in_field = False
+        kept = [field[y] for y in range(lowest + 1) if y not in cleared_rows]
+        field[:lowest + 1] = [[None] * field_width for _ in cleared_rows] + kept
+
+        for y in range(len(cleared_rows), lowest + 1):
+            for block in field[y]:
+                if block:
+                    block.pos.y = y  # Update block position to match array
 
     def put_tetromino_blocks_in_array(self):
-        if not hasattr(self, 'tetromino') or not hasattr(self.tetromino, 'blocks'):
-            print("Warning: Tetromino or blocks are not properly initialized")
+        if not self.render:
             return
-            
-        # Get the actual field dimensions from the field_array shape
-        field_height = len(self.field_array)
-        field_width = len(self.field_array[0]) if field_height > 0 else 0
-        
-        for block in self.tetromino.blocks:
-            if not hasattr(block, 'pos'):
-                print(f"Warning: Block has no position attribute")
-                continue
-                
-            try:
-                x, y = int(block.pos.x), int(block.pos.y)
-                # Use actual field dimensions instead of globals
-                if 0 <= x < field_width and 0 <= y < field_height:
-                    if not self.field_array[y][x]:
-                        self.field_array[y][x] = block
-                    # else: silently skip
-                else:
-                    print(f"Warning: Block at ({x}, {y}) is out of bounds and was skipped. Field size: {field_width}×{field_height}")
-            except (ValueError, TypeError) as e:
-                print(f"Error processing block position: {e}")
-                
+        field_height = len(self._field_array)
         for block in self.tetromino.blocks:
-            if not hasattr(block, 'pos'):
-                print(f"Warning: Block has no position attribute")
-                continue
-                
-            try:
-                x, y = int(block.pos.x), int(block.pos.y)
-                if 0 <= x < FIELD_W and 0 <= y < FIELD_H:
-                    if not self.field_array[y][x]:
-                        self.field_array[y][x] = block
-                    # else: silently skip
-                else:
-                    print(f"Warning: Block at ({x}, {y}) is out of bounds and was skipped.")
-            except (ValueError, TypeError) as e:
-                print(f"Error processing block position: {e}")
+            x, y = int(block.pos.x), int(block.pos.y)
+            if 0 <= y < field_height:
+                self._field_array[y][x] = block
+            else:
+                block.kill()  # Cells above the field are dropped by the core as well
 
     def get_field_array(self):
-        # Get the correct field dimensions from global settings or use app
-        if hasattr(self.app, 'field_width') and hasattr(self.app, 'field_height'):
-            width = self.app.field_width
-            height = self.app.field_height
-        else:
-            # Fallback to defaults
-            width, height = 10, 20
-        
-        return [[None for _ in range(width)] for _ in range(height)]
+        return [[None for _ in range(self.config.width)] for _ in range(self.config.height)]
 
     def check_tetromino_landing(self):
-        if self.tetromino.check_landing():
-            self.put_tetromino_blocks_in_array()
-            self.check_full_lines()
-            self.get_score()  # This should happen here
-            
-            if self.full_lines > 0:
-                self.combo_count += 1
-            else:
-                self.combo_count = 0
-            
-            if self.is_game_over():
-                self.app.game_state = GAME_STATES['GAME_OVER']
-                return
-            
-            self.spawn_next_tetromino()
+        if not self.core.check_landing():
+            return
+
+        level = self.core.level
+        self.put_tetromino_blocks_in_array()
+        self.core.lock()
+        self.check_full_lines()
+        if self.core.level != level:
+            self.level_up()
+
+        if self.is_game_over():
+            self.app.game_state = GAME_STATES['GAME_OVER']
+            return
+
+        self.spawn_next_tetromino()
+
+    def hard_drop(self):
+        """Drops the falling piece straight onto the stack and locks it."""
+        self.tetromino.hard_drop()
+        self.check_tetromino_landing()
+
+    def drop_piece(self, column, rotation):
+        """Turns and slides the falling piece to (column, rotation) and hard-drops it: one placement."""
+        self.tetromino.place(column, rotation)
+        self.hard_drop()
+        self.ticks += 1
+        self.record(PLACE, column * ACTION_ROTATIONS + rotation)
+
+    def record(self, event, argument=0):
+        if self.recorder is not None:
+            self.recorder.record(event, argument)
+
+    def enumerate_placements(self):
+        """
+        Every distinct (column, rotation) drop of the falling piece with the board it leaves.
+
+        Nothing in the game changes; see afterstates.enumerate_placements_batch.
+        """
+        return enumerate_placements(self.core)
+
+    def snapshot(self, rng=True):
+        """The whole game as an immutable GameSnapshot; see TetrisCore.snapshot."""
+        return self.core.snapshot(rng)
+
+    def restore(self, snapshot):
+        """
+        Puts the game back to `snapshot`.
+
+        Headless games only restore the core. When rendering, the sprites are rebuilt
+        from the board in the colors of the pieces the cells came from. A game being
+        recorded cannot be restored: its recording would no longer replay, so end the
+        recording first (Recorder.end()).
+        """
+        if self.recorder is not None:
+            raise RuntimeError('Cannot restore a game that is being recorded; end the recording first')
+        self.core.restore(snapshot)
+        self.speed_up = False
+        if self.render:
+            self.sprite_group.empty()
+            self.hold_sprite_group.empty()
+            self._field_array = self.get_field_array()
+        self.tetromino = Tetromino(self)
+        self.next_tetromino = Tetromino(self, current=False)
+        if self.render:
+            self.rebuild_field_blocks()
+            if self.held_piece is not None:
+                self.draw_held_piece()
+        if hasattr(self.app, 'game_state'):
+            self.app.game_state = GAME_STATES['GAME_OVER' if self.core.game_over else 'PLAYING']
+
+    def rebuild_field_blocks(self):
+        board = self.core.board
+        for y, row in enumerate(cell_codes(board.shape_rows, board.width).tolist()):
+            for x, code in enumerate(row):
+                if code:
+                    color = 'gray' if code == LOCKED_CODE else TETROMINO_COLORS[SHAPES[code - 1]]
+                    block = Block(self.tetromino, (0, 0), color)
+                    block.pos.update(x, y)
+                    self._field_array[y][x] = block
 
     def control(self, pressed_key):
         if pressed_key == pg.K_LEFT:
             self.tetromino.move(direction='left')
+            self.record(MOVE_LEFT)
         elif pressed_key == pg.K_RIGHT:
             self.tetromino.move(direction='right')
+            self.record(MOVE_RIGHT)
         elif pressed_key == pg.K_DOWN:
             self.speed_up = True
         elif pressed_key == pg.K_UP:
             self.tetromino.rotate()
+            self.record(ROTATE)
+        elif pressed_key == pg.K_SPACE:
+            self.hard_drop()
+            self.record(HARD_DROP)
         elif pressed_key == pg.K_c:
             self.hold_piece()
-            if self.held_piece:
-                held_tetromino = Tetromino(self, current=False)
-                held_tetromino.shape = self.held_piece
-                held_tetromino.color = TETROMINO_COLORS[self.held_piece]
-                for block in held_tetromino.blocks:
-                    block.pos = block.pos - INIT_POS_OFFSET + HOLD_POS_OFFSET
-                    block.image = pg.Surface([TILE_SIZE, TILE_SIZE])
-                    pg.draw.rect(block.image, held_tetromino.color, 
-                                (1, 1, TILE_SIZE - 2, TILE_SIZE - 2), border_radius=8)
-                    self.hold_sprite_group.add(block)
 
     def release_control(self, released_key):
         if released_key == pg.K_DOWN:
@@ -272,133 +299,92 @@ class Tetris:
         self.hold_sprite_group.draw(self.app.screen)
 
         # Frame around the "Next" display
+        next_box_pos, hold_box_pos = self.config.next_box_pos, self.config.hold_box_pos
         next_box_rect = pg.Rect(
-            TILE_SIZE * (NEXT_BOX_POS.x -1.5),  # Adjust X position
-            TILE_SIZE * (NEXT_BOX_POS.y - 3),  # Adjust Y position
+            TILE_SIZE * (next_box_pos.x -1.5),  # Adjust X position
+            TILE_SIZE * (next_box_pos.y - 3),  # Adjust Y position
             TILE_SIZE * 5,  # Reduce width from 6 to 5
             TILE_SIZE * 5   # Height of the box
         )
         pg.draw.rect(self.app.screen, 'white', next_box_rect, 2)
 
         hold_box_rect = pg.Rect(
-            TILE_SIZE * (HOLD_BOX_POS.x - 2),
-            TILE_SIZE * (HOLD_BOX_POS.y - 3),
+            TILE_SIZE * (hold_box_pos.x - 2),
+            TILE_SIZE * (hold_box_pos.y - 3),
             TILE_SIZE * 5,  # Reduce width from 6 to 5
             TILE_SIZE * 5
         )
         pg.draw.rect(self.app.screen, 'white', hold_box_rect, 2)
-    
+
     def update(self):
+        self.ticks += 1
         trigger = [self.app.anim_trigger, self.app.fast_anim_trigger][self.speed_up]
         if trigger:
             self.tetromino.update()
             self.check_tetromino_landing()
-        self.sprite_group.update()
-    
+            self.record(GRAVITY)
+        if self.render:
+            self.sprite_group.update()
+
+    def make_grid_surface(self):
+        self.grid_surface = pg.Surface(self.config.res)
+        self.grid_surface.set_colorkey((0, 0, 0))  # Make the surface transparent
+        self.draw_grid()
+
     def draw_grid(self):
+        width, height = self.config.size
         self.grid_surface.fill((0, 0, 0))  # Clear previous grid
-        for x in range(FIELD_W):
-            for y in range(FIELD_H):
+        for x in range(width):
+            for y in range(height):
                 rect = (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
                 pg.draw.rect(self.grid_surface, (96, 96, 96), rect, 1)  # Draw cell borders
 
         # Add vertical lines
-        for x in range(FIELD_W + 1):  # Include one more line for the right edge
+        for x in range(width + 1):  # Include one more line for the right edge
             start_pos = (x * TILE_SIZE, 0)
-            end_pos = (x * TILE_SIZE, FIELD_H * TILE_SIZE)
+            end_pos = (x * TILE_SIZE, height * TILE_SIZE)
             pg.draw.line(self.grid_surface, (96, 96, 96), start_pos, end_pos, 1)
 
-    def reset_game(self):
-        # Clear all sprite groups first
-        self.sprite_group.empty()
-        self.hold_sprite_group.empty()
-        
-        # Kill all existing tetromino blocks
-        if self.tetromino and hasattr(self.tetromino, 'blocks'):
-            for block in self.tetromino.blocks:
-                block.kill()
-        
-        if self.next_tetromino and hasattr(self.next_tetromino, 'blocks'):
-            for block in self.next_tetromino.blocks:
-                block.kill()
-        
-        # Get actual field dimensions
-        field_height = len(self.field_array) if self.field_array else 0
-        field_width = len(self.field_array[0]) if field_height > 0 else 0
-        
-        # Clear field array - properly handle block objects
-        if field_height > 0 and field_width > 0:
-            for y in range(field_height):
-                for x in range(field_width):
-                    if self.field_array[y][x] and hasattr(self.field_array[y][x], 'kill'):
-                        self.field_array[y][x].kill()
-            
-            # Clear all cells           
-            for y in range(field_height):
-                for x in range(field_width):
-                    self.field_array[y][x] = None  # Use None instead of a block object
-        
-        # Create fresh field array
-        self.field_array = self.get_field_array()
-        
+    def reset_game(self, config=None):
+        # Rebuild the core when given a new board size, otherwise just clear it
+        resized = config is not None and config != self.config
+        if config is not None:
+            self.config = config
+        if resized:
+            self.core = TetrisCore(self.config.width, self.config.height, self.get_allowed_shapes(),
+                                   self.core.pieces)
+        else:
+            self.core.allowed_shapes = list(self.get_allowed_shapes())
+            self.core.reset()
+        self.speed_up = False
+
+        if self.render:
+            # Clear all sprite groups and the sprite field
+            self.sprite_group.empty()
+            self.hold_sprite_group.empty()
+            self._field_array = self.get_field_array()
+            if resized:
+                self.make_grid_surface()
+            else:
+                self.draw_grid()
+
         # Reset tetromino objects with fresh instances
         self.tetromino = Tetromino(self)
         self.next_tetromino = Tetromino(self, current=False)
-        
-        # Reset game state variables
-        self.full_lines = 0
-        self.lines_last_step = 0
-        self.combo_count = 0
-        self.speed_up = False
-        
-        # Reset scoring
-        self.level = 0
-        self.score = 0
-        self.lines_to_next_level = 10
-        
-        # Reset hold functionality
-        if self.held_piece and hasattr(self.held_piece, 'blocks'):
-            for block in self.held_piece.blocks:
-                block.kill()
-        self.can_hold = True
-        self.held_piece = None
-        
-        # Redraw grid
-        self.draw_grid()
-        
-        # Debug verification (optional)
-        field_height = len(self.field_array) if self.field_array else 0
-        field_width = len(self.field_array[0]) if field_height > 0 else 0
 
     def is_game_over(self):
-        # Get actual field dimensions
-        field_height = len(self.field_array) if self.field_array else 0
-        field_width = len(self.field_array[0]) if field_height > 0 else 0
-        
-        # Check the top 2 rows for blocks (need to ensure we don't exceed actual height)
-        max_rows_to_check = min(2, field_height)
-        
-        for y in range(max_rows_to_check):  # Checks the first N rows
-            for x in range(field_width):
-                if self.field_array[y][x]:
-                    # Set the game state explicitly
-                    if hasattr(self, 'app') and hasattr(self.app, 'game_state'):
-                        self.app.game_state = GAME_STATES['GAME_OVER']
-                    return True  # Game over if any block exists in the top rows
-        
-        # Ensure the game state is set to PLAYING
+        game_over = self.core.is_game_over()
         if hasattr(self, 'app') and hasattr(self.app, 'game_state'):
-            self.app.game_state = GAME_STATES['PLAYING']
-        return False
-        
+            self.app.game_state = GAME_STATES['GAME_OVER' if game_over else 'PLAYING']
+        return game_over
+
     def level_up(self):
-        self.level += 1
-        self.lines_to_next_level += 10
+        """Speeds up the drop timer after the core reached a new level."""
         new_interval = max(50, ANIM_TIME_INTERVAL - self.level * 20)
-        
+
         # Check if the app has the user_event attribute before using it
         if hasattr(self.app, 'user_event'):
             pg.time.set_timer(self.app.user_event, new_interval)
         else:
             # For MockApp, we can just skip the timer update since it's not needed for training
-            pass
\ No newline at end of file
+            pass
@@ -0,0 +1,626 @@
+"""
+Headless Tetris rules on integer bitmasks.
+
+Every board row is a single int whose bit x is set when column x is filled,
+with a second int per row holding the 4-bit shape code of each cell for drawing,
+and every piece rotation is a few precomputed row masks (see tetris_tables),
+so collision, landing and line checks are shifts and ANDs instead of Block
+sprites and Vector2 math. `Tetris` always runs on top of a `TetrisCore` and only builds
+sprites when it renders.
+"""
+from collections import namedtuple
+from tetris_rules import TETROMINOES
+from tetris_tables import (PIECE_ROTATIONS, PIECE_MASKS, PIECE_COLUMNS, ACTION_COLUMNS, ACTION_ROTATIONS,
+                           NUM_ACTIONS, get_placement_table, get_zobrist_table)
+from tetris_features import BoardFeatures
+from piece_source import PieceSource
+
+# === Scoring Rules ===
+POINTS_PER_LINES = {0: 0, 1: 100, 2: 300, 3: 500, 4: 800}
+LINES_PER_LEVEL = 10
+GAME_OVER_ROWS = 2  # A locked block in the top rows ends the game
+
+# === Shape Order (matches the one-hot layout of the RL observation) ===
+SHAPES = ('I', 'O', 'T', 'L', 'J', 'S', 'Z')
+SHAPE_INDEX = {shape: i for i, shape in enumerate(SHAPES)}
+
+# === Cell Codes of Board.shape_rows ===
+EMPTY_CODE = 0
+SHAPE_CODES = {shape: i + 1 for i, shape in enumerate(SHAPES)}
+LOCKED_CODE = len(SHAPES) + 1   # A filled cell whose piece is unknown (restored from bare rows)
+CODE_BITS = 4
+
+# Cells in a piece row mask (piece rows are at most 4 columns wide)
+MASK_CELLS = [bin(mask).count('1') for mask in range(16)]
+# A piece row mask with every bit widened to a CODE_BITS field holding 1
+MASK_CODES = [sum(1 << CODE_BITS * x for x in range(4) if mask >> x & 1) for mask in range(16)]
+
+# Everything needed to put a TetrisCore back where it was (see TetrisCore.snapshot)
+GameSnapshot = namedtuple('GameSnapshot', [
+    'rows',                 # Board rows as bitmasks, top to bottom
+    'shape', 'rotation', 'x', 'y',
+    'next_shape', 'held_piece', 'can_hold',
+    'score', 'level', 'lines_to_next_level', 'full_lines', 'lines_last_step', 'combo_count',
+    'lines_cleared', 'eroded_cells',    # Feature values of the last locked piece
+    'game_over',
+    'rng_state',            # PieceSource.get_state() of the piece generator, or None
+    'shape_rows',           # Board.shape_rows, top to bottom
+])
+
+# === Movement Directions as integer (dx, dy) steps ===
+MOVES = {
+    'left': (-1, 0),
+    'right': (1, 0),
+    'down': (0, 1)
+}
+
+
+class Board:
+    """
+    Locked cells of one field, one int bitmask per row (row 0 is the top).
+
+    `heights[x]` is the height of column x's surface (0 when empty) and
+    `row_fill[y]` the number of filled cells in row y. Both are kept up to date as
+    pieces are placed and lines cleared, so drops and line checks never scan the field.
+    `hash` is the Zobrist hash of the locked cells, updated the same way.
+    `shape_rows[y]` packs the code of every cell of row y, CODE_BITS bits per column
+    (EMPTY_CODE, SHAPE_CODES of the piece it came from, or LOCKED_CODE); only
+    drawing reads it.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.full_mask = (1 << width) - 1
+        self.zobrist = get_zobrist_table(width, height)
+        self.reset()
+
+    def reset(self):
+        self.rows = [0] * self.height
+        self.shape_rows = [0] * self.height
+        self.row_fill = [0] * self.height
+        self.heights = [0] * self.width
+        self.hash = 0
+        self._grid = None
+
+    def row_hash(self, y, mask):
+        """XOR of the Zobrist keys of the cells of `mask` in row y."""
+        value = 0
+        for lookup in self.zobrist[y]:
+            value ^= lookup[mask & 255]
+            mask >>= 8
+        return value
+
+    def collides(self, shape, rotation, x, y):
+        """True if the piece with its pivot at (x, y) overlaps a wall, the floor or a locked cell."""
+        left, right, _, rows = PIECE_MASKS[shape][rotation]
+        x0 = x + left
+        if x0 < 0 or x + right >= self.width:
+            return True
+        board_rows = self.rows
+        for dy, mask in rows:
+            row = y + dy
+            if row >= self.height:
+                return True
+            if row >= 0 and board_rows[row] & (mask << x0):
+                return True
+        return False
+
+    def sweep_collides(self, shape, rotation, x_from, x_to, y):
+        """True if sliding the piece sideways from x_from to x_to at height y hits anything."""
+        left, right, _, rows = PIECE_MASKS[shape][rotation]
+        low, high = min(x_from, x_to), max(x_from, x_to)
+        if low + left < 0 or high + right >= self.width:
+            return True
+        for dy, mask in rows:
+            row = y + dy
+            if row >= self.height:
+                return True
+            if row >= 0:
+                # Tetromino rows are contiguous, so the swept cells are one run of bits
+                first = (mask & -mask).bit_length() - 1
+                swept = (1 << (mask.bit_length() + high - low)) - (1 << first)
+                if self.rows[row] & (swept << (low + left)):
+                    return True
+        return False
+
+    def place(self, shape, rotation, x, y):
+        """
+        Writes the piece into the rows; cells above the field are dropped.
+
+        Returns the rows the piece landed in, the only ones that can have become full.
+        """
+        left, _, _, rows = PIECE_MASKS[shape][rotation]
+        x0 = x + left
+        code = SHAPE_CODES[shape]
+        placed_rows = []
+        for dy, mask in rows:
+            row = y + dy
+            if 0 <= row < self.height:
+                self.rows[row] |= mask << x0
+                self.shape_rows[row] |= MASK_CODES[mask] * code << CODE_BITS * x0
+                self.row_fill[row] += MASK_CELLS[mask]
+                self.hash ^= self.row_hash(row, mask << x0)
+                placed_rows.append(row)
+
+        heights = self.heights
+        for dx, top, bottom in PIECE_COLUMNS[shape][rotation]:
+            if y + bottom >= 0:
+                height = self.height - max(0, y + top)
+                if height > heights[x + dx]:
+                    heights[x + dx] = height
+        self._grid = None
+        return placed_rows
+
+    def landing_y(self, shape, rotation, x, y):
+        """
+        Pivot row where the piece comes to rest if dropped straight down from (x, y).
+
+        Read off the column heights, so the cost does not depend on the drop distance.
+        Returns None when the piece is already below the surface of a column it
+        covers (tucked under an overhang); only a step-by-step drop is exact there.
+        """
+        heights = self.heights
+        landing = self.height
+        for dx, _, bottom in PIECE_COLUMNS[shape][rotation]:
+            surface = self.height - heights[x + dx]  # First filled row of the column
+            if y + bottom >= surface:
+                return None
+            if surface - 1 - bottom < landing:
+                landing = surface - 1 - bottom
+        return landing
+
+    def check_full_lines(self, rows=None):
+        """
+        Removes full rows, shifting everything above them down.
+
+        Only `rows` (by default every row) are checked, and only rows at or above
+        the lowest cleared one move; when nothing is full nothing is touched.
+
+        Returns:
+            list: Indices of the cleared rows, top to bottom.
+        """
+        width = self.width
+        candidates = range(self.height) if rows is None else sorted(rows)
+        cleared = [y for y in candidates if self.row_fill[y] == width]
+        if not cleared:
+            return cleared
+
+        lowest = cleared[-1]
+        count = len(cleared)
+        kept = [y for y in range(lowest + 1) if y not in cleared]
+        rows = self.rows
+        for y in range(lowest + 1):
+            if rows[y]:
+                self.hash ^= self.row_hash(y, rows[y])
+        rows[:lowest + 1] = [0] * count + [rows[y] for y in kept]
+        for y in range(count, lowest + 1):
+            if rows[y]:
+                self.hash ^= self.row_hash(y, rows[y])
+        self.row_fill[:lowest + 1] = [0] * count + [self.row_fill[y] for y in kept]
+        self.shape_rows[:lowest + 1] = [0] * count + [self.shape_rows[y] for y in kept]
+        self.update_heights(cleared)
+        self._grid = None
+        return cleared
+
+    def update_heights(self, cleared):
+        """
+        Lowers the column heights after `cleared` rows were removed.
+
+        A full row covers every column, so a surface cell that survived just drops by
+        the number of cleared rows; only columns whose surface cell was cleared are rescanned.
+        """
+        count = len(cleared)
+        for x in range(self.width):
+            height = self.heights[x]
+            if self.height - height not in cleared:
+                self.heights[x] = height - count
+                continue
+            bit = 1 << x
+            height = 0
+            for y in range(count, self.height):
+                if self.rows[y] & bit:
+                    height = self.height - y
+                    break
+            self.heights[x] = height
+
+    def is_game_over(self):
+        return any(self.rows[:GAME_OVER_ROWS])
+
+    def restore(self, rows, shape_rows=None):
+        """
+        Sets the rows and rebuilds the fill counters, column heights and hash from them.
+        Without `shape_rows` every filled cell gets LOCKED_CODE.
+        """
+        self.rows = list(rows)
+        if shape_rows is None:
+            shape_rows = [self.row_codes(row, LOCKED_CODE) for row in self.rows]
+        self.shape_rows = list(shape_rows)
+        self.row_fill = [bin(row).count('1') for row in self.rows]
+        self.hash = 0
+        for y, row in enumerate(self.rows):
+            if row:
+                self.hash ^= self.row_hash(y, row)
+        heights = [0] * self.width
+        seen = 0
+        for y, row in enumerate(self.rows):
+            new = row & ~seen
+            while new:
+                bit = new & -new
+                heights[bit.bit_length() - 1] = self.height - y
+                new ^= bit
+            seen |= row
+            if seen == self.full_mask:
+                break
+        self.heights = heights
+        self._grid = None
+
+    @staticmethod
+    def row_codes(row, code):
+        """shape_rows value of a row bitmask whose cells all hold `code`."""
+        value, x = 0, 0
+        while row:
+            if row & 1:
+                value |= code << CODE_BITS * x
+            row >>= 1
+            x += 1
+        return value
+
+    def to_grid(self):
+        """Rows of 0/1 cells, rebuilt only after the board changes."""
+        if self._grid is None:
+            columns = range(self.width)
+            self._grid = [[(row >> x) & 1 for x in columns] for row in self.rows]
+        return self._grid
+
+
+class TetrisCore:
+    """
+    One game of Tetris without any pygame objects.
+
+    Holds the board and its BoardFeatures, the falling piece as (shape, rotation, x, y)
+    with (x, y) the pivot cell, the next and held shapes, and the score/level counters.
+    Pieces come from the game's own PieceSource (`pieces`, uniform and seeded from the
+    global `random` module unless one is given). While `shape_log` is a list, every
+    shape drawn is appended to it (see recording.Recorder).
+    """
+
+    def __init__(self, width=10, height=20, allowed_shapes=None, pieces=None):
+        self.board = Board(width, height)
+        self.features = BoardFeatures(self.board)
+        self.pieces = pieces or PieceSource(allowed_shapes or TETROMINOES.keys())
+        self.shape_log = None
+        if allowed_shapes:
+            self.allowed_shapes = allowed_shapes
+        self.reset()
+
+    @property
+    def allowed_shapes(self):
+        return self.pieces.shapes
+
+    @allowed_shapes.setter
+    def allowed_shapes(self, shapes):
+        self.pieces.set_shapes(shapes)
+
+    def reset(self):
+        self.board.reset()
+        self.features.reset()
+        self.full_lines = 0
+        self.lines_last_step = 0
+        self.cleared_rows = []
+        self.combo_count = 0
+        self.level = 0
+        self.score = 0
+        self.lines_to_next_level = LINES_PER_LEVEL
+        self.held_piece = None
+        self.can_hold = True
+        self.game_over = False
+
+        self.shape = self.new_shape()
+        self.next_shape = self.new_shape()
+        self.spawn(self.shape)
+
+    def snapshot(self, rng=True):
+        """
+        The whole game as an immutable GameSnapshot.
+
+        Only the packed rows, the piece, the counters and the piece generator's state
+        are kept; row fills, heights and features are rebuilt by restore().
+
+        Args:
+            rng (bool): Keep the piece generator's state too, so the restored game
+                draws the same pieces. Searches that never draw pieces after
+                restoring can leave it out.
+        """
+        return GameSnapshot(
+            tuple(self.board.rows), self.shape, self.rotation, self.x, self.y,
+            self.next_shape, self.held_piece, self.can_hold,
+            self.score, self.level, self.lines_to_next_level, self.full_lines, self.lines_last_step,
+            self.combo_count, self.features.lines_cleared, self.features.eroded_cells, self.game_over,
+            self.pieces.get_state() if rng else None,
+            tuple(self.board.shape_rows),
+        )
+
+    def restore(self, snapshot):
+        """Puts the game back to `snapshot`, including the piece generator if it was kept."""
+        self.board.restore(snapshot.rows, snapshot.shape_rows)
+        (self.shape, self.rotation, self.x, self.y,
+         self.next_shape, self.held_piece, self.can_hold,
+         self.score, self.level, self.lines_to_next_level, self.full_lines, self.lines_last_step,
+         self.combo_count) = snapshot[1:14]
+        self.game_over = snapshot.game_over
+        self.cleared_rows = []
+        self.features.reset()
+        self.features.lines_cleared = snapshot.lines_cleared
+        self.features.eroded_cells = snapshot.eroded_cells
+        if snapshot.rng_state is not None:
+            self.pieces.set_state(snapshot.rng_state)
+
+    def new_shape(self):
+        shape = self.pieces.next()
+        if self.shape_log is not None:
+            self.shape_log.append(shape)
+        return shape
+
+    def spawn(self, shape):
+        """Puts a fresh piece at the top center. Returns False if it does not fit."""
+        left, right, top, _ = PIECE_MASKS[shape][0]
+        x = self.board.width // 2 - 1
+        self.shape = shape
+        self.rotation = 0
+        self.x = max(-left, min(self.board.width - 1 - right, x))
+        self.y = -top
+        if self.board.collides(shape, 0, self.x, self.y):
+            self.game_over = True
+            return False
+        return True
+
+    def spawn_next_tetromino(self):
+        shape = self.next_shape
+        self.next_shape = self.new_shape()
+        self.can_hold = True
+        return self.spawn(shape)
+
+    def hold_piece(self):
+        """Swaps the falling piece with the held one. Returns False if holding is not allowed."""
+        if not self.can_hold:
+            return False
+        current_shape = self.shape
+        if self.held_piece is None:
+            shape = self.next_shape
+            self.next_shape = self.new_shape()
+        else:
+            shape = self.held_piece
+        self.held_piece = current_shape
+        self.can_hold = False
+        self.spawn(shape)
+        return True
+
+    def cells(self):
+        """(x, y) of each block of the falling piece, in TETROMINOES order."""
+        x, y = self.x, self.y
+        return [(x + dx, y + dy) for dx, dy in PIECE_ROTATIONS[self.shape][self.rotation]]
+
+    def rotate(self):
+        rotation = (self.rotation + 1) % 4
+        if self.board.collides(self.shape, rotation, self.x, self.y):
+            return False
+        self.rotation = rotation
+        return True
+
+    def move(self, direction):
+        dx, dy = MOVES[direction]
+        if self.board.collides(self.shape, self.rotation, self.x + dx, self.y + dy):
+            return False
+        self.x += dx
+        self.y += dy
+        return True
+
+    def place(self, column, rotation):
+        """
+        Turns the falling piece to `rotation` and slides its leftmost cell to `column`.
+
+        Duplicate rotations of symmetric shapes resolve to the same state and columns
+        are clamped to the walls; see placement_target.
+        """
+        self.rotation, self.x = self.placement_target(column, rotation)
+
+    def placement_target(self, column, rotation):
+        """
+        (rotation, x) the falling piece ends up at for place(column, rotation), without moving it.
+
+        Both come from the placement table, so this is one lookup plus a sweep check
+        instead of a rotate() and move() per step. If anything is in the way the piece
+        goes step by step and stops where the keyboard would have stopped it.
+        """
+        board, shape, y = self.board, self.shape, self.y
+        table = get_placement_table(shape, board.width)
+        state = table.by_rotation[rotation % 4]
+        target_x = table.pivot_x(column, rotation)
+
+        turns = (state.rotation - self.rotation) % 4
+        path_clear = not board.sweep_collides(shape, state.rotation, self.x, target_x, y)
+        for turn in range(1, turns):
+            if board.collides(shape, (self.rotation + turn) % 4, self.x, y):
+                path_clear = False
+        if path_clear:
+            return state.rotation, target_x
+
+        current, x = self.rotation, self.x
+        for _ in range(turns):
+            if not board.collides(shape, (current + 1) % 4, x, y):
+                current = (current + 1) % 4
+        if current != state.rotation:
+            # A blocked turn left the piece in another state; aim with that state's extents
+            left, right, _, _ = PIECE_MASKS[shape][current]
+            target_x = max(0, min(board.width - 1 - (right - left), column)) - left
+        step = 1 if target_x > x else -1
+        while x != target_x and not board.collides(shape, current, x + step, y):
+            x += step
+        return current, x
+
+    def check_landing(self):
+        return self.board.collides(self.shape, self.rotation, self.x, self.y + 1)
+
+    def drop_row(self, rotation, x, y):
+        """Pivot row where the falling piece would come to rest dropped from (x, y) in `rotation`."""
+        landing = self.board.landing_y(self.shape, rotation, x, y)
+        if landing is None:
+            landing = y
+            while not self.board.collides(self.shape, rotation, x, landing + 1):
+                landing += 1
+        return landing
+
+    def path_clear(self, rotation):
+        """
+        True when nothing can block turning the falling piece to `rotation` and sliding
+        it sideways: no locked cell at or above its lowest possible row and no wall in
+        the way of the turns.
+        """
+        shape, x, width = self.shape, self.x, self.board.width
+        if any(self.board.rows[:max(0, self.y + 3)]):
+            return False
+        for turn in range(1, (rotation - self.rotation) % 4 + 1):
+            left, right, _, _ = PIECE_MASKS[shape][(self.rotation + turn) % 4]
+            if x + left < 0 or x + right >= width:
+                return False
+        return True
+
+    def resolve_placements(self):
+        """
+        Where the falling piece ends up for each distinct placement-table entry.
+
+        Resolved like place() followed by hard_drop(), without moving the piece.
+
+        Returns:
+            list: (column, rotation, cells) per legal (column, rotation) of the table,
+            with cells the sorted (x, y) the piece would lock into.
+        """
+        shape, board = self.shape, self.board
+        placements = []
+        for state in get_placement_table(shape, board.width).states:
+            path_clear = self.path_clear(state.rotation)
+            for column in range(state.min_column, state.max_column + 1):
+                if path_clear:
+                    rotation, x = state.rotation, column - state.left
+                    y = board.landing_y(shape, rotation, x, self.y)
+                else:
+                    rotation, x = self.placement_target(column, state.rotation)
+                    y = self.drop_row(rotation, x, self.y)
+                cells = tuple(sorted((x + dx, y + dy) for dx, dy in PIECE_ROTATIONS[shape][rotation]))
+                placements.append((column, state.rotation, cells))
+        return placements
+
+    def distinct_placements(self):
+        """
+        resolve_placements() without entries whose piece lands on the same cells as an
+        earlier one, which only happens when the stack or a wall blocks the path.
+        """
+        seen = set()
+        placements = []
+        for placement in self.resolve_placements():
+            if placement[2] not in seen:
+                seen.add(placement[2])
+                placements.append(placement)
+        return placements
+
+    def action_mask(self):
+        """
+        Legal TetrisWrapper actions for the falling piece on the current stack.
+
+        An action is legal when it is the canonical action of its placement (see
+        PlacementTable) and its drop does not land where an earlier one does.
+
+        Returns:
+            list: NUM_ACTIONS bools.
+        """
+        mask = [False] * NUM_ACTIONS
+        for column, rotation, _ in self.distinct_placements():
+            if column < ACTION_COLUMNS:
+                mask[column * ACTION_ROTATIONS + rotation] = True
+        return mask
+
+    def canonical_actions(self):
+        """
+        For every TetrisWrapper action the legal action that drops the piece on the same cells.
+
+        Returns:
+            list: NUM_ACTIONS action indices.
+        """
+        first = {}
+        representative = {}
+        for column, rotation, cells in self.resolve_placements():
+            action = column * ACTION_ROTATIONS + rotation
+            representative[action] = first.setdefault(cells, action)
+
+        table = get_placement_table(self.shape, self.board.width)
+        clear = [self.path_clear(rotation) for rotation in range(4)]
+        actions = []
+        for action in range(NUM_ACTIONS):
+            column, rotation = divmod(action, ACTION_ROTATIONS)
+            canonical = table.canonical_actions[action]
+            if clear[canonical % ACTION_ROTATIONS]:
+                actions.append(representative[canonical])
+                continue
+            # A blocked turn re-aims with the requested column, so resolve the action itself
+            final_rotation, x = self.placement_target(column, rotation)
+            y = self.drop_row(final_rotation, x, self.y)
+            cells = tuple(sorted((x + dx, y + dy) for dx, dy in PIECE_ROTATIONS[self.shape][final_rotation]))
+            actions.append(first[cells])
+        return actions
+
+    def hard_drop(self):
+        """Drops the falling piece onto the stack. Returns the number of rows it fell."""
+        y = self.drop_row(self.rotation, self.x, self.y)
+        distance = y - self.y
+        self.y = y
+        return distance
+
+    def check_tetromino_landing(self):
+        """Locks the piece if it rests on something. Returns True when it was locked."""
+        if not self.check_landing():
+            return False
+        self.lock()
+        return True
+
+    def lock(self):
+        """Locks the falling piece, clears lines, scores and spawns the next piece."""
+        placed_rows = self.board.place(self.shape, self.rotation, self.x, self.y)
+        self.check_full_lines(placed_rows)
+        self.features.on_lock(self.shape, self.rotation, self.x, self.y, placed_rows, self.cleared_rows)
+        self.get_score()
+
+        if self.lines_last_step > 0:
+            self.combo_count += 1
+        else:
+            self.combo_count = 0
+
+        if self.is_game_over():
+            self.game_over = True
+            return
+        self.spawn_next_tetromino()
+
+    def check_full_lines(self, rows=None):
+        self.cleared_rows = self.board.check_full_lines(rows)
+        self.full_lines += len(self.cleared_rows)
+        return self.cleared_rows
+
+    def get_score(self):
+        if self.full_lines > 0:
+            self.score += POINTS_PER_LINES[self.full_lines] * (self.level + 1)
+            self.lines_to_next_level -= self.full_lines
+
+            self.lines_last_step = self.full_lines
+            self.full_lines = 0
+
+            if self.lines_to_next_level <= 0:
+                self.level_up()
+        else:
+            self.lines_last_step = 0
+
+    def level_up(self):
+        self.level += 1
+        self.lines_to_next_level += LINES_PER_LEVEL
+
+    def is_game_over(self):
+        return self.game_over or self.board.is_game_over()
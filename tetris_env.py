@@ -0,0 +1,391 @@
+"""
+Gym environment around the Tetris game.
+
+TetrisWrapper turns each step into one (column, rotation) placement followed by
+a hard drop and returns the 50-feature observation (for a 10-wide board) with
+one-hot current and next pieces. It lives in a module, rather than only in the
+training notebook, so worker processes can import it.
+
+Observation contract, for a board W columns wide: a float32 vector of
+observation_size(W) = 3W + 6 + 14 values, laid out as observation_layout(W)
+describes:
+    heights (W), max_height, holes, bumpiness, wells (W), height_diffs (W - 1),
+    row_transitions, column_transitions, cumulative_wells, eroded_cells,
+    current_piece (7, one-hot in SHAPES order), next_piece (7, one-hot).
+By default reset()/step() return it as a new array inside an (observation, {}, {})
+tuple. After attach_observation_buffer() they write it in place into one
+preallocated array (a row of a batch array from observation_batch(), for example)
+and return that array itself, so no step allocates or copies an observation.
+
+With observation_mode='board' the observation is instead the (5, H, W) tensor of
+board_tensor.board_tensor: locked cells, current piece, its ghost (landing cells),
+next piece and held piece planes, uint8 by default or float32.
+"""
+import numpy as np
+import gym
+import pygame as pg
+from tetris_settings import *
+from tetris import Tetris
+from app import App
+from tetris_features import DELLACHERIE_W, LINE_REWARDS
+from tetris_tables import ACTION_COLUMNS, ACTION_ROTATIONS
+from replay_storage import compact_state
+from piece_source import PieceSource
+from tetris_core import SHAPES, SHAPE_INDEX
+from afterstates import feature_size
+from board_tensor import BOARD_DTYPES, board_tensor, board_tensor_shape
+from board_render import board_codes, render_codes
+
+OBSERVATION_DTYPE = np.float32
+OBSERVATION_MODES = ('features', 'board')
+
+# One-hot piece codes; a missing piece is all zeros
+PIECE_ONE_HOT = {shape: tuple(float(i == SHAPE_INDEX[shape]) for i in range(len(SHAPES))) for shape in SHAPES}
+NO_PIECE = (0.0,) * len(SHAPES)
+
+
+def observation_size(width):
+    """Length of the observation vector on a board `width` columns wide."""
+    return feature_size(width) + 2 * len(SHAPES)
+
+
+def observation_layout(width):
+    """Slice of every field of the observation vector, in order."""
+    sizes = (('heights', width), ('max_height', 1), ('holes', 1), ('bumpiness', 1), ('wells', width),
+             ('height_diffs', width - 1), ('row_transitions', 1), ('column_transitions', 1),
+             ('cumulative_wells', 1), ('eroded_cells', 1), ('current_piece', len(SHAPES)),
+             ('next_piece', len(SHAPES)))
+    layout, start = {}, 0
+    for name, size in sizes:
+        layout[name] = slice(start, start + size)
+        start += size
+    return layout
+
+
+def observation_batch(envs, out=None):
+    """
+    Attaches row i of a (len(envs), *observation_shape) array to envs[i], so every
+    environment writes its observations straight into the batch.
+
+    Args:
+        envs (list): TetrisWrappers with the same board size and observation mode.
+        out (np.ndarray): Batch array to use; a new one is allocated if None.
+
+    Returns:
+        np.ndarray: The batch array, filled with the current observations.
+    """
+    if out is None:
+        out = np.zeros((len(envs), *envs[0].observation_shape), dtype=envs[0].observation_dtype)
+    for env, row in zip(envs, out):
+        env.attach_observation_buffer(row)
+    return out
+
+
+class TetrisWrapper(gym.Env):
+    """
+    A wrapper for the Tetris game compatible with OpenAI Gym.
+    Designed for fast training with optional graphical rendering.
+    """
+
+    def __init__(self, render_mode=None, stage=5, piece_mode='uniform', observation_mode='features',
+                 observation_dtype=None, recorder=None):
+        """
+        Initializes the environment and Tetris game for a specific stage.
+        piece_mode is 'uniform' or 'bag' (7-bag); see piece_source.PieceSource.
+        observation_mode is 'features' (float32 vector) or 'board' ((5, H, W) tensor,
+        uint8 unless observation_dtype is np.float32).
+        With a recording.Recorder as `recorder`, every episode from reset() on is recorded.
+        """
+        if observation_mode not in OBSERVATION_MODES:
+            raise ValueError(f'Unknown observation mode {observation_mode!r}, expected one of {OBSERVATION_MODES}')
+        # Define the action space (placement column and rotation)
+        self.action_space = self._create_action_space()
+
+        # Launch full app if rendering is requested, else use mock
+        if render_mode == "human":
+            self.app = App()
+            self.has_display = True
+        else:
+            self.app = self._create_mock_app()
+            self.has_display = False
+
+        # Set field dimensions according to stage settings; the game gets its own
+        # BoardConfig, so environments of different stages can share a process
+        self.stage = stage
+        self.board_config = stage_board_config(stage)
+        self.field_width, self.field_height = self.board_config.size
+        print(f"\nInitializing stage {stage} with board size: {self.field_width}×{self.field_height}")
+        self.app.field_width = self.field_width
+        self.app.field_height = self.field_height
+
+        self.recorder = recorder
+
+        # Gamma and initial shaping potential for reward shaping
+        self.gamma = 0.999
+        self.prev_potential = 0.0
+
+        # Create the Tetris game instance (no sprites unless rendering)
+        self.pieces = PieceSource(self.app.allowed_shapes, piece_mode)
+        self.tetris = Tetris(self.app, render=self.has_display, config=self.board_config, pieces=self.pieces)
+
+        # Dellacherie heuristic weights for potential-based reward shaping
+        self.DELLACHERIE_W = np.array(DELLACHERIE_W)
+
+        # Observation space shape and the in-place observation target (see attach_observation_buffer)
+        self.observation_space_shape = self._get_state_shape()
+        self.observation_mode = observation_mode
+        if observation_mode == 'board':
+            self.observation_shape = board_tensor_shape(self.field_width, self.field_height)
+            self.observation_dtype = np.dtype(observation_dtype or np.uint8)
+            if self.observation_dtype not in BOARD_DTYPES:
+                raise ValueError(f'Board observations are uint8 or float32, not {self.observation_dtype}')
+        else:
+            self.observation_shape = (observation_size(self.field_width),)
+            self.observation_dtype = np.dtype(OBSERVATION_DTYPE)
+        self.observation_size = int(np.prod(self.observation_shape))
+        self.observation_buffer = None
+
+        # Game statistics
+        self.score = 0
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+        self.game_over = False
+
+    def _create_mock_app(self):
+        """Creates a minimal App object for headless (non-rendered) training."""
+        mock_app = type('MockApp', (), {
+            'game_state': GAME_STATES['PLAYING'],
+            'allowed_shapes': list(TETROMINOES.keys()),
+            'anim_trigger': True,
+            'fast_anim_trigger': True,
+            'field_width': 10,
+            'field_height': 20,
+            'screen': None,
+        })()
+        return mock_app
+
+    def _create_action_space(self):
+        """
+        Generates all possible (column, rotation) combinations for a 10-column board.
+        """
+        action_space = []
+        max_width = ACTION_COLUMNS
+        max_rotations = ACTION_ROTATIONS
+
+        for column in range(max_width):
+            for rotation in range(max_rotations):
+                action_space.append((int(column), int(rotation)))
+        return action_space
+
+    def action_mask(self):
+        """
+        Bool mask over the action space: True for one action per distinct placement of
+        the current piece on the current stack. Out-of-range and duplicate actions are False.
+        """
+        return np.array(self.tetris.core.action_mask(), dtype=bool)
+
+    def canonical_actions(self):
+        """For every action, the legal action that places the current piece the same way."""
+        return np.array(self.tetris.core.canonical_actions(), dtype=np.int64)
+
+    def compact_state(self):
+        """The current observation as a replay_storage.CompactState: board rows, pieces and last lines."""
+        return compact_state(self.tetris.core, self.tetris.tetromino.shape, self.tetris.next_tetromino.shape)
+
+    def snapshot(self):
+        """
+        The game snapshot plus the episode counters and reward potential, so that a
+        rollout from restore() returns the same rewards as the original steps.
+        """
+        return (self.tetris.snapshot(), self.score, self.lines_cleared, self.pieces_placed,
+                self.game_over, self.prev_potential)
+
+    def restore(self, snapshot):
+        """Puts the environment back to a snapshot() value; not while an episode is being recorded."""
+        game, *counters = snapshot
+        self.tetris.restore(game)
+        self.score, self.lines_cleared, self.pieces_placed, self.game_over, self.prev_potential = counters
+
+    def _get_state_shape(self):
+        """
+        Returns the shape of the observation: board + current + next tetromino.
+        """
+        field_shape = (self.field_height, self.field_width)
+        tetromino_shape = (7,)  # One-hot vector for each piece
+        return (field_shape, tetromino_shape, tetromino_shape)
+
+    def reset(self, seed=None):
+        """
+        Resets the environment and returns the initial state.
+        A seed restarts this game's own piece sequence; no process-wide RNG is touched.
+        """
+        if seed is not None:
+            self.tetris.core.pieces.seed(seed)
+
+        self.tetris.reset_game()
+        if self.recorder is not None:
+            self.recorder.begin(self.tetris, seed=seed, stage=self.stage)
+        self.score = 0
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+        self.game_over = False
+        self.prev_potential = 0.0
+
+        observation = self._get_state()
+        return observation, {}
+
+    def attach_observation_buffer(self, buffer=None):
+        """
+        Makes reset() and step() write observations in place into `buffer` and
+        return it instead of an (observation, {}, {}) tuple. The array is overwritten
+        by the next call, so copy it to keep an observation.
+
+        Args:
+            buffer (np.ndarray): Array of observation_shape and observation_dtype, e.g.
+                a row of a batch array; an internally owned one is allocated if None.
+
+        Returns:
+            np.ndarray: The buffer, holding the current observation.
+        """
+        if buffer is None:
+            buffer = np.zeros(self.observation_shape, dtype=self.observation_dtype)
+        if buffer.shape != self.observation_shape or buffer.dtype != self.observation_dtype:
+            raise ValueError(f'Observation buffer must be {self.observation_shape} {self.observation_dtype}, '
+                             f'not {buffer.shape} {buffer.dtype}')
+        self.observation_buffer = buffer
+        return self.write_observation(buffer)
+
+    def detach_observation_buffer(self):
+        """Goes back to returning a new (observation, {}, {}) tuple on every call."""
+        self.observation_buffer = None
+
+    def write_observation(self, out):
+        """
+        Writes the current observation into `out` (see observation_layout, or
+        board_tensor in board mode) and returns it.
+
+        The features are gathered into one tuple and converted in a single assignment,
+        which costs less than filling the fields slice by slice.
+        """
+        tetris = self.tetris
+        if self.observation_mode == 'board':
+            return board_tensor(tetris.core, out)
+        view = tetris.features.view
+        heights = view.heights
+        out[:] = (
+            *heights, view.max_height, view.holes, view.bumpiness, *view.wells,
+            *[heights[x] - heights[x + 1] for x in range(len(heights) - 1)],
+            view.row_transitions, view.column_transitions, view.cumulative_wells, tetris.lines_last_step * 10,
+            *PIECE_ONE_HOT.get(getattr(tetris.tetromino, 'shape', None), NO_PIECE),
+            *PIECE_ONE_HOT.get(getattr(tetris.next_tetromino, 'shape', None), NO_PIECE),
+        )
+        return out
+
+    def _get_state(self):
+        """
+        Returns the observation (the flattened feature vector, or the board tensor in
+        board mode) in the attached observation buffer or as a new (observation, {}, {}) tuple.
+        """
+        if self.observation_buffer is not None:
+            return self.write_observation(self.observation_buffer)
+        return self.write_observation(np.empty(self.observation_shape, dtype=self.observation_dtype)), {}, {}
+
+    def step(self, action):
+        """
+        Executes the selected action and returns:
+        next_state, reward, done, truncated=False, info.
+        """
+        if self.game_over:
+            return self._get_state(), 0.0, True, False, {}
+
+        column, rotation = self.action_space[action]
+        self._execute_action(column, rotation)
+        reward, lines_cleared = self._calculate_reward()
+
+        self.lines_cleared += lines_cleared
+        self.pieces_placed += 1
+        self.score = self.tetris.score
+        self.game_over = self.tetris.is_game_over()
+
+        observation = self._get_state()
+        info = {
+            'lines_cleared': lines_cleared,
+            'total_lines': self.lines_cleared,
+            'pieces_placed': self.pieces_placed,
+            'score': self.score
+        }
+        return observation, reward, self.game_over, False, info
+
+    def _execute_action(self, column, rotation):
+        """
+        Rotates and moves the tetromino to the desired location, then hard-drops it.
+        """
+        # Rotate and shift to the target column with one placement-table lookup, then
+        # hard drop straight from the column heights and lock the piece
+        self.tetris.drop_piece(column, rotation)
+
+    def _phi_state(self, heights, holes, bumpiness, lines):
+        """Computes Dellacherie potential Φ(s) for reward shaping."""
+        agg_height = sum(heights)
+        feats = np.array([agg_height, lines, holes, bumpiness], dtype=np.float32)
+        return float(np.dot(self.DELLACHERIE_W, feats))
+
+    def _calculate_reward(self):
+        """Combines line reward, shaping, survival and penalties into final reward."""
+        lines_cleared = self.tetris.lines_last_step
+        line_reward = LINE_REWARDS[lines_cleared]
+
+        view = self.tetris.features.view
+        potential = self._phi_state(view.heights, view.holes, view.bumpiness, lines_cleared)
+        shaping = self.gamma * potential - self.prev_potential
+        self.prev_potential = potential
+
+        combo_bonus = min(self.tetris.combo_count * 0.5, 2.0) if lines_cleared else 0
+        board_penalty, bonus_near_full = self._evaluate_board_state(view)
+        survival_reward = 0.01
+        game_over_penalty = -5.0 if self.tetris.is_game_over() else 0
+
+        total_reward = (
+            line_reward * 2 + combo_bonus + bonus_near_full -
+            board_penalty + survival_reward + game_over_penalty +
+            shaping
+        )
+        return total_reward, lines_cleared
+
+    def _evaluate_board_state(self, view):
+        """Evaluates penalties for bad board states and bonuses for near-complete rows."""
+        height_penalty = max(0, view.max_height - self.field_height / 2) * 0.02
+        holes_penalty = view.holes * 0.05
+
+        # Penalize deep holes
+        deep_holes_penalty = sum(depth ** 2 for depth in view.column_holes) * 0.001
+
+        bumpiness_penalty = view.bumpiness * 0.01
+        bonus = view.near_full_rows * 0.5
+
+        penalty = height_penalty + holes_penalty + bumpiness_penalty + deep_holes_penalty
+        return penalty, bonus
+
+    def render(self):
+        """Renders the game window if in human mode."""
+        if self.has_display:
+            self.app.draw()
+            pg.display.flip()
+
+    def close(self):
+        """Shuts down the game and closes the display."""
+        if self.has_display:
+            pg.quit()
+
+    def render_board_as_image(self, scale=1):
+        """
+        Converts the board into a color-coded NumPy RGB image for visualization or recording.
+
+        Args:
+            scale (int): Pixels per cell side.
+
+        Returns:
+            np.ndarray: (field_height * scale, field_width * scale, 3) uint8 image of
+            the locked cells; see board_render for the falling piece and side panel.
+        """
+        return render_codes(board_codes(self.tetris.core, piece=False), scale)
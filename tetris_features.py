@@ -0,0 +1,169 @@
+"""
+Incremental board features for the RL observation and reward.
+
+BoardFeatures is attached to a TetrisCore and updated once per locked piece from
+the rows that piece touched, instead of rescanning the whole field every step.
+Everything is read through `view`, an immutable BoardFeatureView built at most
+once per placement.
+"""
+from collections import namedtuple
+from tetris_tables import PIECE_ROTATIONS
+
+BoardFeatureView = namedtuple('BoardFeatureView', [
+    'heights',              # Surface height of every column
+    'max_height',
+    'column_holes',         # Empty cells under the surface, per column
+    'holes',
+    'bumpiness',            # Sum of |height difference| of neighbouring columns
+    'wells',                # Depth of every column below its lower neighbour (walls count as full height)
+    'cumulative_wells',
+    'row_transitions',      # Filled/empty changes along rows, walls count as filled
+    'column_transitions',   # Filled/empty changes down columns, above the field and the floor count as filled
+    'lines_cleared',        # Lines cleared by the last locked piece
+    'eroded_cells',         # Lines cleared times cells of the last piece that were cleared
+    'near_full_rows',       # Rows missing exactly one cell
+])
+
+# Dellacherie heuristic weights: aggregate height, complete lines, holes, bumpiness
+DELLACHERIE_W = (
+    -4.500158825082766,
+    +3.4181268101392694,
+    -3.2178882868487753,
+    -9.348695305445199,
+)
+
+# Environment reward for the lines cleared by one placement
+LINE_REWARDS = {0: 0, 1: 40, 2: 100, 3: 300, 4: 1200}
+
+# Per-width lookup tables: popcount and row transitions of every row mask
+_ROW_TABLES = {}
+
+
+def get_row_tables(width):
+    tables = _ROW_TABLES.get(width)
+    if tables is None:
+        inner = (1 << (width - 1)) - 1
+        popcount, transitions = [], []
+        for mask in range(1 << width):
+            popcount.append(bin(mask).count('1'))
+            changes = bin((mask ^ (mask >> 1)) & inner).count('1')
+            transitions.append(changes + (1 - (mask & 1)) + (1 - ((mask >> (width - 1)) & 1)))
+        tables = _ROW_TABLES[width] = (popcount, transitions)
+    return tables
+
+
+class BoardFeatures:
+    """Keeps the board features of one Board up to date as pieces lock and lines clear."""
+
+    def __init__(self, board):
+        self.board = board
+        self.popcount, self.transition_table = get_row_tables(board.width)
+        self.reset()
+
+    def reset(self):
+        """Recomputes everything from the board."""
+        board = self.board
+        self.column_fill = [0] * board.width
+        for row in board.rows:
+            for x in range(board.width):
+                if row >> x & 1:
+                    self.column_fill[x] += 1
+        self.row_transition_counts = [self.transition_table[row] for row in board.rows]
+        self.row_transitions = sum(self.row_transition_counts)
+        self.near_full = [fill == board.width - 1 for fill in board.row_fill]
+        self.near_full_rows = sum(self.near_full)
+
+        # Column transitions between row pairs: index y compares rows y-1 and y,
+        # index 0 the space above the field and index height the floor
+        self.pair_transition_counts = [self.pair_transitions(y) for y in range(board.height + 1)]
+        self.column_transitions = sum(self.pair_transition_counts)
+
+        self.lines_cleared = 0
+        self.eroded_cells = 0
+        self._view = None
+
+    def pair_transitions(self, y):
+        rows, full = self.board.rows, self.board.full_mask
+        upper = rows[y - 1] if y > 0 else full
+        lower = rows[y] if y < self.board.height else full
+        return self.popcount[upper ^ lower]
+
+    def refresh_rows(self, rows):
+        """Recomputes the per-row counters of `rows` and the row pairs around them."""
+        board = self.board
+        width = board.width
+        pairs = set()
+        for y in rows:
+            count = self.transition_table[board.rows[y]]
+            self.row_transitions += count - self.row_transition_counts[y]
+            self.row_transition_counts[y] = count
+
+            near_full = board.row_fill[y] == width - 1
+            self.near_full_rows += near_full - self.near_full[y]
+            self.near_full[y] = near_full
+            pairs.add(y)
+            pairs.add(y + 1)
+
+        for y in pairs:
+            count = self.pair_transitions(y)
+            self.column_transitions += count - self.pair_transition_counts[y]
+            self.pair_transition_counts[y] = count
+
+    def on_lock(self, shape, rotation, x, y, placed_rows, cleared_rows):
+        """
+        Updates the features after a piece locked at (x, y).
+
+        Only the rows the piece landed in change when nothing cleared; after a clear
+        the rows at or above the lowest cleared row have moved and are refreshed
+        along with any piece rows below it.
+        """
+        height = self.board.height
+        piece_cells_cleared = 0
+        for dx, dy in PIECE_ROTATIONS[shape][rotation]:
+            row = y + dy
+            if 0 <= row < height:
+                self.column_fill[x + dx] += 1
+                if row in cleared_rows:
+                    piece_cells_cleared += 1
+
+        lines = len(cleared_rows)
+        self.lines_cleared = lines
+        self.eroded_cells = lines * piece_cells_cleared
+        if lines:
+            self.column_fill = [fill - lines for fill in self.column_fill]
+            lowest = cleared_rows[-1]
+            self.refresh_rows(list(range(lowest + 1)) + [y for y in placed_rows if y > lowest])
+        else:
+            self.refresh_rows(placed_rows)
+        self._view = None
+
+    @property
+    def view(self):
+        """The current features as a BoardFeatureView."""
+        if self._view is None:
+            board = self.board
+            heights = board.heights
+            width, field_height = board.width, board.height
+            column_holes = tuple(heights[x] - self.column_fill[x] for x in range(width))
+
+            wells = []
+            for x in range(width):
+                left = heights[x - 1] if x > 0 else field_height
+                right = heights[x + 1] if x < width - 1 else field_height
+                wells.append(max(0, min(left, right) - heights[x]))
+
+            self._view = BoardFeatureView(
+                heights=tuple(heights),
+                max_height=max(heights),
+                column_holes=column_holes,
+                holes=sum(column_holes),
+                bumpiness=sum(abs(heights[x] - heights[x + 1]) for x in range(width - 1)),
+                wells=tuple(wells),
+                cumulative_wells=sum(wells),
+                row_transitions=self.row_transitions,
+                column_transitions=self.column_transitions,
+                lines_cleared=self.lines_cleared,
+                eroded_cells=self.eroded_cells,
+                near_full_rows=self.near_full_rows,
+            )
+        return self._view
@@ -0,0 +1,52 @@
+"""
+Game definitions that do not need pygame: the tetromino shapes and the curriculum
+stages. The headless modules (the game core, its tables, the vectorized and
+multiprocess environments, evaluation) import them from here, so processes that
+only simulate games never load pygame; tetris_settings re-exports them for the
+screen code.
+"""
+
+# === Tetromino Definitions ===
+# Each shape consists of 4 (x, y) tile offsets relative to its pivot
+TETROMINOES = {
+    'T': [(0, 0), (-1, 0), (1, 0), (0, -1)],
+    'O': [(0, 0), (0, -1), (1, 0), (1, -1)],
+    'J': [(0, 0), (-1, 0), (0, -1), (0, -2)],
+    'L': [(0, 0), (1, 0), (0, -1), (0, -2)],
+    'I': [(0, 0), (0, 1), (0, -1), (0, -2)],
+    'S': [(0, 0), (-1, 0), (0, -1), (1, -1)],
+    'Z': [(0, 0), (1, 0), (0, -1), (-1, -1)]
+}
+
+# === Stage-Specific Board Sizes (for progressive difficulty) ===
+STAGE_BOARD_SIZES = {
+    1: (4, 8),     # Very small board
+    2: (6, 12),    # Small-medium board
+    3: (8, 16),    # Medium-large board
+    4: (10, 18),   # Almost standard
+    5: (10, 20)    # Standard size
+}
+
+
+def stage_params(stage: int):
+    """
+    Returns gameplay parameters for a given training stage.
+
+    Args:
+        stage (int): Stage index (difficulty level or curriculum step).
+
+    Returns:
+        tuple: (include_hold: bool, action_limit: int, allowed_shapes: list[str])
+    """
+    include_hold = stage >= 3                           # Hold mechanic unlocks at stage 3
+    action_limit = 3 if stage == 1 else (5 if include_hold else 4)
+
+    # Control which shapes are available at each stage for progressive complexity
+    allowed_shapes = {
+        1: ['O'],
+        2: ['O', 'I'],
+        3: ['O', 'I', 'T'],
+        4: ['O', 'I', 'T', 'L']
+    }.get(stage, list(TETROMINOES.keys()))              # Stage 5+ uses full shape set
+
+    return include_hold, action_limit, allowed_shapes
@@ -1,6 +1,7 @@
 import os
 import pygame as pg
 from pygame.math import Vector2 as vec
+from tetris_rules import TETROMINOES, STAGE_BOARD_SIZES, stage_params
 
 # === Game Timing ===
 FPS = 65  # Frames per second
@@ -53,13 +54,6 @@ NEXT_BOX_POS = vec(FIELD_W * 1.3, FIELD_H * 0.42)
 HOLD_POS_OFFSET = vec(FIELD_W * 2.1, FIELD_H * 0.42)            # Offset for "held piece"
 HOLD_BOX_POS = vec(FIELD_W * 2.1, FIELD_H * 0.42)
 
-# === Movement Directions ===
-MOVE_DIRECTIONS = {
-    'left': vec(-1, 0),
-    'right': vec(1, 0),
-    'down': vec(0, 1)
-}
-
 # === Game State Constants ===
 GAME_STATES = {
     'MENU': 0,
@@ -67,18 +61,6 @@ GAME_STATES = {
     'GAME_OVER': 2
 }
 
-# === Tetromino Definitions ===
-# Each shape consists of 4 (x, y) tile offsets relative to its pivot
-TETROMINOES = {
-    'T': [(0, 0), (-1, 0), (1, 0), (0, -1)],
-    'O': [(0, 0), (0, -1), (1, 0), (1, -1)],
-    'J': [(0, 0), (-1, 0), (0, -1), (0, -2)],
-    'L': [(0, 0), (1, 0), (0, -1), (0, -2)],
-    'I': [(0, 0), (0, 1), (0, -1), (0, -2)],
-    'S': [(0, 0), (-1, 0), (0, -1), (1, -1)],
-    'Z': [(0, 0), (1, 0), (0, -1), (-1, -1)]
-}
-
 # === Tetromino Colors (used for rendering) ===
 TETROMINO_COLORS = {
     'T': 'purple',
@@ -90,19 +72,54 @@ TETROMINO_COLORS = {
     'Z': 'red'
 }
 
-# === Stage-Specific Board Sizes (for progressive difficulty) ===
-STAGE_BOARD_SIZES = {
-    1: (4, 8),     # Very small board
-    2: (6, 12),    # Small-medium board
-    3: (8, 16),    # Medium-large board
-    4: (10, 18),   # Almost standard
-    5: (10, 20)    # Standard size
-}
+class BoardConfig:
+    """
+    Board size of one game and the screen layout that follows from it.
+
+    Each Tetris keeps its own BoardConfig and its Tetromino and Block sprites read
+    sizes and offsets from it, so games of different sizes can live in one process.
+    The offsets are in tiles and match the module-level defaults on a 10x20 board.
+
+    Args:
+        width (int): Board width in cells.
+        height (int): Board height in cells.
+    """
+
+    def __init__(self, width=FIELD_W, height=FIELD_H):
+        self.width = width
+        self.height = height
+        self.size = (width, height)
+        self.res = (width * TILE_SIZE, height * TILE_SIZE)
+        self.win_res = self.win_w, self.win_h = self.res[0] * FIELD_SCALE_W, self.res[1] * FIELD_SCALE_H
+
+        self.init_pos_offset = vec(width // 12, -1)
+        self.next_pos_offset = vec(width * 1.3 - 3.5, height * 0.42)
+        self.next_box_pos = vec(width * 1.3, height * 0.42)
+        self.hold_pos_offset = vec(width * 2.1, height * 0.42)
+        self.hold_box_pos = vec(width * 2.1, height * 0.42)
+
+    def __eq__(self, other):
+        return isinstance(other, BoardConfig) and self.size == other.size
+
+    def __hash__(self):
+        return hash(self.size)
+
+    def __repr__(self):
+        return f'BoardConfig({self.width}, {self.height})'
+
+
+def stage_board_config(stage):
+    """BoardConfig of a curriculum stage's board (STAGE_BOARD_SIZES, 10x20 by default)."""
+    return BoardConfig(*STAGE_BOARD_SIZES.get(stage, FIELD_SIZE))
+
 
 def update_field_dimensions(width, height):
     """
     Dynamically updates global board size and all dependent UI offsets/resolutions.
 
+    Modules that did `from tetris_settings import *` keep the values they imported,
+    and every game in the process sees the change; games take a BoardConfig instead.
+
     Args:
         width (int): New board width.
         height (int): New board height.
@@ -129,26 +146,3 @@ def update_field_dimensions(width, height):
 
     print(f"Updated field dimensions from {old_w}×{old_h} to {FIELD_W}×{FIELD_H}")
     return WIN_RES
-
-def stage_params(stage: int):
-    """
-    Returns gameplay parameters for a given training stage.
-
-    Args:
-        stage (int): Stage index (difficulty level or curriculum step).
-
-    Returns:
-        tuple: (include_hold: bool, action_limit: int, allowed_shapes: list[str])
-    """
-    include_hold = stage >= 3                           # Hold mechanic unlocks at stage 3
-    action_limit = 3 if stage == 1 else (5 if include_hold else 4)
-
-    # Control which shapes are available at each stage for progressive complexity
-    allowed_shapes = {
-        1: ['O'],
-        2: ['O', 'I'],
-        3: ['O', 'I', 'T'],
-        4: ['O', 'I', 'T', 'L']
-    }.get(stage, list(TETROMINOES.keys()))              # Stage 5+ uses full shape set
-
-    return include_hold, action_limit, allowed_shapes
@@ -0,0 +1,179 @@
+"""
+Rotation and placement tables for every tetromino.
+
+Everything here is integer data built once at import: the four rotation states of
+each shape (the same turn Vector2.rotate(90) made around the first block), their
+row masks for the bitmask board, the top and bottom cell of every column they
+cover (for drops against column heights), and per board width the distinct
+rotation states with their extents and legal columns. Rotating, placing or
+dropping a piece is then a lookup. Zobrist keys for hashing boards are built
+per board size on first use.
+"""
+import random
+from collections import namedtuple
+from tetris_rules import TETROMINOES, STAGE_BOARD_SIZES
+
+# One distinct rotation state of a shape on a board of a given width.
+#   rotation:   rotation index (0-3) of the state's first occurrence
+#   offsets:    (dx, dy) cell offsets from the pivot, in TETROMINOES block order
+#   left/right: leftmost/rightmost dx relative to the pivot
+#   min_column/max_column: legal range for the piece's leftmost column
+PlacementState = namedtuple('PlacementState', ['rotation', 'offsets', 'left', 'right', 'min_column', 'max_column'])
+
+# TetrisWrapper's action space: action = column * ACTION_ROTATIONS + rotation
+ACTION_COLUMNS = 10
+ACTION_ROTATIONS = 4
+NUM_ACTIONS = ACTION_COLUMNS * ACTION_ROTATIONS
+
+
+def rotate_offsets(offsets):
+    """
+    Rotates cell offsets by 90 degrees around the pivot.
+
+    Same turn as Vector2.rotate(90) on screen coordinates, done in integers.
+    """
+    return [(-dy, dx) for dx, dy in offsets]
+
+
+def build_piece_mask(offsets):
+    """
+    Packs one rotation state into row masks.
+
+    Returns:
+        tuple: (left, right, top, rows) where left/right/top are extents relative
+        to the pivot and rows is a tuple of (dy, mask) with bit 0 at the leftmost column.
+    """
+    left = min(dx for dx, _ in offsets)
+    right = max(dx for dx, _ in offsets)
+    top = min(dy for _, dy in offsets)
+    rows = {}
+    for dx, dy in offsets:
+        rows[dy] = rows.get(dy, 0) | (1 << (dx - left))
+    return left, right, top, tuple(sorted(rows.items()))
+
+
+def build_piece_columns(offsets):
+    """Returns a tuple of (dx, top_dy, bottom_dy): the highest and lowest cell in each column."""
+    columns = {}
+    for dx, dy in offsets:
+        top, bottom = columns.get(dx, (dy, dy))
+        columns[dx] = (min(top, dy), max(bottom, dy))
+    return tuple((dx, top, bottom) for dx, (top, bottom) in sorted(columns.items()))
+
+
+def build_piece_tables():
+    """
+    Returns (rotations, masks, columns) for the four rotation states of every shape.
+
+    rotations keep TETROMINOES block order, masks come from build_piece_mask and
+    columns from build_piece_columns.
+    """
+    rotations, masks, columns = {}, {}, {}
+    for shape, offsets in TETROMINOES.items():
+        states = [list(offsets)]
+        for _ in range(3):
+            states.append(rotate_offsets(states[-1]))
+        rotations[shape] = [tuple(state) for state in states]
+        masks[shape] = [build_piece_mask(state) for state in states]
+        columns[shape] = [build_piece_columns(state) for state in states]
+    return rotations, masks, columns
+
+
+PIECE_ROTATIONS, PIECE_MASKS, PIECE_COLUMNS = build_piece_tables()
+
+
+def normalized_cells(offsets):
+    """Cell set shifted so its top-left corner is (0, 0); equal sets are the same state."""
+    left = min(dx for dx, _ in offsets)
+    top = min(dy for _, dy in offsets)
+    return frozenset((dx - left, dy - top) for dx, dy in offsets)
+
+
+class PlacementTable:
+    """
+    Distinct rotation states and legal columns of one shape on one board width.
+
+    Symmetric shapes collapse: O has one state, I, S and Z have two.
+    `by_rotation[r]` gives the state any of the four rotations lands in.
+    `canonical_actions[a]` is the action that places the piece like action `a`
+    (clamped column, first rotation of the state) and `action_mask[a]` is True
+    only for those canonical actions.
+    """
+
+    def __init__(self, shape, width):
+        self.shape = shape
+        self.width = width
+        self.states = []
+        self.by_rotation = []
+
+        seen = {}
+        for rotation, offsets in enumerate(PIECE_ROTATIONS[shape]):
+            key = normalized_cells(offsets)
+            if key not in seen:
+                left, right, _, _ = PIECE_MASKS[shape][rotation]
+                seen[key] = PlacementState(rotation, offsets, left, right, 0, width - 1 - (right - left))
+                self.states.append(seen[key])
+            self.by_rotation.append(seen[key])
+
+        self.canonical_actions = tuple(self.canonical_action(action) for action in range(NUM_ACTIONS))
+        self.action_mask = tuple(action == canonical for action, canonical in enumerate(self.canonical_actions))
+
+    def pivot_x(self, column, rotation):
+        """Pivot x for a piece whose leftmost cell goes to `column`, clamped like wall moves."""
+        state = self.by_rotation[rotation % 4]
+        column = max(state.min_column, min(state.max_column, column))
+        return column - state.left
+
+    def canonical_action(self, action):
+        column, rotation = divmod(action, ACTION_ROTATIONS)
+        state = self.by_rotation[rotation]
+        column = max(state.min_column, min(state.max_column, column))
+        return column * ACTION_ROTATIONS + state.rotation
+
+
+PLACEMENT_TABLES = {}
+
+# Zobrist keys: a fixed random 64-bit key per cell, the same in every process
+ZOBRIST_SEED = 0x7E7415
+ZOBRIST_TABLES = {}
+
+
+def get_zobrist_table(width, height):
+    """
+    Row hash lookups for a width x height board.
+
+    table[y][chunk][bits] is the XOR of the keys of row y's cells set in `bits`, where
+    `bits` is byte number `chunk` of the row mask, so a row hashes in one lookup per byte.
+    """
+    table = ZOBRIST_TABLES.get((width, height))
+    if table is None:
+        rng = random.Random(ZOBRIST_SEED)
+        keys = [[rng.getrandbits(64) for _ in range(width)] for _ in range(height)]
+        table = []
+        for row_keys in keys:
+            chunks = []
+            for start in range(0, width, 8):
+                chunk_keys = row_keys[start:start + 8]
+                lookup = [0] * 256
+                for bits in range(1, 256):
+                    low = bits & -bits
+                    index = low.bit_length() - 1
+                    key = chunk_keys[index] if index < len(chunk_keys) else 0
+                    lookup[bits] = lookup[bits ^ low] ^ key
+                chunks.append(lookup)
+            table.append(chunks)
+        table = ZOBRIST_TABLES[(width, height)] = table
+    return table
+
+
+def get_placement_table(shape, width):
+    table = PLACEMENT_TABLES.get((shape, width))
+    if table is None:
+        table = PLACEMENT_TABLES[(shape, width)] = PlacementTable(shape, width)
+    return table
+
+
+# Build the tables for every stage board up front
+for _width, _ in STAGE_BOARD_SIZES.values():
+    for _shape in TETROMINOES:
+        get_placement_table(_shape, _width)
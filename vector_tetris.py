@@ -0,0 +1,525 @@
+"""
+Many Tetris games stepped in lockstep with NumPy.
+
+VectorTetris keeps N boards as one (N, height, width) bool array and every other
+piece of game state (current/next piece, score, level, combo, shaping potential)
+as length-N arrays. A step applies one (column, rotation) placement per board:
+landing rows come from the column heights, locking is one fancy-index write,
+line clears are a stable row sort and the observation features are array
+reductions, so the per-transition cost is a few microseconds at 256+ boards.
+Boards whose stack reaches the spawn rows, where turning or sliding the piece
+can be blocked, are checked for that and replayed step by step like TetrisCore.
+
+Observations and rewards follow TetrisWrapper: the 50-dimensional feature
+vector (for a 10-wide board) plus one-hot current and next pieces, and the
+same line reward, Dellacherie shaping, penalties and bonuses. board_observations()
+gives the (5, height, width) tensors of board_tensor instead, for convolutional agents.
+"""
+import numpy as np
+from tetris_rules import TETROMINOES
+from tetris_core import SHAPES, SHAPE_INDEX, POINTS_PER_LINES, LINES_PER_LEVEL, GAME_OVER_ROWS
+from tetris_tables import (PIECE_ROTATIONS, PIECE_MASKS, ACTION_COLUMNS, ACTION_ROTATIONS, NUM_ACTIONS,
+                           get_placement_table)
+from tetris_features import DELLACHERIE_W, LINE_REWARDS
+from replay_storage import CompactState, pack_rows
+from board_tensor import new_board_tensors, get_spawn_planes
+from afterstates import (Placements, feature_size, column_heights, clear_full_rows, board_features,
+                         feature_matrix, lock_placements)
+
+NO_CELL = -1000  # Bottom offset of a column a piece does not cover
+
+
+def build_vector_tables(width):
+    """
+    Placement arrays for every shape index and rotation on a board of `width`.
+
+    Returns:
+        dict: 'rotation' (7, 4) canonical rotation each rotation resolves to,
+        'dx'/'dy' (7, 4, 4) cell offsets from the pivot, 'left'/'right' (7, 4)
+        extents, 'bottom' (7, 4, 4) lowest dy per covered column counted from the
+        leftmost one (NO_CELL past the piece), 'spawn_x'/'spawn_y' (7,) spawn pivot,
+        'wall_turns' (7, 4) rotations whose turns at the spawn column hit a wall
+        (narrow boards), 'spawn_rows' the rows a piece can touch while it turns and
+        slides at spawn height, 'candidate_columns'/'candidate_rotations'/
+        'candidate_valid' (7, C) the distinct placements of each shape and
+        'action_mask'/'canonical_action' (7, NUM_ACTIONS) from the placement tables.
+    """
+    count = len(SHAPES)
+    tables = {
+        'rotation': np.zeros((count, 4), dtype=np.int64),
+        'dx': np.zeros((count, 4, 4), dtype=np.int64),
+        'dy': np.zeros((count, 4, 4), dtype=np.int64),
+        'left': np.zeros((count, 4), dtype=np.int64),
+        'right': np.zeros((count, 4), dtype=np.int64),
+        'bottom': np.full((count, 4, 4), NO_CELL, dtype=np.int64),
+        'spawn_x': np.zeros(count, dtype=np.int64),
+        'spawn_y': np.zeros(count, dtype=np.int64),
+        'wall_turns': np.zeros((count, 4), dtype=bool),
+        'action_mask': np.zeros((count, NUM_ACTIONS), dtype=bool),
+        'canonical_action': np.zeros((count, NUM_ACTIONS), dtype=np.int64),
+    }
+    spawn_rows = 0
+    for shape, index in SHAPE_INDEX.items():
+        table = get_placement_table(shape, width)
+        left, right, top, _ = PIECE_MASKS[shape][0]
+        tables['spawn_x'][index] = max(-left, min(width - 1 - right, width // 2 - 1))
+        tables['spawn_y'][index] = -top
+        tables['action_mask'][index] = table.action_mask
+        tables['canonical_action'][index] = table.canonical_actions
+        for rotation in range(4):
+            tables['rotation'][index, rotation] = table.by_rotation[rotation].rotation
+            left, right, _, _ = PIECE_MASKS[shape][rotation]
+            tables['left'][index, rotation] = left
+            tables['right'][index, rotation] = right
+            for cell, (dx, dy) in enumerate(PIECE_ROTATIONS[shape][rotation]):
+                tables['dx'][index, rotation, cell] = dx
+                tables['dy'][index, rotation, cell] = dy
+                tables['bottom'][index, rotation, dx - left] = max(tables['bottom'][index, rotation, dx - left], dy)
+                spawn_rows = max(spawn_rows, dy - top + 1)
+    tables['spawn_rows'] = spawn_rows
+
+    for index in range(count):
+        spawn_x = tables['spawn_x'][index]
+        outside = (spawn_x + tables['left'][index] < 0) | (spawn_x + tables['right'][index] >= width)
+        for rotation in range(4):
+            tables['wall_turns'][index, rotation] = outside[1:tables['rotation'][index, rotation] + 1].any()
+
+    candidates = []
+    for shape in SHAPES:
+        candidates.append([(column, state.rotation) for state in get_placement_table(shape, width).states
+                           for column in range(state.min_column, state.max_column + 1)])
+    size = max(len(placements) for placements in candidates)
+    tables['candidate_columns'] = np.zeros((count, size), dtype=np.int64)
+    tables['candidate_rotations'] = np.zeros((count, size), dtype=np.int64)
+    tables['candidate_valid'] = np.zeros((count, size), dtype=bool)
+    for index, placements in enumerate(candidates):
+        for slot, (column, rotation) in enumerate(placements):
+            tables['candidate_columns'][index, slot] = column
+            tables['candidate_rotations'][index, slot] = rotation
+            tables['candidate_valid'][index, slot] = True
+    return tables
+
+
+class VectorTetris:
+    """
+    N independent games on one board array.
+
+    Games that end are reset automatically during step(); their last observation
+    is returned in info['final_observation'].
+
+    Pieces are drawn uniformly from `allowed_shapes` with one generator seeded by
+    `seed`, or, given `pieces`, dealt by one PieceSource per game, so game n plays
+    the sequence of a TetrisCore using pieces[n]. A game that ends and restarts
+    goes on with the rest of its source's sequence.
+    """
+
+    def __init__(self, num_envs, width=10, height=20, allowed_shapes=None, seed=None, pieces=None):
+        self.num_envs = num_envs
+        self.width = width
+        self.height = height
+        self.allowed_shapes = list(allowed_shapes or TETROMINOES.keys())
+        self.allowed = np.array([SHAPE_INDEX[shape] for shape in self.allowed_shapes], dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+        self.sources = None if pieces is None else list(pieces)
+        if self.sources is not None and len(self.sources) != num_envs:
+            raise ValueError(f'Got {len(self.sources)} piece sources for {num_envs} games')
+        self.tables = build_vector_tables(width)
+        self.gamma = 0.999
+        self.dellacherie_w = np.array(DELLACHERIE_W, dtype=np.float64)
+        self.line_rewards = np.array([LINE_REWARDS[lines] for lines in range(5)], dtype=np.float64)
+        self.points_per_lines = np.array([POINTS_PER_LINES[lines] for lines in range(5)], dtype=np.int64)
+
+        self.feature_size = feature_size(width)
+        self.observation_size = self.feature_size + 2 * len(SHAPES)
+
+        n = num_envs
+        self.boards = np.zeros((n, height, width), dtype=bool)
+        self.pieces = np.zeros(n, dtype=np.int64)
+        self.next_pieces = np.zeros(n, dtype=np.int64)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.levels = np.zeros(n, dtype=np.int64)
+        self.lines_to_next_level = np.zeros(n, dtype=np.int64)
+        self.combo_counts = np.zeros(n, dtype=np.int64)
+        self.lines_last_step = np.zeros(n, dtype=np.int64)
+        self.total_lines = np.zeros(n, dtype=np.int64)
+        self.pieces_placed = np.zeros(n, dtype=np.int64)
+        self.prev_potential = np.zeros(n, dtype=np.float64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.reset()
+
+    def draw_pieces(self, envs):
+        """The next piece of each game in `envs` (an index array)."""
+        if self.sources is None:
+            return self.allowed[self.rng.integers(len(self.allowed), size=len(envs))]
+        return np.array([SHAPE_INDEX[self.sources[env].next()] for env in envs], dtype=np.int64)
+
+    def reset(self, envs=None):
+        """
+        Starts new games on `envs` (index array or bool mask, default all).
+
+        Returns:
+            np.ndarray: (num_envs, observation_size) observations of every board.
+        """
+        self.reset_envs(np.arange(self.num_envs) if envs is None else envs)
+        return self.observations()
+
+    def reset_envs(self, envs):
+        envs = np.asarray(envs)
+        if envs.dtype == bool:
+            envs = np.flatnonzero(envs)
+        self.boards[envs] = False
+        self.pieces[envs] = self.draw_pieces(envs)
+        self.next_pieces[envs] = self.draw_pieces(envs)
+        for array in (self.scores, self.levels, self.combo_counts, self.lines_last_step,
+                      self.total_lines, self.pieces_placed, self.prev_potential):
+            array[envs] = 0
+        self.lines_to_next_level[envs] = LINES_PER_LEVEL
+        self.game_over[envs] = False
+        return envs
+
+    def target_placements(self, columns, rotations, envs=None):
+        """
+        Canonical rotation and pivot x of the current piece of every board (or of
+        boards `envs`) for (column, rotation).
+
+        Columns are clamped to the walls like Tetromino.place.
+        """
+        tables = self.tables
+        pieces = self.pieces if envs is None else self.pieces[envs]
+        rotations = tables['rotation'][pieces, np.asarray(rotations) % 4]
+        left = tables['left'][pieces, rotations]
+        right = tables['right'][pieces, rotations]
+        columns = np.clip(np.asarray(columns), 0, self.width - 1 - (right - left))
+        return rotations, columns - left
+
+    def landing_rows(self, rotations, xs, envs=None):
+        """
+        Pivot row of the current piece of every board (or of boards `envs`) dropped
+        from spawn height at pivot x, read off the column heights.
+
+        Returns:
+            tuple: (rows, tucked) where tucked marks boards whose piece already reaches
+            below the surface of a column it covers, the case Board.landing_y leaves
+            to a step-by-step drop.
+        """
+        tables = self.tables
+        envs = np.arange(self.num_envs) if envs is None else envs
+        pieces = self.pieces[envs]
+        cover = xs + tables['left'][pieces, rotations]
+        cover = cover[:, None] + np.arange(4)[None, :]
+        heights = column_heights(self.boards)
+        surface = self.height - heights[envs[:, None], np.minimum(cover, self.width - 1)]
+        bottom = tables['bottom'][pieces, rotations]
+        covered = bottom != NO_CELL
+        rows = np.where(covered, surface - 1 - bottom, self.height).min(axis=1)
+        tucked = (covered & (tables['spawn_y'][pieces, None] + bottom >= surface)).any(axis=1)
+        return rows, tucked
+
+    def cells_collide(self, envs, shapes, rotations, xs, ys):
+        """Vectorized collides() for boards `envs` with pieces at pivots (xs, ys)."""
+        cell_xs = xs[:, None] + self.tables['dx'][shapes, rotations]
+        cell_ys = ys[:, None] + self.tables['dy'][shapes, rotations]
+        outside = (cell_xs < 0) | (cell_xs >= self.width) | (cell_ys >= self.height)
+        filled = self.boards[envs[:, None], np.clip(cell_ys, 0, self.height - 1),
+                             np.clip(cell_xs, 0, self.width - 1)] & (cell_ys >= 0)
+        return (outside | filled).any(axis=1)
+
+    def path_blocked(self, envs, rotations, xs):
+        """
+        True for boards in `envs` where turning at the spawn position or sliding over
+        to pivot x hits the stack, the cases TetrisCore.place resolves step by step.
+        """
+        shapes = self.pieces[envs]
+        spawn_x, spawn_y = self.tables['spawn_x'][shapes], self.tables['spawn_y'][shapes]
+        blocked = np.zeros(len(envs), dtype=bool)
+        for turn in range(1, 4):
+            intermediate = turn < rotations
+            if intermediate.any():
+                blocked |= intermediate & self.cells_collide(envs, shapes, np.full(len(envs), turn), spawn_x, spawn_y)
+        low, high = np.minimum(spawn_x, xs), np.maximum(spawn_x, xs)
+        for x in range(self.width):
+            swept = (low <= x) & (x <= high)
+            if swept.any():
+                blocked |= swept & self.cells_collide(envs, shapes, rotations, np.full(len(envs), x), spawn_y)
+        return blocked
+
+    def collides(self, env, shape, rotation, x, y):
+        """True if the piece overlaps a wall, the floor or a filled cell of board `env`."""
+        xs = x + self.tables['dx'][shape, rotation]
+        ys = y + self.tables['dy'][shape, rotation]
+        if xs.min() < 0 or xs.max() >= self.width or ys.max() >= self.height:
+            return True
+        inside = ys >= 0
+        return bool(self.boards[env, ys[inside], xs[inside]].any())
+
+    def place_exact(self, env, column, rotation):
+        """
+        Turns, slides and drops board `env`'s piece one step at a time like TetrisCore.
+
+        Only needed when the stack reaches the rows the piece moves through at spawn
+        height. Returns the final (rotation, x, y) of the pivot.
+        """
+        tables = self.tables
+        shape = self.pieces[env]
+        x, y, current = int(tables['spawn_x'][shape]), int(tables['spawn_y'][shape]), 0
+        for _ in range(tables['rotation'][shape, rotation % 4]):
+            if not self.collides(env, shape, (current + 1) % 4, x, y):
+                current = (current + 1) % 4
+
+        left, right = tables['left'][shape, current], tables['right'][shape, current]
+        target_x = max(0, min(self.width - 1 - (right - left), column)) - left
+        step = 1 if target_x > x else -1
+        while x != target_x and not self.collides(env, shape, current, x + step, y):
+            x += step
+        while not self.collides(env, shape, current, x, y + 1):
+            y += 1
+        return current, x, y
+
+    def step(self, actions):
+        """Applies one TetrisWrapper action index per board; see step_placements."""
+        actions = np.asarray(actions)
+        return self.step_placements(actions // ACTION_ROTATIONS, actions % ACTION_ROTATIONS)
+
+    def step_placements(self, columns, rotations):
+        """
+        Drops every board's current piece at (column, rotation), locks it, clears lines,
+        scores, spawns the next piece and resets finished games.
+
+        Returns:
+            tuple: (observations, rewards, dones, info) with info holding per-board
+            'lines_cleared', 'score', 'pieces_placed' arrays, and 'final_observation' and
+            'final_state' (a CompactState of arrays) of the boards that finished.
+        """
+        n = np.arange(self.num_envs)
+        columns = np.asarray(columns)
+        rotations, xs = self.target_placements(columns, rotations)
+        ys, tucked = self.landing_rows(rotations, xs)
+
+        # Boards whose stack reaches the spawn rows, or walls on narrow boards, can block
+        # the piece on its way over
+        crowded = np.flatnonzero(self.boards[:, :self.tables['spawn_rows']].any(axis=(1, 2))
+                                 | self.tables['wall_turns'][self.pieces, rotations])
+        if len(crowded):
+            blocked = self.path_blocked(crowded, rotations[crowded], xs[crowded]) | tucked[crowded]
+            for env in crowded[blocked]:
+                rotations[env], xs[env], ys[env] = self.place_exact(env, int(columns[env]), rotations[env])
+
+        # Lock: cells above the field are dropped, like Board.place
+        cell_ys = ys[:, None] + self.tables['dy'][self.pieces, rotations]
+        cell_xs = xs[:, None] + self.tables['dx'][self.pieces, rotations]
+        inside = cell_ys >= 0
+        env_index = np.broadcast_to(n[:, None], cell_ys.shape)
+        self.boards[env_index[inside], cell_ys[inside], cell_xs[inside]] = True
+
+        lines = clear_full_rows(self.boards)
+
+        # Score, level and combo exactly as TetrisCore.get_score
+        self.scores += self.points_per_lines[lines] * (self.levels + 1)
+        self.lines_to_next_level -= lines
+        level_up = (lines > 0) & (self.lines_to_next_level <= 0)
+        self.levels += level_up
+        self.lines_to_next_level += LINES_PER_LEVEL * level_up
+        self.combo_counts = np.where(lines > 0, self.combo_counts + 1, 0)
+        self.lines_last_step[:] = lines     # A copy: resetting finished boards must not zero info['lines_cleared']
+        self.total_lines += lines
+        self.pieces_placed += 1
+
+        # Game over on a block in the top rows or when the next piece cannot spawn
+        self.game_over = self.boards[:, :GAME_OVER_ROWS].any(axis=(1, 2)) | self.spawn_blocked()
+        features = board_features(self.boards)
+        rewards = self.rewards(features, lines)
+
+        # Spawn the next piece on boards that are still playing
+        playing = np.flatnonzero(~self.game_over)
+        self.pieces[playing] = self.next_pieces[playing]
+        self.next_pieces[playing] = self.draw_pieces(playing)
+
+        observations = self.observations(features)
+        dones = self.game_over.copy()
+        info = {
+            'lines_cleared': lines,
+            'total_lines': self.total_lines.copy(),
+            'score': self.scores.copy(),
+            'pieces_placed': self.pieces_placed.copy(),
+            'final_observation': observations[dones],
+            'final_state': self.compact_states(dones),
+        }
+        if dones.any():
+            envs = self.reset_envs(dones)
+            observations[envs] = self.observations(envs=envs)
+        return observations, rewards, dones, info
+
+    def compact_states(self, envs=None):
+        """The observations of boards `envs` (default all) as a replay_storage.CompactState of arrays."""
+        envs = np.arange(self.num_envs) if envs is None else envs
+        return CompactState(pack_rows(self.boards[envs]), self.pieces[envs], self.next_pieces[envs],
+                            self.lines_last_step[envs])
+
+    def spawn_blocked(self):
+        """True for boards where the next piece overlaps the stack at its spawn position."""
+        tables = self.tables
+        ys = tables['spawn_y'][self.next_pieces, None] + tables['dy'][self.next_pieces, 0]
+        xs = tables['spawn_x'][self.next_pieces, None] + tables['dx'][self.next_pieces, 0]
+        n = np.broadcast_to(np.arange(self.num_envs)[:, None], ys.shape)
+        return (self.boards[n, np.maximum(ys, 0), xs] & (ys >= 0)).any(axis=1)
+
+    def rewards(self, features, lines):
+        """TetrisWrapper's reward for every board after the current step."""
+        potential = (self.dellacherie_w[0] * features['heights'].sum(axis=1)
+                     + self.dellacherie_w[1] * lines
+                     + self.dellacherie_w[2] * features['holes']
+                     + self.dellacherie_w[3] * features['bumpiness'])
+        shaping = self.gamma * potential - self.prev_potential
+        self.prev_potential = potential
+
+        combo_bonus = np.where(lines > 0, np.minimum(self.combo_counts * 0.5, 2.0), 0.0)
+        penalty = (np.maximum(0, features['max_height'] - self.height / 2) * 0.02
+                   + features['holes'] * 0.05
+                   + features['bumpiness'] * 0.01
+                   + (features['column_holes'] ** 2).sum(axis=1) * 0.001)
+        bonus = features['near_full_rows'] * 0.5
+        game_over_penalty = np.where(self.game_over, -5.0, 0.0)
+        return (self.line_rewards[lines] * 2 + combo_bonus + bonus - penalty
+                + 0.01 + game_over_penalty + shaping)
+
+    def observations(self, features=None, envs=None):
+        """
+        Float32 observations in TetrisWrapper layout, one row per board in `envs`
+        (default all) with `features` computed for those boards.
+        """
+        envs = np.arange(self.num_envs) if envs is None else envs
+        features = board_features(self.boards[envs]) if features is None else features
+        count, offset = len(envs), self.feature_size
+        n = np.arange(count)
+        observations = np.zeros((count, self.observation_size), dtype=np.float32)
+        feature_matrix(features, self.lines_last_step[envs], out=observations[:, :offset])
+        observations[n, offset + self.pieces[envs]] = 1.0
+        observations[n, offset + len(SHAPES) + self.next_pieces[envs]] = 1.0
+        return observations
+
+    def board_observations(self, envs=None, out=None, dtype=np.uint8):
+        """
+        board_tensor observations of boards `envs` (default all): the current piece
+        at its spawn position, where it would land dropped straight down, and the
+        next piece. These games have no hold, so the held plane stays empty.
+
+        Returns:
+            np.ndarray: (len(envs), 5, height, width) uint8 or float32, `out` if given.
+        """
+        tables = self.tables
+        envs = np.arange(self.num_envs) if envs is None else np.asarray(envs)
+        count = len(envs)
+        if out is None:
+            out = new_board_tensors(count, self.width, self.height, dtype)
+        pieces = self.pieces[envs]
+        xs, ys = tables['spawn_x'][pieces], tables['spawn_y'][pieces]
+        landing, tucked = self.landing_rows(np.zeros(count, dtype=np.int64), xs, envs)
+        for k in np.flatnonzero(tucked):
+            y = ys[k]
+            while not self.collides(envs[k], pieces[k], 0, xs[k], y + 1):
+                y += 1
+            landing[k] = y
+
+        cell_xs = xs[:, None] + tables['dx'][pieces, 0]
+        cell_ys = ys[:, None] + tables['dy'][pieces, 0]
+        ghost_ys = landing[:, None] + tables['dy'][pieces, 0]
+        n = np.broadcast_to(np.arange(count)[:, None], cell_xs.shape)
+        out[:, 0] = self.boards[envs]
+        out[:, 1:3] = 0
+        out[n, 1, cell_ys, cell_xs] = 1
+        out[n, 2, ghost_ys, cell_xs] = 1
+        out[:, 3] = get_spawn_planes(self.width, self.height)[self.next_pieces[envs]]
+        out[:, 4] = 0
+        return out
+
+    def resolve_placements(self):
+        """
+        Where each board's current piece ends up for every legal (column, rotation) of
+        its placement table, resolved exactly like step() would, without changing any board.
+
+        Returns:
+            tuple: (env, columns, rotations, final_rotations, cell_xs, cell_ys, first)
+            with one row per board and table entry; final_rotations differ from
+            rotations where a turn was blocked and first[k] is the earliest row of the
+            same board whose piece lands on the same cells (k itself unless a blocked
+            path sent it there).
+        """
+        tables = self.tables
+        env, slot = np.nonzero(tables['candidate_valid'][self.pieces])
+        pieces = self.pieces[env]
+        columns = tables['candidate_columns'][pieces, slot]
+        rotations = tables['candidate_rotations'][pieces, slot]
+        final_rotations, xs = self.target_placements(columns, rotations, env)
+        ys, tucked = self.landing_rows(final_rotations, xs, env)
+
+        crowded = np.flatnonzero(self.boards[env, :tables['spawn_rows']].any(axis=(1, 2))
+                                 | tables['wall_turns'][pieces, final_rotations])
+        blocked = crowded[self.path_blocked(env[crowded], final_rotations[crowded], xs[crowded])
+                          | tucked[crowded]] if len(crowded) else crowded
+        for k in blocked:
+            final_rotations[k], xs[k], ys[k] = self.place_exact(env[k], int(columns[k]), final_rotations[k])
+
+        cell_xs = xs[:, None] + tables['dx'][pieces, final_rotations]
+        cell_ys = ys[:, None] + tables['dy'][pieces, final_rotations]
+        first = np.arange(len(env))
+        if len(blocked):
+            _, index, inverse = np.unique(np.column_stack([env, self.cell_codes(cell_xs, cell_ys)]), axis=0,
+                                          return_index=True, return_inverse=True)
+            first = index[inverse.ravel()]
+        return env, columns, rotations, final_rotations, cell_xs, cell_ys, first
+
+    def cell_codes(self, cell_xs, cell_ys):
+        """Sorted per-piece cell numbers; equal rows mean the pieces cover the same cells."""
+        return np.sort((cell_ys + 4) * self.width + cell_xs, axis=1)
+
+    def enumerate_placements(self, features=True):
+        """
+        Every distinct placement of each board's current piece, without changing any board.
+
+        Args:
+            features (bool): Compute the observation features of every afterstate; leave
+                them out (Placements.features is None) when only the boards are needed.
+
+        Returns:
+            Placements: arrays with one row per placement, `env` indexing the boards.
+        """
+        env, columns, rotations, _, cell_xs, cell_ys, first = self.resolve_placements()
+        keep = np.flatnonzero(first == np.arange(len(env)))
+        env, columns, rotations = env[keep], columns[keep], rotations[keep]
+        boards = self.boards[env]
+        lines, game_over, features = lock_placements(boards, cell_xs[keep], cell_ys[keep], features)
+        actions = columns * ACTION_ROTATIONS + rotations
+        return Placements(env, columns, rotations, actions, boards, lines, game_over, features)
+
+    def action_masks(self):
+        """(num_envs, NUM_ACTIONS) legal actions on the current stacks, as TetrisCore.action_mask."""
+        env, columns, rotations, _, _, _, first = self.resolve_placements()
+        legal = (first == np.arange(len(env))) & (columns < ACTION_COLUMNS)
+        masks = np.zeros((self.num_envs, NUM_ACTIONS), dtype=bool)
+        masks[env[legal], columns[legal] * ACTION_ROTATIONS + rotations[legal]] = True
+        return masks
+
+    def canonical_actions(self):
+        """
+        (num_envs, NUM_ACTIONS) legal action that drops each board's piece on the same
+        cells as every action, as TetrisCore.canonical_actions.
+        """
+        tables = self.tables
+        env, columns, rotations, final_rotations, cell_xs, cell_ys, first = self.resolve_placements()
+        actions = columns * ACTION_ROTATIONS + rotations
+        inside = columns < ACTION_COLUMNS
+        representative = np.zeros((self.num_envs, NUM_ACTIONS), dtype=np.int64)
+        representative[env[inside], actions[inside]] = actions[first[inside]]
+        canonical = np.take_along_axis(representative, tables['canonical_action'][self.pieces], axis=1)
+
+        # A blocked turn re-aims with the requested column, so resolve those actions one by one
+        codes = self.cell_codes(cell_xs, cell_ys)
+        for k in np.flatnonzero(final_rotations != rotations):
+            board, piece = env[k], self.pieces[env[k]]
+            rows = np.flatnonzero(env == board)
+            for action in np.flatnonzero(tables['canonical_action'][piece] == actions[k]):
+                rotation, x, y = self.place_exact(board, action // ACTION_ROTATIONS, action % ACTION_ROTATIONS)
+                code = self.cell_codes(x + tables['dx'][piece, rotation][None], y + tables['dy'][piece, rotation][None])
+                match = rows[(codes[rows] == code).all(axis=1)][0]
+                canonical[board, action] = actions[first[match]]
+        return canonical